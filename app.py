@@ -4,7 +4,6 @@ import pandas as pd
 import tempfile
 import soundfile as sf
 import shutil
-import librosa
 import numpy as np
 
 # Import your existing metrics
@@ -57,25 +56,23 @@ METRIC_DESCRIPTIONS = {
     'SIGMOS_REVERB': 'Perceived reverberation quality'
 }
 
-# --- Cached Initializers ---
-@st.cache_resource
+# --- Initializers ---
+# Models live in the metrics model registry (metrics/registry.py): loaded once per process
+# and kept across reruns, evicted only to respect config.MODEL_MEMORY_BUDGET_MB.
 def init_srmr():
     from metrics.srmr_metric import calculate_srmr
     return calculate_srmr
 
-@st.cache_resource
 def init_sigmos():
     from metrics.sigmos_metric import calculate_sigmos, get_estimator
     get_estimator() # Warmup
     return calculate_sigmos
 
-@st.cache_resource
 def init_vqscore():
     from metrics.vqscore_metric import calculate_vqscore, load_model
     load_model() # Warmup
     return calculate_vqscore
 
-@st.cache_resource
 def init_wvmos():
     from metrics.wvmos_metric import calculate_wvmos, get_model
     get_model() # Warmup
@@ -110,138 +107,101 @@ if uploaded_file is not None:
             # 0. Initialize Models with Granular Feedback
             with st.status("Initializing AI Models...", expanded=True) as status:
                 st.write("Loading SRMR...")
-                calculate_srmr = init_srmr()
+                init_srmr()
                 
-                st.write("Loading SigMOS...")
-                calculate_sigmos = init_sigmos()
-                
-                st.write("Loading VQScore...")
-                calculate_vqscore = init_vqscore()
-                
-                st.write("Loading WVMOS (this is the largest model)...")
-                calculate_wvmos = init_wvmos()
+                if config.MODEL_MEMORY_BUDGET_MB:
+                    # Warming every model would only evict the first ones again
+                    st.write(f"Models load on demand within the {config.MODEL_MEMORY_BUDGET_MB:.0f} MB model memory budget.")
+                else:
+                    st.write("Loading SigMOS...")
+                    init_sigmos()
+                    
+                    st.write("Loading VQScore...")
+                    init_vqscore()
+                    
+                    st.write("Loading WVMOS (this is the largest model)...")
+                    init_wvmos()
                 
                 status.update(label="All AI Models Loaded & Cached!", state="complete", expanded=False)
                 
             # --- Sampling Logic ---
+            from metrics.audio import AudioBuffer, extract_chunks
+            
             info = sf.info(tmp_path)
             duration = info.duration
-            analysis_paths = []
+            analysis_audio = []
             
             if duration > 180: # > 3 minutes
                 num_chunks = 5
                 chunk_duration = 30.0
                 st.info(f"Large file detected ({duration/60:.2f} mins). Analyzing {num_chunks} representative clips (30s each) distributed across the file for better coverage.")
                 
-                # Calculate segment intervals
-                segment_length = duration / num_chunks
-                
                 with st.spinner("Extracting representative samples..."):
-                    for i in range(num_chunks):
-                        # Center of the segment
-                        segment_center = (i * segment_length) + (segment_length / 2)
-                        start_time = max(0, segment_center - (chunk_duration / 2))
-                        
-                        # Boundary checks
-                        if start_time + chunk_duration > duration:
-                            start_time = max(0, duration - chunk_duration)
-                        
-                        try:
-                            y_clip, sr_clip = librosa.load(tmp_path, sr=None, offset=start_time, duration=chunk_duration)
-                            
-                            clip_name = f"temp_clip_{i}.wav"
-                            clip_path = os.path.join(tempfile.gettempdir(), clip_name)
-                            sf.write(clip_path, y_clip, sr_clip)
-                            analysis_paths.append(clip_path)
-                        except Exception as e:
-                            print(f"Error extracting clip {i}: {e}")
+                    # Clips stay in memory; no temp WAVs are written
+                    analysis_audio = extract_chunks(tmp_path, num_chunks=num_chunks, chunk_duration=chunk_duration)
                             
-                    if not analysis_paths:
+                    if not analysis_audio:
                         st.error("Failed to extract samples. Analyzing full file (might be slow).")
-                        analysis_paths = [tmp_path]
+                        analysis_audio = [AudioBuffer.from_file(tmp_path)]
             else:
-                analysis_paths = [tmp_path]
+                analysis_audio = [AudioBuffer.from_file(tmp_path)]
             # ----------------------
 
-            # 1. SRMR
-            print("DEBUG: Starting SRMR...")
-            status_text.text("Running SRMR...")
-            srmr_scores = []
-            for path in analysis_paths:
-                s = calculate_srmr(path)
-                if s is not None: srmr_scores.append(s)
+            # 1-5. All metrics per clip; the metrics of a clip run concurrently
+            status_text.text("Running SRMR, SigMOS, VQScore, WVMOS and Sample Rate Analysis...")
+            from metrics.runner import compute_scores_batch, REPORT_METRICS, SIGMOS_KEYS
+            from metrics.samplerate_metric import get_recording_sr
             
-            score_srmr = np.mean(srmr_scores) if srmr_scores else 0.0
-            print(f"DEBUG: SRMR Finished. Score: {score_srmr}")
-            results.append({'Metric': 'SRMR', 'Score': score_srmr})
-            progress_bar.progress(25)
+            # Recording SR is read from the original file below, not per clip
+            metrics = REPORT_METRICS + ('Mic SR',)
+            total_steps = len(analysis_audio) * len(metrics)
+            done_steps = [0]
             
-            # 2. SigMOS
-            print("DEBUG: Starting SigMOS...")
-            status_text.text("Running SigMOS...")
-            sigmos_accumulator = {}
-            valid_sigmos_count = 0
+            def on_metric_done(name):
+                # Called on the script thread, so Streamlit calls are safe here
+                done_steps[0] += 1
+                progress_bar.progress(int(100 * done_steps[0] / total_steps))
+                status_text.text(f"Finished {name} ({done_steps[0]}/{total_steps})...")
             
-            for path in analysis_paths:
-                scores = calculate_sigmos(path)
-                if scores:
-                    valid_sigmos_count += 1
-                    for k, v in scores.items():
-                        sigmos_accumulator[k] = sigmos_accumulator.get(k, 0) + v
-                        
-            if valid_sigmos_count > 0:
-                for k, v in sigmos_accumulator.items():
-                    avg_val = v / valid_sigmos_count
-                    results.append({'Metric': k, 'Score': avg_val})
-            print(f"DEBUG: SigMOS Finished")
-            progress_bar.progress(50)
+            # WVMOS, VQScore and SIGMOS score all clips in batched forward passes
+            # (timed per stage when config.TRACE_PATH is set, see metrics/trace.py)
+            from metrics import trace
+            with trace.span('file', name=uploaded_file.name, audio_seconds=duration):
+                clip_scores = compute_scores_batch(analysis_audio, threads=config.METRIC_THREADS, on_metric_done=on_metric_done,
+                                                   metrics=metrics)
+            trace_events = trace.events()
+            if trace_events:
+                print(f"Trace saved to {trace.save()}")
             
-            # 3. VQScore
-            print("DEBUG: Starting VQScore...")
-            status_text.text("Running VQScore...")
-            vq_scores = []
-            for path in analysis_paths:
-                s = calculate_vqscore(path)
-                if s is not None: vq_scores.append(s)
-                
-            score_vq = np.mean(vq_scores) if vq_scores else 0.0
-            print(f"DEBUG: VQScore Finished: {score_vq}")
+            def mean_of(metric, default):
+                values = [scores[metric] for scores in clip_scores if scores[metric] is not None]
+                return np.mean(values) if values else default
+            
+            score_srmr = mean_of('SRMR', 0.0)
+            results.append({'Metric': 'SRMR', 'Score': score_srmr})
+            
+            # SigMOS: average over clips where the estimator succeeded
+            valid_sigmos = [scores for scores in clip_scores if scores['SIGMOS_DISC'] is not None]
+            if valid_sigmos:
+                for k in SIGMOS_KEYS:
+                    results.append({'Metric': k, 'Score': sum(scores[k] for scores in valid_sigmos) / len(valid_sigmos)})
+            
+            score_vq = mean_of('VQScore', 0.0)
             results.append({'Metric': 'VQScore', 'Score': score_vq})
-            progress_bar.progress(75)
             
-            # 4. WVMOS
-            print("DEBUG: Starting WVMOS...")
-            status_text.text("Running WVMOS...")
-            wvmos_scores = []
-            for path in analysis_paths:
-                s = calculate_wvmos(path)
-                if s is not None: wvmos_scores.append(s)
-                
-            score_wvmos = np.mean(wvmos_scores) if wvmos_scores else 0.0
-            print(f"DEBUG: WVMOS Finished: {score_wvmos}")
+            score_wvmos = mean_of('WVMOS', 0.0)
             results.append({'Metric': 'WVMOS', 'Score': score_wvmos})
             
-            # 5. Sample Rate Analysis
-            print("DEBUG: Starting Sample Rate Analysis...")
-            status_text.text("Analyzing Sample Rates...")
-            from metrics.samplerate_metric import get_recording_sr, get_mic_sr
-            
             # Recording SR: Check ORIGINAL file to see file usage
             rec_sr = get_recording_sr(tmp_path) 
             results.append({'Metric': 'Recording SR', 'Score': rec_sr})
             
             # Mic SR: Check samples (bandwidth analysis)
-            mic_sr_scores = []
-            for path in analysis_paths:
-                s = get_mic_sr(path)
-                if s is not None: mic_sr_scores.append(s)
-            
-            mic_sr = np.mean(mic_sr_scores) if mic_sr_scores else 0
+            mic_sr = mean_of('Mic SR', 0)
             results.append({'Metric': 'Mic SR', 'Score': mic_sr})
             
             progress_bar.progress(100)
             
-            print("DEBUG: Analysis and UI rendering complete.")
             status_text.text("Analysis Complete!")
             
             # Process Results
@@ -305,6 +265,10 @@ if uploaded_file is not None:
                         st.markdown(feedback)
             # ------------------------------------
             
+            if trace_events:
+                with st.expander("Timing and memory per stage"):
+                    st.dataframe(pd.DataFrame(trace.summary(trace_events)), use_container_width=True, hide_index=True)
+            
             # Download Button
             csv = df_results.to_csv(index=False).encode('utf-8')
             st.download_button(
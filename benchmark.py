@@ -0,0 +1,387 @@
+# Throughput / real-time factor / peak memory of every metric and of the two pipelines,
+# on a synthetic speech-like corpus (deterministic, generated locally: no network, CPU only).
+#     python benchmark.py                     quick profile, compared with benchmark_baseline.json
+#     python benchmark.py --profile full      adds 30 min and 2 h files
+#     python benchmark.py --save-baseline     record the results as the new baseline
+# Exits with 1 when a result regressed beyond the tolerances, failed (a missing score: ERROR rows,
+# None) or crashed. Metrics whose model isn't available are skipped (and the pipelines only
+# compared with the same models loaded). Failed results are never saved as the baseline.
+# No baseline is committed: record it on the reference machine, with every model available.
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import platform
+import tempfile
+import subprocess
+import warnings
+
+import numpy as np
+import soundfile as sf
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(ROOT, 'benchmark_baseline.json')
+CORPUS_DIR = os.path.join(tempfile.gettempdir(), 'tts_metrics_benchmark')
+
+# (name, sample rate, seconds, channels)
+CASES = {
+    'quick': [
+        ('2s-16k-mono', 16000, 2, 1),
+        ('30s-44k-stereo', 44100, 30, 2),
+        ('30s-48k-mono', 48000, 30, 1),
+        ('5min-48k-mono', 48000, 300, 1),  # long enough for smart sampling
+    ],
+    'full': [
+        ('30min-44k-stereo', 44100, 1800, 2),
+        ('2h-16k-mono', 16000, 7200, 1),
+    ],
+}
+
+# name -> (module, function, model in the model registry or None)
+TARGETS = {
+    'SRMR': ('metrics.srmr_metric', 'calculate_srmr', None),
+    'SIGMOS': ('metrics.sigmos_metric', 'calculate_sigmos', 'SIGMOS'),
+    'VQScore': ('metrics.vqscore_metric', 'calculate_vqscore', 'VQScore'),
+    'WVMOS': ('metrics.wvmos_metric', 'calculate_wvmos', 'WVMOS'),
+    'Mic SR': ('metrics.samplerate_metric', 'get_mic_sr', None),
+    'evaluate_file': ('evaluate', 'evaluate_file', None),
+    'process_file_smart': ('smart_evaluate', 'process_file_smart', None),
+}
+PIPELINES = ('evaluate_file', 'process_file_smart')
+
+# Regression gates: relative slack on the real-time factor / peak RSS, plus absolute
+# slack so sub-second timings and small allocations don't flag on noise
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.2
+MIN_SECONDS_SLACK = 0.05
+MIN_MEMORY_SLACK_MB = 32
+
+# Timed runs per case (best one counts); long files run once
+REPEATS = 3
+REPEAT_MAX_SECONDS = 60
+
+# Synthetic speech: syllables of voiced vowels (pulse train through formant resonators)
+# with fricative onsets, a syllabic envelope and pauses, over a low noise floor
+SYLLABLE_SECONDS = 0.25
+VOWEL_FORMANTS = [(730, 1090, 2440), (270, 2290, 3010), (530, 1840, 2480), (570, 840, 2410), (300, 870, 2240)]
+FORMANT_BANDWIDTHS = (80, 100, 120)
+NOISE_FLOOR = 10 ** (-55 / 20)
+
+
+def resonator(freq, bandwidth, sr):
+    # Two-pole resonance with unit gain at DC
+    r = np.exp(-np.pi * bandwidth / sr)
+    a = [1.0, -2 * r * np.cos(2 * np.pi * freq / sr), r * r]
+    return [sum(a)], a
+
+
+def syllable(rng, sr, start_seconds):
+    """
+    One syllable (or pause) of mono speech-like signal.
+    """
+    from scipy.signal import lfilter
+    n = int(SYLLABLE_SECONDS * sr)
+    if rng.random() < 0.15:
+        return np.zeros(n)
+    t = start_seconds + np.arange(n) / sr
+    # Slowly wandering pitch, as in running speech
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.3 * t) + 15 * np.sin(2 * np.pi * 1.7 * t) + rng.uniform(-10, 10)
+    phase = np.cumsum(f0 / sr)
+    voiced = 2 * (phase % 1.0) - 1
+    for freq, bandwidth in zip(VOWEL_FORMANTS[rng.integers(len(VOWEL_FORMANTS))], FORMANT_BANDWIDTHS):
+        b, a = resonator(min(freq, 0.45 * sr), bandwidth, sr)
+        voiced = lfilter(b, a, voiced)
+    voiced /= np.max(np.abs(voiced)) + 1e-9
+    y = voiced * np.hanning(n) * rng.uniform(0.2, 0.6)
+    if rng.random() < 0.4:
+        # Fricative onset: high-passed noise burst
+        m = n // 5
+        burst = np.diff(rng.standard_normal(m + 1)) * np.hanning(m) * 0.1
+        y[:m] += burst
+    return y
+
+
+def generate(path, sr, seconds, channels, seed):
+    """
+    Writes `seconds` of synthetic speech (16-bit WAV), generated block by block.
+    Extra channels are the first one delayed and attenuated, each with its own noise floor.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sr)
+    block_syllables = 240  # one minute per block
+    delays = [0] + [int(rng.integers(1, int(0.002 * sr) + 2)) for _ in range(channels - 1)]
+    gains = [1.0] + [float(rng.uniform(0.6, 0.9)) for _ in range(channels - 1)]
+    tail = np.zeros(max(delays))
+    written = 0
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=channels, subtype='PCM_16') as f:
+        while written < total:
+            mono = np.concatenate([syllable(rng, sr, (written / sr) + k * SYLLABLE_SECONDS)
+                                   for k in range(block_syllables)])[:total - written]
+            padded = np.concatenate([tail, mono])
+            block = np.empty((len(mono), channels))
+            for c, (delay, gain) in enumerate(zip(delays, gains)):
+                start = len(tail) - delay
+                block[:, c] = gain * padded[start:start + len(mono)] + NOISE_FLOOR * rng.standard_normal(len(mono))
+            tail = padded[len(padded) - len(tail):] if len(tail) else tail
+            f.write(np.clip(block, -1, 1))
+            written += len(mono)
+    return path
+
+
+def corpus_file(corpus, name, sr, seconds, channels):
+    """
+    Path of a corpus file, generated on first use (the name seeds it, so it is the same file everywhere).
+    """
+    path = os.path.join(corpus, f"{name}.wav")
+    if not os.path.exists(path):
+        os.makedirs(corpus, exist_ok=True)
+        print(f"Generating {name}...")
+        # Written under a temporary name so an interrupted run leaves no truncated file
+        generate(path + '.part.wav', sr, seconds, channels, seed=zlib.crc32(name.encode()))
+        os.replace(path + '.part.wav', path)
+    return path
+
+
+def current_rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def reset_peak_rss():
+    """
+    Restarts the peak-RSS high-water mark (Linux); False where that isn't possible.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def succeeded(value, expected=()):
+    """
+    Whether a result holds every score: no None (in score dicts and batches too), and from the
+    pipelines a non-ERROR row for each `expected` metric (the smart pipeline leaves failed ones out).
+    """
+    if value is None:
+        return False
+    if isinstance(value, dict):
+        return all(score is not None for score in value.values())
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return False
+        if all(isinstance(row, dict) and 'PASS OR FAIL' in row for row in value):
+            scored = {row['Metric'] for row in value if row['PASS OR FAIL'] != 'ERROR'}
+            return scored >= set(expected)
+        return all(succeeded(item, expected) for item in value)
+    return True
+
+
+def report_rows(models):
+    """
+    Report rows the pipelines must score with these models loaded (the others are ERROR by design).
+    """
+    from metrics.runner import REPORT_METRICS, MODEL_METRICS, SIGMOS_KEYS
+    return [row for name in REPORT_METRICS if name not in MODEL_METRICS or name in models
+            for row in (SIGMOS_KEYS if name == 'SIGMOS' else [name])]
+
+
+def measure(target, path, warmup_path, repeats):
+    """
+    Runs in a fresh interpreter (see run_case): times `target` on `path` after loading its
+    model and a warm-up call on `warmup_path` (imports, lazy setup), with the score cache off.
+    """
+    import importlib
+    warnings.filterwarnings("ignore")
+    import config
+    config.SCORE_CACHE_PATH = None
+    from metrics.audio import AudioBuffer
+    from metrics.registry import get_registry
+
+    module, function, model = TARGETS[target]
+    func = getattr(importlib.import_module(module), function)
+    result = {}
+    if model is not None:
+        try:
+            get_registry().get(model)
+        except Exception as e:
+            return {'skipped': f"{model} model unavailable ({type(e).__name__})"}
+    if target in PIPELINES:
+        from metrics.runner import warm_up_models
+        warm_up_models()
+        result['models'] = sorted(name for name, stats in get_registry().stats().items() if stats['loaded'])
+
+    def call(file_path):
+        # Metrics get a fresh AudioBuffer (decode + resample included), the pipelines a path
+        return func(file_path) if target in PIPELINES else func(AudioBuffer.from_file(file_path))
+
+    call(warmup_path)
+    rss_before = current_rss_mb()
+    peak_reset = reset_peak_rss()
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = call(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    audio_seconds = sf.info(path).duration
+    peak = peak_rss_mb()
+    result.update({
+        'seconds': best,
+        'audio_seconds': audio_seconds,
+        'rtf': best / audio_seconds,
+        'throughput': audio_seconds / best,
+        'peak_rss_mb': peak,
+        # Working memory of the call itself (relative to the loaded, warmed-up process)
+        'peak_delta_mb': peak - rss_before if peak_reset else None,
+        # A metric that errored (or a model that didn't load) makes the timing meaningless
+        'ok': succeeded(value, report_rows(result['models']) if target in PIPELINES else ()),
+    })
+    return result
+
+
+def run_case(target, path, warmup_path, repeats):
+    """
+    measure() in a subprocess, so every result has its own peak RSS and cold caches.
+    """
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', target, path, warmup_path, str(repeats)],
+                         capture_output=True, text=True, cwd=ROOT)
+    try:
+        return json.loads(out.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'error': (out.stderr.strip().splitlines() or ['no output'])[-1]}
+
+
+def machine():
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'memory_gb': round(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3, 1),
+        'python': platform.python_version(),
+    }
+
+
+def compare(result, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Regressions of one result against its baseline entry: [] when within tolerance,
+    None when they aren't comparable (skipped, failed, or different models loaded).
+    """
+    if baseline is None or 'rtf' not in result or 'rtf' not in baseline:
+        return None
+    if not result['ok'] or result.get('models') != baseline.get('models'):
+        return None
+    regressions = []
+    allowed_seconds = max(baseline['seconds'] * (1 + time_tolerance), baseline['seconds'] + MIN_SECONDS_SLACK)
+    if result['seconds'] > allowed_seconds:
+        regressions.append(f"RTF {result['rtf']:.4f} vs {baseline['rtf']:.4f} (+{result['seconds'] / baseline['seconds'] - 1:.0%})")
+    allowed_mb = max(baseline['peak_rss_mb'] * (1 + memory_tolerance), baseline['peak_rss_mb'] + MIN_MEMORY_SLACK_MB)
+    if result['peak_rss_mb'] > allowed_mb:
+        regressions.append(f"peak RSS {result['peak_rss_mb']:.0f} MB vs {baseline['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {'machine': None, 'results': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--measure':
+        target, path, warmup_path, repeats = sys.argv[2:6]
+        result = measure(target, path, warmup_path, int(repeats))
+        # Last line of stdout (the metrics print their own progress before it)
+        print(json.dumps(result))
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmark the metrics on a synthetic speech corpus')
+    parser.add_argument('--profile', choices=['quick', 'full'], default='quick', help="Cases to run ('full' adds 30 min and 2 h files)")
+    parser.add_argument('--cases', nargs='*', help='Only these cases (names as listed in CASES)')
+    parser.add_argument('--targets', nargs='*', choices=list(TARGETS), help='Only these metrics / pipelines')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='Where the generated audio is kept between runs')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline results to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results in the baseline (merged by case / target)')
+    parser.add_argument('--tolerance', type=float, default=TIME_TOLERANCE, help='Allowed relative real-time factor increase')
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE, help='Allowed relative peak RSS increase')
+    parser.add_argument('--output', help='Also write the results as JSON here')
+    args = parser.parse_args()
+
+    cases = CASES['quick'] + (CASES['full'] if args.profile == 'full' else [])
+    if args.cases:
+        cases = [case for profile in CASES.values() for case in profile if case[0] in args.cases]
+    targets = args.targets or list(TARGETS)
+
+    baseline = load_baseline(args.baseline)
+    # Results only carry over between machines of the same shape
+    if baseline['machine'] and any(baseline['machine'].get(key) != machine()[key] for key in ('machine', 'cpus', 'memory_gb')):
+        print(f"Note: baseline recorded on {baseline['machine']}, this is {machine()}")
+
+    results = {}
+    regressions = {}
+    failed = {}
+    print(f"{'Case':<18} {'Target':<19} {'Seconds':>9} {'RTF':>8} {'x real time':>12} {'Peak RSS':>10} {'Call RSS':>9}  Status")
+    for name, sr, seconds, channels in cases:
+        path = corpus_file(args.corpus, name, sr, seconds, channels)
+        warmup_path = corpus_file(args.corpus, f"warmup-{sr // 1000}k-{channels}ch", sr, 1, channels)
+        repeats = REPEATS if seconds <= REPEAT_MAX_SECONDS else 1
+        for target in targets:
+            key = f"{name}:{target}"
+            result = results[key] = run_case(target, path, warmup_path, repeats)
+            if 'rtf' not in result:
+                # Only an unavailable model is skipped; a crashed measurement fails the run
+                if 'skipped' not in result:
+                    regressions[key] = failed[key] = [f"error: {result.get('error')}"]
+                status = f"SKIPPED ({result['skipped']})" if 'skipped' in result else f"ERROR ({result.get('error')})"
+                print(f"{name:<18} {target:<19} {'':>9} {'':>8} {'':>12} {'':>10} {'':>9}  {status}")
+                continue
+            if not result['ok']:
+                regressions[key] = failed[key] = ['failed (missing scores)']
+                found = None
+            else:
+                found = compare(result, baseline['results'].get(key), args.tolerance, args.memory_tolerance)
+                if found:
+                    regressions[key] = found
+            status = 'FAILED' if not result['ok'] else 'no baseline' if found is None else '; '.join(found) if found else 'OK'
+            delta = f"{result['peak_delta_mb']:.0f} MB" if result['peak_delta_mb'] is not None else '-'
+            print(f"{name:<18} {target:<19} {result['seconds']:>9.3f} {result['rtf']:>8.4f} {result['throughput']:>12.1f} "
+                  f"{result['peak_rss_mb']:>7.0f} MB {delta:>9}  {status}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'machine': machine(), 'results': results}, f, indent=2)
+    if args.save_baseline:
+        measured = {key: result for key, result in results.items() if 'rtf' in result and result['ok']}
+        baseline = {'machine': machine(), 'results': dict(baseline['results'], **measured)}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline: {len(measured)} results saved to {args.baseline}")
+        # Timing changes are what a new baseline records; failures still fail the run
+        regressions = failed
+    if regressions:
+        print(f"{len(regressions)} regression(s):")
+        for key, found in regressions.items():
+            print(f"  {key}: {'; '.join(found)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
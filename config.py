@@ -14,6 +14,65 @@ THRESHOLDS = {
 
 GIT_VERSION = "5ea5b92"
 
+import os
+
+# Persistent score cache (SQLite), in the user's cache directory (~/.cache or $XDG_CACHE_HOME),
+# not the checkout. Set to None, or the SCORE_CACHE_PATH environment variable to '', to disable.
+# Manage with: python -m metrics.cache stats | invalidate [--metric M] [--file F] | evict
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'tts_metrics')
+SCORE_CACHE_PATH = os.environ.get('SCORE_CACHE_PATH', os.path.join(CACHE_DIR, 'score_cache.sqlite')) or None
+SCORE_CACHE_MAX_MB = 256
+
+# WVMOS inference backend: 'torch', 'onnx' (onnxruntime; export first with
+# `python -m wvmos.export_onnx`) or 'auto' (onnx when the exported model exists).
+# Can be overridden with the WVMOS_BACKEND environment variable.
+WVMOS_BACKEND = os.environ.get('WVMOS_BACKEND', 'auto')
+WVMOS_ONNX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'wv_mos.onnx')
+
+# How WVMOS scores files longer than its 5-minute window:
+# 'overlap' - 5-minute windows with 2.5-minute stride (every sample encoded twice)
+# 'trimmed' - each sample encoded once (+15s context margins), mean of the whole-file frames
+# test_wvmos_long_form.py checks the trimmed mode's deviation from whole-file scoring;
+# test_wvmos_strategy.py compares the modes on a real recording.
+WVMOS_LONG_FORM = 'overlap'
+
+# WVMOS window length in seconds, or 'auto': the longest window (300s-30min, in 30s steps)
+# whose estimated peak memory fits WVMOS_MEMORY_FRACTION of the machine's (or container's) RAM.
+# 300 is the original fixed window (what the scores were validated with); 'auto' only goes
+# below it when running out of memory actually forces it: the window is then halved (down
+# to 60s) and the file scored again. Both overridable via the environment.
+WVMOS_WINDOW_SECONDS = os.environ.get('WVMOS_WINDOW_SECONDS', 'auto')
+WVMOS_MEMORY_FRACTION = float(os.environ.get('WVMOS_MEMORY_FRACTION', 0.5))
+# Attention of the torch backend: 'sdpa' (memory linear in the window) or 'eager' (materializes
+# the attention scores, like the onnx export). Sizes the 'auto' window without loading the model.
+WVMOS_ATTENTION = os.environ.get('WVMOS_ATTENTION', 'sdpa')
+
+# RAM budget (MB) for the resident metric models (SigMOS, VQScore, WVMOS); 0 = unlimited.
+# Over budget, the least recently used idle model is evicted and reloaded when next needed,
+# and metrics wait for room instead of loading next to models still in use.
+# Check the models' sizes with `python -m metrics.registry`. Overridable via the environment.
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 0))
+
+# Per-stage timing / memory trace (metrics/trace.py): '.jsonl' = JSON lines (appended),
+# anything else = Chrome trace. None = off. The CLIs set it with --trace; overridable via the environment.
+TRACE_PATH = os.environ.get('TRACE_PATH') or None
+
+# Threads used to run the metrics of a single file concurrently.
+# Process-pool workers (--workers N) always use 1.
+METRIC_THREADS = 4
+
+# SigMOS onnxruntime session. Each can be overridden with the environment variable of the same name.
+# Intra-op threads: 'auto' = the cores left per concurrent metric (cores // METRIC_THREADS), so SigMOS
+# doesn't oversubscribe the box while the other metrics of the file run; 0 = onnxruntime's default (all cores).
+# Process-pool workers (--workers N) always use their share of the cores (1 with one worker per core).
+SIGMOS_INTRA_OP_THREADS = os.environ.get('SIGMOS_INTRA_OP_THREADS', 'auto')
+SIGMOS_INTER_OP_THREADS = int(os.environ.get('SIGMOS_INTER_OP_THREADS', 1))
+SIGMOS_EXECUTION_MODE = os.environ.get('SIGMOS_EXECUTION_MODE', 'sequential')         # 'sequential' or 'parallel'
+SIGMOS_GRAPH_OPTIMIZATION = os.environ.get('SIGMOS_GRAPH_OPTIMIZATION', 'all')      # 'disable', 'basic', 'extended' or 'all'
+# Keep the optimized graph in CACHE_DIR/sigmos so later processes skip re-optimizing it
+# (keyed by level, onnxruntime version and machine: machine-specific with 'all')
+SIGMOS_CACHE_OPTIMIZED = os.environ.get('SIGMOS_CACHE_OPTIMIZED', '1') != '0'
+
 METRIC_DESCRIPTIONS = {
     'SRMR': 'Technical measurement of reverberation and room acoustics',
     'SIGMOS_DISC': 'Audio continuity and smoothness',
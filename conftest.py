@@ -0,0 +1,23 @@
+import os
+import pytest
+
+import config
+
+@pytest.fixture(scope='session', autouse=True)
+def score_cache_path(tmp_path_factory):
+    """
+    Points the score cache at a throwaway database for the whole session, so tests never read
+    scores left in the user's cache or write into it. Subprocesses pick it up from the environment.
+    """
+    path = str(tmp_path_factory.mktemp('score_cache') / 'score_cache.sqlite')
+    saved = config.SCORE_CACHE_PATH, os.environ.get('SCORE_CACHE_PATH')
+    config.SCORE_CACHE_PATH = path
+    os.environ['SCORE_CACHE_PATH'] = path
+    try:
+        yield path
+    finally:
+        config.SCORE_CACHE_PATH = saved[0]
+        if saved[1] is None:
+            os.environ.pop('SCORE_CACHE_PATH', None)
+        else:
+            os.environ['SCORE_CACHE_PATH'] = saved[1]
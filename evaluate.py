@@ -1,16 +1,20 @@
 import os
 import argparse
 import pandas as pd
+import soundfile as sf
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import traceback
 import warnings
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
 
-from metrics.srmr_metric import calculate_srmr
-from metrics.sigmos_metric import calculate_sigmos
-from metrics.vqscore_metric import calculate_vqscore
-from metrics.wvmos_metric import calculate_wvmos
+from metrics.audio import as_audio
+from metrics.runner import compute_scores_batch, warm_up_models, REPORT_METRICS
+from metrics.cache import record_run
+from metrics import trace
 
 METRIC_DESCRIPTIONS = {
     'SRMR': 'Technical measurement of reverberation and room acoustics',
@@ -24,31 +28,12 @@ METRIC_DESCRIPTIONS = {
 import config
 THRESHOLDS = config.THRESHOLDS
 
-def evaluate_file(file_path):
-    # Calculate all scores first
-    scores = {}
-    
-    # SRMR
-    scores['SRMR'] = calculate_srmr(file_path)
-    
-    # SIGMOS
-    sigmos_scores = calculate_sigmos(file_path)
-    if sigmos_scores:
-        scores.update(sigmos_scores)
-    else:
-        scores['SIGMOS_DISC'] = None
-        scores['SIGMOS_OVRL'] = None
-        scores['SIGMOS_REVERB'] = None
-        
-    # VQScore
-    scores['VQScore'] = calculate_vqscore(file_path)
-    
-    # WVMOS
-    scores['WVMOS'] = calculate_wvmos(file_path)
-    
+# Files longer than this are scored on their own instead of in a batch
+BATCH_MAX_SECONDS = 300
+
+def build_rows(filename, scores):
     # Build list of rows for this file
     rows = []
-    filename = os.path.basename(file_path)
     
     for metric, threshold in THRESHOLDS.items():
         score = scores.get(metric)
@@ -72,11 +57,157 @@ def evaluate_file(file_path):
         
     return rows
 
+def evaluate_file(file_path):
+    return evaluate_files([file_path])
+
+def evaluate_files(file_paths):
+    """
+    Rows for several files. Metrics that support it (WVMOS, VQScore, SIGMOS) run batched over the files.
+    """
+    # Decode once; every metric reads the variant it needs from the shared buffer
+    audios = [as_audio(file_path) for file_path in file_paths]
+    
+    # Calculate all scores first (metrics run concurrently, see config.METRIC_THREADS)
+    all_scores = compute_scores_batch(audios, metrics=REPORT_METRICS)
+    
+    rows = []
+    for audio, scores in zip(audios, all_scores):
+        rows.extend(build_rows(os.path.basename(str(audio)), scores))
+    return rows
+
+def make_groups(files, batch_size, workers=1):
+    """
+    Splits files into batches of up to batch_size; long files get a batch of their own.
+    With several workers, batches are capped at ceil(files / workers) so every worker gets one.
+    """
+    long_files = set()
+    for file_path in files:
+        try:
+            if sf.info(file_path).duration > BATCH_MAX_SECONDS:
+                long_files.add(file_path)
+        except Exception:
+            long_files.add(file_path)
+    if workers > 1:
+        batch_size = min(batch_size, -(-(len(files) - len(long_files)) // workers))
+
+    groups = []
+    current = []
+    for file_path in files:
+        if file_path in long_files or batch_size <= 1:
+            groups.append([file_path])
+            continue
+        current.append(file_path)
+        if len(current) >= batch_size:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+def init_worker(num_threads, score_cache_path, trace_path=None):
+    """
+    Process-pool initializer: caps each worker's intra-op threads so N workers
+    don't oversubscribe the box, and loads every model once per worker.
+    """
+    import torch
+    torch.set_num_threads(num_threads)
+    warnings.filterwarnings("ignore")
+    
+    # One file at a time per worker: no intra-file metric threads
+    config.METRIC_THREADS = 1
+    config.SIGMOS_INTRA_OP_THREADS = num_threads
+    config.SIGMOS_INTER_OP_THREADS = 1
+    config.SIGMOS_EXECUTION_MODE = 'sequential'
+    # Spawned workers re-import config; carry over CLI overrides
+    config.SCORE_CACHE_PATH = score_cache_path
+    config.TRACE_PATH = trace_path
+    
+    warm_up_models()
+
+def _audio_seconds(file_paths):
+    total = 0.0
+    for file_path in file_paths:
+        try:
+            total += sf.info(file_path).duration
+        except Exception:
+            pass
+    return total
+
+def _score(func, file_path, kwargs):
+    """
+    func(file_path, **kwargs). A failed batch is retried file by file, and a file that fails
+    on its own gets ERROR rows, so one bad file never drops the rows of the others.
+    """
+    try:
+        return func(file_path, **kwargs)
+    except Exception as e:
+        traceback.print_exc()
+        print(f"Failed to process {file_path}: {e}")
+    if isinstance(file_path, list) and len(file_path) > 1:
+        print(f"Retrying the {len(file_path)} files of the batch one by one")
+        rows = []
+        for path in file_path:
+            rows.extend(_score(func, [path], kwargs))
+        return rows
+    path = file_path[0] if isinstance(file_path, list) else file_path
+    return build_rows(os.path.basename(str(path)), {})
+
+def _run_one(index, func, file_path, kwargs):
+    """
+    (index, rows, trace events recorded while processing it).
+    """
+    paths = file_path if isinstance(file_path, list) else [file_path]
+    name = os.path.basename(paths[0]) if len(paths) == 1 else f"batch of {len(paths)}"
+    with trace.span('file', name=name, files=[str(path) for path in paths]) as event:
+        if event is not None:
+            event['audio_seconds'] = _audio_seconds(paths)
+        rows = _score(func, file_path, kwargs)
+    return index, rows, trace.drain()
+
+def run_batch(func, files, workers=1, **kwargs):
+    """
+    Runs func(item, **kwargs) -> rows for every item (a file path or a batch of paths).
+    With workers > 1 files are spread over a process pool; results arrive out of
+    order and are reassembled here so the report keeps the input file order.
+    """
+    results = [None] * len(files)
+    
+    if workers <= 1:
+        for i, file_path in enumerate(tqdm(files)):
+            _, results[i], events = _run_one(i, func, file_path, kwargs)
+            trace.extend(events)
+    else:
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn: torch / onnxruntime thread pools are not fork-safe
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=init_worker, initargs=(num_threads, config.SCORE_CACHE_PATH, config.TRACE_PATH)) as executor:
+            futures = [executor.submit(_run_one, i, func, file_path, kwargs) for i, file_path in enumerate(files)]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                i, rows, events = future.result()
+                results[i] = rows
+                # Workers record their own spans; the report is written here
+                trace.extend(events)
+                
+    all_rows = []
+    for rows in results:
+        all_rows.extend(rows)
+    return all_rows
+
 def main():
     parser = argparse.ArgumentParser(description='TTS Audio Quality Evaluation')
     parser.add_argument('input_path', help='Path to audio file or directory')
     parser.add_argument('--output', default='evaluation_report.csv', help='Output CSV file')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (each loads the models once)')
+    parser.add_argument('--threads', type=int, default=config.METRIC_THREADS, help='Threads for running the metrics of one file concurrently')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not update the score cache')
+    parser.add_argument('--batch-size', type=int, default=8, help='Files scored together per batched WVMOS / VQScore / SIGMOS pass')
+    parser.add_argument('--trace', default=config.TRACE_PATH, help='Write per-stage timings / memory here (.jsonl: JSON lines, else Chrome trace)')
     args = parser.parse_args()
+    config.METRIC_THREADS = args.threads
+    config.TRACE_PATH = args.trace
+    if args.no_cache:
+        config.SCORE_CACHE_PATH = None
     
     input_path = args.input_path
     files = []
@@ -94,15 +225,7 @@ def main():
     
     print(f"Found {len(files)} files to evaluate.")
     
-    all_rows = []
-    for file_path in tqdm(files):
-        try:
-            file_rows = evaluate_file(file_path)
-            all_rows.extend(file_rows)
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            print(f"Failed to process {file_path}: {e}")
+    all_rows = run_batch(evaluate_files, make_groups(files, args.batch_size, args.workers), workers=args.workers)
             
     df = pd.DataFrame(all_rows)
     
@@ -111,7 +234,18 @@ def main():
     df = df[cols]
     
     df.to_csv(args.output, index=False)
+    # Raw scores are kept so threshold changes can be applied with regrade_reports.py
+    run = record_run(os.path.splitext(os.path.basename(args.output))[0], all_rows, report=os.path.abspath(args.output))
     print(f"Report saved to {args.output}")
+    if run:
+        print(f"Scores recorded as run {run} (regrade with: python regrade_reports.py --run {run})")
+    save_trace()
+
+def save_trace():
+    if not trace.enabled():
+        return
+    trace.print_summary(trace.events())
+    print(f"Trace saved to {trace.save()}")
 
 if __name__ == '__main__':
     main()
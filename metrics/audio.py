@@ -0,0 +1,208 @@
+import threading
+import numpy as np
+import soundfile as sf
+import librosa
+
+from metrics import resample, trace
+
+# Sample format of every decoded / resampled signal
+DTYPE = np.float32
+
+# Decoding + resampling, as it appears in the metrics' score-cache fingerprints
+FINGERPRINT = f"{np.dtype(DTYPE).name}-{resample.FINGERPRINT}"
+
+
+class AudioBuffer:
+    """
+    Decoded audio shared by all metrics of one file.
+    The file is decoded once; resampled / downmixed variants are computed
+    lazily on first request and kept for the other metrics. Safe to share
+    between the threads of one file's metrics: each variant is built once.
+    
+    source / sampling identify where the samples came from (file path and
+    e.g. which smart-sampling clip) and key the score cache.
+    """
+    def __init__(self, data, sr, name=None, source=None, sampling=''):
+        self.name = name
+        self.source = source
+        self.sampling = sampling
+        self._data = None
+        self._sr = sr
+        if data is not None:
+            self._set_data(data, sr)
+        self._variants = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _set_data(self, data, sr):
+        data = np.asarray(data)
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+
+        # float32 throughout; integers normalized to [-1, 1]
+        if np.issubdtype(data.dtype, np.integer):
+            data = data.astype(DTYPE) / DTYPE(np.iinfo(data.dtype).max)
+        else:
+            data = data.astype(DTYPE, copy=False)
+
+        self._data = data  # (T, C), as returned by soundfile
+        self._sr = sr
+
+    @classmethod
+    def from_file(cls, path):
+        # Decoding is deferred until a metric needs samples,
+        # so a file whose scores are all cached is never decoded.
+        return cls(None, None, name=path, source=path)
+
+    def _decode(self):
+        with self._lock:
+            if self._data is not None:
+                return
+            with trace.span('decode') as event:
+                try:
+                    data, sr = sf.read(self.source, dtype='float32', always_2d=True)
+                except Exception:
+                    # Fall back to librosa/audioread for formats libsndfile cannot decode
+                    y, sr = librosa.load(self.source, sr=None, mono=False)
+                    data = np.atleast_2d(y).T
+                if event is not None:
+                    event['audio_seconds'] = data.shape[0] / sr
+            self._set_data(data, sr)
+
+    @property
+    def decoded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._decode()
+        return self._data
+
+    @property
+    def sr(self):
+        if self._sr is None:
+            try:
+                self._sr = sf.info(self.source).samplerate
+            except Exception:
+                self._decode()
+        return self._sr
+
+    def __str__(self):
+        return self.name if self.name is not None else '<in-memory audio>'
+
+    @property
+    def channels(self):
+        return self.data.shape[1]
+
+    @property
+    def duration(self):
+        return self.data.shape[0] / self.sr
+
+    def get(self, sr=None, channels='mono', res_type='polyphase'):
+        """
+        Returns the signal in the layout a metric expects.
+        channels:
+        - 'first': first channel
+        - 'mono':  downmix (what librosa.load(mono=True) gives)
+        - 'all':   (C, T) (what librosa.load(mono=False) gives)
+        Always float32 (DTYPE), resampled or not.
+        sr=None keeps the native rate. res_type 'polyphase' is metrics.resample
+        (blockwise, cached filters); anything else goes to librosa.resample.
+        """
+        if sr is None or sr == self.sr:
+            sr = self.sr
+            res_type = None
+
+        key = (sr, channels, res_type)
+        if key in self._variants:
+            return self._variants[key]
+            
+        # One lock per variant: concurrent metrics wait for a variant being
+        # built instead of building it twice, but unrelated variants don't block.
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self._variants:
+                return self._variants[key]
+            if sr != self.sr:
+                x = self.get(channels=channels)
+                with trace.span('resample', from_sr=self.sr, to_sr=sr, audio_seconds=x.shape[-1] / self.sr):
+                    if res_type == 'polyphase':
+                        y = resample.resample(x, self.sr, sr)
+                    else:
+                        y = librosa.resample(x, orig_sr=self.sr, target_sr=sr, res_type=res_type)
+            elif channels == 'first':
+                y = self.data[:, 0]
+            elif channels == 'mono':
+                y = librosa.to_mono(self.get(channels='all'))
+            elif channels == 'all':
+                y = np.ascontiguousarray(self.data.T)
+            else:
+                raise ValueError(f"Unknown channel layout: {channels}")
+            self._variants[key] = y
+        return self._variants[key]
+
+
+def as_audio(audio):
+    """
+    Accepts a file path or an AudioBuffer and returns an AudioBuffer.
+    """
+    if isinstance(audio, AudioBuffer):
+        return audio
+    return AudioBuffer.from_file(audio)
+
+
+def chunk_offsets(duration, num_chunks=5, chunk_duration=30.0):
+    """
+    Start times (s) of `num_chunks` clips, each centred in an equal segment of the file.
+    """
+    offsets = []
+    segment_length = duration / num_chunks
+    for i in range(num_chunks):
+        # Center of the segment
+        segment_center = (i * segment_length) + (segment_length / 2)
+        start_time = max(0, segment_center - (chunk_duration / 2))
+
+        # Boundary checks
+        if start_time + chunk_duration > duration:
+            start_time = max(0, duration - chunk_duration)
+        offsets.append(start_time)
+    return offsets
+
+
+def chunk_sampling(index, num_chunks, chunk_duration):
+    """
+    Sampling parameters of one smart-sampling clip (part of its cache key).
+    """
+    return f"smart:{index}/{num_chunks}:{chunk_duration}s"
+
+
+def extract_chunks(path, num_chunks=5, chunk_duration=30.0):
+    """
+    Returns in-memory AudioBuffers (mono) for the smart-sampling clips of a file.
+    Clips are read by seeking inside one open SoundFile, so the file is never
+    decoded from the start per clip and nothing is written to disk.
+    """
+    chunks = []
+    try:
+        with trace.span('decode', name='extract_chunks', file=path), sf.SoundFile(path) as f:
+            sr = f.samplerate
+            for i, start_time in enumerate(chunk_offsets(f.frames / sr, num_chunks, chunk_duration)):
+                # Same frames as librosa.load(offset=..., duration=...), which truncates
+                f.seek(int(start_time * sr))
+                y = f.read(int(chunk_duration * sr), dtype='float32', always_2d=True)
+                chunks.append(AudioBuffer(librosa.to_mono(y.T), sr, name=f"{path}_chunk_{i}",
+                                          source=path, sampling=chunk_sampling(i, num_chunks, chunk_duration)))
+    except Exception as e:
+        print(f"Seeking extraction failed ({e}), decoding clips with librosa...")
+        chunks = []
+        duration = librosa.get_duration(path=path)
+        for i, start_time in enumerate(chunk_offsets(duration, num_chunks, chunk_duration)):
+            try:
+                y, sr = librosa.load(path, sr=None, offset=start_time, duration=chunk_duration)
+                chunks.append(AudioBuffer(y, sr, name=f"{path}_chunk_{i}",
+                                          source=path, sampling=chunk_sampling(i, num_chunks, chunk_duration)))
+            except Exception as e:
+                print(f"Error extracting chunk {i}: {e}")
+    return chunks
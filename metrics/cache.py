@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+
+import config
+
+_score_cache = None
+_cache_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    content_hash TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    model_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (content_hash, metric, model_hash, params)
+);
+CREATE INDEX IF NOT EXISTS scores_accessed ON scores (accessed);
+CREATE TABLE IF NOT EXISTS file_digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS run_results (
+    run TEXT NOT NULL,
+    report TEXT,
+    filename TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    score REAL,
+    created REAL NOT NULL,
+    PRIMARY KEY (run, filename, metric)
+);
+"""
+
+# Rows written between two eviction checks
+EVICT_EVERY = 100
+
+
+def _digest_file(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ScoreCache:
+    """
+    Persistent metric score cache (SQLite).
+    Key: (audio content hash, metric name, model fingerprint, sampling params).
+    Least recently used rows are evicted once the stored scores exceed max_bytes.
+    Safe to share between threads and between the processes of a worker pool.
+    """
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._digests = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def file_digest(self, path):
+        """
+        Content hash of a file. Remembered per (path, size, mtime) so reruns
+        over an unchanged corpus don't re-read every file.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        memo_key = (path, st.st_size, st.st_mtime)
+        if memo_key in self._digests:
+            return self._digests[memo_key]
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT digest FROM file_digests WHERE path = ? AND size = ? AND mtime = ?", memo_key
+            ).fetchone()
+        if row:
+            digest = row[0]
+        else:
+            digest = _digest_file(path)
+            with self._lock:
+                self.conn.execute("INSERT OR REPLACE INTO file_digests VALUES (?, ?, ?, ?)", memo_key + (digest,))
+                self.conn.commit()
+
+        self._digests[memo_key] = digest
+        return digest
+
+    def audio_key(self, audio):
+        """
+        (content_hash, params) for an AudioBuffer: the source file's digest plus
+        how the audio was taken from it, or a digest of the samples themselves.
+        """
+        if audio.source is not None:
+            return self.file_digest(audio.source), audio.sampling
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(audio.sr).encode())
+        h.update(audio.data.tobytes())
+        return h.hexdigest(), audio.sampling
+
+    def get(self, content_hash, metric, model_hash, params=''):
+        """
+        Returns (True, value) on a hit, (False, None) on a miss.
+        """
+        key = (content_hash, metric, model_hash, params)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM scores WHERE content_hash = ? AND metric = ? AND model_hash = ? AND params = ?", key
+            ).fetchone()
+            if row is None:
+                return False, None
+            self.conn.execute(
+                "UPDATE scores SET accessed = ? WHERE content_hash = ? AND metric = ? AND model_hash = ? AND params = ?",
+                (time.time(),) + key
+            )
+            self.conn.commit()
+        return True, json.loads(row[0])
+
+    def put(self, content_hash, metric, model_hash, params, value):
+        value = json.dumps(value)
+        size = len(value) + len(content_hash) + len(metric) + len(model_hash) + len(params)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, metric, model_hash, params, value, size, time.time())
+            )
+            self.conn.commit()
+            self._puts += 1
+            check = self._puts % EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def size(self):
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM scores").fetchone()[0]
+
+    def evict(self, max_bytes=None):
+        """
+        Drops least recently used scores until the total is within max_bytes.
+        Returns the number of rows removed.
+        """
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        if max_bytes is None:
+            return 0
+
+        removed = 0
+        with self._lock:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM scores").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            cursor = self.conn.execute("SELECT rowid, size FROM scores ORDER BY accessed")
+            doomed = []
+            for rowid, size in cursor:
+                if total <= max_bytes:
+                    break
+                doomed.append((rowid,))
+                total -= size
+            self.conn.executemany("DELETE FROM scores WHERE rowid = ?", doomed)
+            self.conn.commit()
+            removed = len(doomed)
+        return removed
+
+    def invalidate(self, metric=None, content_hash=None):
+        """
+        Deletes cached scores, optionally only for one metric and/or one audio hash.
+        Returns the number of rows removed.
+        """
+        query = "DELETE FROM scores"
+        clauses, args = [], []
+        if metric is not None:
+            clauses.append("metric = ?")
+            args.append(metric)
+        if content_hash is not None:
+            clauses.append("content_hash = ?")
+            args.append(content_hash)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        with self._lock:
+            removed = self.conn.execute(query, args).rowcount
+            self.conn.commit()
+        return removed
+
+    def record_run(self, run, rows, report=None, replace=False):
+        """
+        Stores the raw scores of a run (report rows with Filename / Metric / Score)
+        so it can be regraded later without rescoring. An existing run of the same
+        id is only replaced with replace=True (ValueError otherwise).
+        """
+        now = time.time()
+        values = [(run, report, row['Filename'], row['Metric'], row['Score'], now) for row in rows]
+        with self._lock:
+            exists = self.conn.execute("SELECT 1 FROM run_results WHERE run = ? LIMIT 1", (run,)).fetchone()
+            if exists and not replace:
+                raise ValueError(f"A run named {run!r} is already recorded")
+            self.conn.execute("DELETE FROM run_results WHERE run = ?", (run,))
+            self.conn.executemany("INSERT OR REPLACE INTO run_results VALUES (?, ?, ?, ?, ?, ?)", values)
+            self.conn.commit()
+
+    def load_run(self, run):
+        """
+        Returns (report path, [(filename, metric, score), ...]) of a recorded run:
+        `run` is a run id, or a report name for its latest run (see run_id).
+        """
+        query = "SELECT report, filename, metric, score FROM run_results WHERE run = ? ORDER BY rowid"
+        with self._lock:
+            rows = self.conn.execute(query, (run,)).fetchall()
+            if not rows:
+                latest = self.conn.execute(
+                    "SELECT run FROM run_results WHERE substr(run, 1, ?) = ? GROUP BY run ORDER BY MAX(created) DESC LIMIT 1",
+                    (len(run) + 1, run + '@')
+                ).fetchone()
+                if latest:
+                    rows = self.conn.execute(query, latest).fetchall()
+        if rows:
+            return rows[0][0], [row[1:] for row in rows]
+        raise KeyError(f"No recorded run named {run!r}")
+
+    def runs(self):
+        """
+        [(run, report path, rows, created)] of every recorded run, oldest first.
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT run, report, COUNT(*), MAX(created) FROM run_results GROUP BY run ORDER BY MAX(created)"
+            ).fetchall()
+
+    def stats(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT metric, COUNT(*), COALESCE(SUM(size), 0) FROM scores GROUP BY metric ORDER BY metric"
+            ).fetchall()
+        return {metric: {'entries': count, 'bytes': size} for metric, count, size in rows}
+
+
+def get_cache():
+    """
+    Process-wide score cache, or None when config.SCORE_CACHE_PATH is unset.
+    """
+    global _score_cache
+    if not config.SCORE_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _score_cache is None or _score_cache.path != config.SCORE_CACHE_PATH:
+            max_bytes = int(config.SCORE_CACHE_MAX_MB * 1024 * 1024) if config.SCORE_CACHE_MAX_MB else None
+            _score_cache = ScoreCache(config.SCORE_CACHE_PATH, max_bytes=max_bytes)
+    return _score_cache
+
+
+def file_digest(path):
+    """
+    Content hash of a file (memoized through the score cache when it is enabled).
+    """
+    cache = get_cache()
+    if cache is not None:
+        return cache.file_digest(path)
+    return _digest_file(path)
+
+
+def run_id(name, created=None):
+    """
+    Id of a run of the report `name`: name@YYYYmmdd-HHMMSS, so runs writing the same report don't overwrite each other.
+    """
+    return f"{name}@{time.strftime('%Y%m%d-%H%M%S', time.localtime(created))}"
+
+
+def record_run(name, rows, report=None):
+    """
+    Records a run's raw scores in the results store, if the cache is enabled.
+    Returns the run id (a -2, -3... suffix if that second's id is taken), or None.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    run = base = run_id(name)
+    for attempt in range(2, 100):
+        try:
+            cache.record_run(run, rows, report=report)
+            return run
+        except ValueError:
+            run = f"{base}-{attempt}"
+        except Exception as e:
+            print(f"Could not record run {run} in the results store: {e}")
+            return None
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the persistent metric score cache')
+    parser.add_argument('--cache', default=config.SCORE_CACHE_PATH, help='Path to the cache database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help='Show cached entries per metric')
+    inv = sub.add_parser('invalidate', help='Delete cached scores')
+    inv.add_argument('--metric', default=None, help='Only this metric (e.g. WVMOS, SIGMOS, Mic SR)')
+    inv.add_argument('--file', default=None, help='Only scores of this audio file')
+    ev = sub.add_parser('evict', help='Evict least recently used scores down to a size')
+    ev.add_argument('--max-mb', type=float, default=config.SCORE_CACHE_MAX_MB, help='Size budget in MB')
+    args = parser.parse_args()
+
+    cache = ScoreCache(args.cache)
+
+    if args.command == 'stats':
+        stats = cache.stats()
+        for metric, s in stats.items():
+            print(f"{metric:<14} {s['entries']:>8} entries {s['bytes'] / 1024:>10.1f} KB")
+        print(f"Total: {sum(s['entries'] for s in stats.values())} entries, {cache.size() / 1024:.1f} KB")
+    elif args.command == 'invalidate':
+        content_hash = cache.file_digest(args.file) if args.file else None
+        removed = cache.invalidate(metric=args.metric, content_hash=content_hash)
+        print(f"Invalidated {removed} cached scores.")
+    elif args.command == 'evict':
+        removed = cache.evict(int(args.max_mb * 1024 * 1024))
+        print(f"Evicted {removed} cached scores.")
+
+
+if __name__ == '__main__':
+    main()
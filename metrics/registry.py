@@ -0,0 +1,239 @@
+import gc
+import sys
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import config
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def tensor_bytes(model):
+    """
+    Bytes held by the parameters and buffers of a torch module (0 for anything else).
+    """
+    if 'torch' not in sys.modules:
+        return 0
+    import torch
+    if not isinstance(model, torch.nn.Module):
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors if not t.is_meta)
+
+
+def resident_bytes():
+    """
+    Resident set size of this process, or None where /proc is not available.
+    """
+    try:
+        import resource
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ImportError, ValueError, IndexError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Process-wide home of the metric models (SigMOS session, VQScore, WVMOS).
+    Models are loaded on first use and kept until the RAM budget
+    (config.MODEL_MEMORY_BUDGET_MB, 0 = unlimited) needs their room: then the least
+    recently used idle model is evicted, and loaded again when next needed.
+
+    A model is busy while held (see hold()); busy models are never evicted, and a
+    metric whose model doesn't fit next to the busy ones waits for them instead of
+    pushing the process over the budget.
+    """
+    def __init__(self, budget_mb=None):
+        self._budget_mb = budget_mb
+        self._loaders = {}
+        self._models = OrderedDict()  # name -> model, least recently used first
+        self._sizes = {}              # name -> bytes measured at its last load (kept after eviction)
+        self._holds = {}
+        self._condition = threading.Condition()
+        self._load_locks = {}
+
+    @property
+    def budget(self):
+        """
+        Budget in bytes, or None when unlimited.
+        """
+        budget_mb = config.MODEL_MEMORY_BUDGET_MB if self._budget_mb is None else self._budget_mb
+        return int(budget_mb * 1024 * 1024) if budget_mb else None
+
+    def register(self, name, loader, size=None):
+        """
+        loader() builds the model; size(model) is its resident size in bytes
+        (default: torch parameter / buffer bytes, else the RSS growth during the load).
+        Re-registering a name drops the model loaded by the previous loader.
+        """
+        with self._condition:
+            self._loaders[name] = (loader, size)
+            self._models.pop(name, None)
+            self._sizes.pop(name, None)
+
+    def get(self, name):
+        """
+        The model registered as `name`, loaded (after making room) if it isn't resident.
+        """
+        with self._condition:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+            if name not in self._loaders:
+                raise KeyError(f"No model registered as {name!r}")
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # One load per model at a time; other models stay available meanwhile
+        with load_lock:
+            with self._condition:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name]
+                loader, size = self._loaders[name]
+                # Room for what it took last time (unknown on the first load)
+                self._trim(keep=name, extra=self._sizes.get(name, 0))
+
+            before = resident_bytes()
+            start = time.perf_counter()
+            model = loader()
+            elapsed = time.perf_counter() - start
+            if size is not None:
+                nbytes = size(model)
+            else:
+                nbytes = tensor_bytes(model)
+                if not nbytes and before is not None:
+                    nbytes = max(0, resident_bytes() - before)
+
+            with self._condition:
+                self._models[name] = model
+                self._sizes[name] = nbytes
+                print(f"Loaded {name} model ({nbytes / (1024 * 1024):.0f} MB, {elapsed:.1f}s)")
+                self._trim(keep=name)
+                self._condition.notify_all()
+            return model
+
+    def loaded(self, name):
+        """
+        The model registered as `name` if it is resident, else None (never loads it).
+        """
+        with self._condition:
+            return self._models.get(name)
+
+    @contextmanager
+    def hold(self, name):
+        """
+        Keeps `name` from being evicted while the block runs. Waits first if its
+        last known size doesn't fit next to the models other threads hold.
+        """
+        with self._condition:
+            while not self._fits_next_to_held(name):
+                self._condition.wait()
+            self._holds[name] = self._holds.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._holds[name] -= 1
+                if not self._holds[name]:
+                    del self._holds[name]
+                self._trim()
+                self._condition.notify_all()
+
+    def evict(self, name):
+        with self._condition:
+            self._evict(name)
+
+    def clear(self):
+        with self._condition:
+            for name in list(self._models):
+                self._evict(name)
+
+    def resident(self):
+        """
+        {name: bytes} of the loaded models, least recently used first.
+        """
+        with self._condition:
+            return {name: self._sizes.get(name, 0) for name in self._models}
+
+    def stats(self):
+        """
+        {name: {'loaded', 'bytes' (last measured size, None if never loaded), 'held'}} of every registered model.
+        """
+        with self._condition:
+            return {name: {'loaded': name in self._models, 'bytes': self._sizes.get(name),
+                           'held': self._holds.get(name, 0)} for name in self._loaders}
+
+    def _fits_next_to_held(self, name):
+        budget = self.budget
+        if budget is None or name in self._holds or not self._holds:
+            return True
+        held = sum(self._sizes.get(other, 0) for other in self._holds)
+        return held + self._sizes.get(name, 0) <= budget
+
+    def _trim(self, keep=None, extra=0):
+        """
+        Evicts idle models, least recently used first, until the resident ones (+ extra) fit.
+        """
+        budget = self.budget
+        if budget is None:
+            return
+        for name in list(self._models):
+            if sum(self._sizes.get(n, 0) for n in self._models) + extra <= budget:
+                break
+            if name != keep and name not in self._holds:
+                self._evict(name)
+
+    def _evict(self, name):
+        if self._models.pop(name, None) is None:
+            return
+        print(f"Evicted {name} model ({self._sizes.get(name, 0) / (1024 * 1024):.0f} MB)")
+        gc.collect()
+        if 'torch' in sys.modules:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+
+def get_registry():
+    """
+    The process-wide model registry.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+    return _registry
+
+
+def main():
+    from metrics import runner  # noqa: F401  (registers every metric's model)
+    # The registry the metrics registered with (this file also runs as __main__)
+    from metrics.registry import get_registry
+
+    parser = argparse.ArgumentParser(description='Load each metric model and report its resident size')
+    parser.add_argument('models', nargs='*', help='Models to load (default: all registered)')
+    args = parser.parse_args()
+
+    budget_mb = config.MODEL_MEMORY_BUDGET_MB
+    # Everything resident at once, to measure each model
+    config.MODEL_MEMORY_BUDGET_MB = 0
+    registry = get_registry()
+    for name in args.models or list(registry.stats()):
+        try:
+            registry.get(name)
+        except Exception as e:
+            print(f"{name}: failed to load ({e})")
+    total = 0
+    for name, nbytes in registry.resident().items():
+        total += nbytes
+        print(f"{name:<10} {nbytes / (1024 * 1024):>8.1f} MB")
+    print(f"Total: {total / (1024 * 1024):.1f} MB (budget: {f'{budget_mb:.0f} MB' if budget_mb else 'unlimited'})")
+
+
+if __name__ == '__main__':
+    main()
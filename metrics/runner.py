@@ -0,0 +1,234 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from metrics.audio import as_audio
+from metrics.cache import get_cache
+from metrics.registry import get_registry
+from metrics import trace
+from metrics import srmr_metric, sigmos_metric, vqscore_metric, wvmos_metric, samplerate_metric
+from metrics.srmr_metric import calculate_srmr
+from metrics.sigmos_metric import calculate_sigmos, calculate_sigmos_batch, get_estimator
+from metrics.vqscore_metric import calculate_vqscore, calculate_vqscore_batch, load_model
+from metrics.wvmos_metric import calculate_wvmos, calculate_wvmos_batch, get_model
+from metrics.samplerate_metric import get_recording_sr, get_mic_sr
+
+SIGMOS_KEYS = ['SIGMOS_DISC', 'SIGMOS_OVRL', 'SIGMOS_REVERB']
+
+# Metrics whose model lives in the model registry under the same name
+MODEL_METRICS = ('SIGMOS', 'VQScore', 'WVMOS')
+
+# Independent metrics of one file, slowest first so they start first.
+# (name, function, model fingerprint for the score cache)
+METRIC_TASKS = [
+    ('WVMOS', calculate_wvmos, wvmos_metric.model_fingerprint),
+    ('VQScore', calculate_vqscore, vqscore_metric.model_fingerprint),
+    ('SIGMOS', calculate_sigmos, sigmos_metric.model_fingerprint),
+    ('SRMR', calculate_srmr, srmr_metric.model_fingerprint),
+    ('Mic SR', get_mic_sr, samplerate_metric.model_fingerprint),
+    ('Recording SR', get_recording_sr, samplerate_metric.model_fingerprint),
+]
+
+FINGERPRINTS = {name: fingerprint for name, _, fingerprint in METRIC_TASKS}
+
+# Metrics of the CLI reports (evaluate.py, smart_evaluate.py); their sample-rate rows stay
+# unscored there. The app also runs Mic SR on its clips.
+REPORT_METRICS = ('WVMOS', 'VQScore', 'SIGMOS', 'SRMR')
+
+# Metrics that can score several files / clips in one model call
+BATCH_TASKS = {
+    'WVMOS': calculate_wvmos_batch,
+    'VQScore': calculate_vqscore_batch,
+    'SIGMOS': calculate_sigmos_batch,
+}
+
+def warm_up_models():
+    """
+    Loads the SigMOS session, VQScore and WVMOS models once.
+    A model that fails to load here is reported per file by its metric.
+    With a model memory budget (config.MODEL_MEMORY_BUDGET_MB) they load on demand
+    instead: warming all of them could just evict the first ones again.
+    """
+    if get_registry().budget is not None:
+        return
+    for warmup in (get_estimator, load_model, get_model):
+        try:
+            warmup()
+        except Exception as e:
+            print(f"Model warmup failed ({warmup.__module__}): {e}")
+
+def _tasks(metrics):
+    # METRIC_TASKS, or those of the named metrics
+    return [task for task in METRIC_TASKS if metrics is None or task[0] in metrics]
+
+def _cache_keys(cache, audio, metrics=None):
+    """
+    Cache key per metric (all, or the named ones) for this audio, or {} when caching is off.
+    A metric whose fingerprint can't be computed (e.g. missing checkpoint) is not cached.
+    """
+    if cache is None:
+        return {}
+    try:
+        content_hash, params = cache.audio_key(audio)
+    except Exception as e:
+        print(f"Score cache disabled for {audio}: {e}")
+        return {}
+
+    keys = {}
+    for name, func, fingerprint in _tasks(metrics):
+        try:
+            keys[name] = (content_hash, name, fingerprint(), params)
+        except Exception:
+            pass
+    return keys
+
+def _current_key(key):
+    """
+    The cache key with its metric's fingerprint taken again, or None if that fails. It can change
+    while the metric runs (WVMOS shrinks its window after running out of memory); the score
+    then belongs under the new one.
+    """
+    content_hash, name, _, params = key
+    try:
+        return (content_hash, name, FINGERPRINTS[name](), params)
+    except Exception:
+        return None
+
+def run_metric(name, func, audio):
+    """
+    func(audio), keeping the metric's model (if any) resident while it runs.
+    `audio` is one AudioBuffer, or a list of them for the BATCH_TASKS functions.
+    Traced as one 'metric' span (see metrics.trace), the stages inside it attributed to this metric.
+    """
+    if isinstance(audio, list):
+        file, files = f"batch of {len(audio)}", [str(item) for item in audio]
+    else:
+        file, files = str(audio), None
+    with trace.context(file=file, metric=name), trace.span('metric', files=files) as event:
+        if name not in MODEL_METRICS:
+            value = func(audio)
+        else:
+            with get_registry().hold(name):
+                value = func(audio)
+        if event is not None:
+            event['audio_seconds'] = trace.audio_seconds(audio)
+    return value
+
+def _to_scores(results):
+    # Metrics that weren't run are None, like failed ones
+    scores = {}
+    scores['SRMR'] = results.get('SRMR')
+
+    sigmos_scores = results.get('SIGMOS')
+    for key in SIGMOS_KEYS:
+        scores[key] = sigmos_scores[key] if sigmos_scores else None
+
+    scores['VQScore'] = results.get('VQScore')
+    scores['WVMOS'] = results.get('WVMOS')
+    scores['Recording SR'] = results.get('Recording SR')
+    scores['Mic SR'] = results.get('Mic SR')
+    return scores
+
+def cached_scores(audio, metrics=None):
+    """
+    Returns the scores dict if every metric (or every named one) of this audio is in the score cache, else None.
+    Only needs audio.source / audio.sampling, never the samples.
+    """
+    cache = get_cache()
+    keys = _cache_keys(cache, audio, metrics)
+    if len(keys) < len(_tasks(metrics)):
+        return None
+
+    results = {}
+    for name, key in keys.items():
+        hit, value = cache.get(*key)
+        if not hit:
+            return None
+        results[name] = value
+    return _to_scores(results)
+
+def compute_scores(audio, threads=None, on_metric_done=None, precomputed=None, metrics=None):
+    """
+    Runs every metric (or the named ones, e.g. REPORT_METRICS) on one file (path or AudioBuffer)
+    and returns {metric: score}; metrics not run are None.
+    Metrics already in the score cache (see metrics.cache) are not recomputed.
+    The rest run concurrently on up to `threads` threads (default config.METRIC_THREADS);
+    their heavy lifting happens in numpy / onnxruntime / torch kernels that release the GIL.
+    on_metric_done(name) is called from the calling thread as each metric finishes.
+    precomputed: {metric: score} already computed elsewhere (e.g. batched), stored like fresh results.
+    """
+    audio = as_audio(audio)
+    if threads is None:
+        threads = config.METRIC_THREADS
+
+    cache = get_cache()
+    keys = _cache_keys(cache, audio, metrics)
+
+    results = {}
+    pending = []
+    precomputed = precomputed or {}
+    for name, func, fingerprint in _tasks(metrics):
+        hit = False
+        if name in precomputed:
+            continue
+        if name in keys:
+            hit, value = cache.get(*keys[name])
+        if hit:
+            results[name] = value
+            if on_metric_done:
+                on_metric_done(name)
+        else:
+            pending.append((name, func))
+
+    def finish(name, value):
+        results[name] = value
+        # Errors (None, or 0 from the sample-rate metrics) are not cached so they are retried next run
+        if value is not None and not (name in ('Mic SR', 'Recording SR') and value == 0) and name in keys:
+            key = _current_key(keys[name])
+            if key is not None:
+                cache.put(*key, value)
+        if on_metric_done:
+            on_metric_done(name)
+
+    for name, value in precomputed.items():
+        finish(name, value)
+
+    if threads <= 1 or len(pending) <= 1:
+        for name, func in pending:
+            finish(name, run_metric(name, func, audio))
+    else:
+        # Models are loaded up front, before the threads need them
+        warm_up_models()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = {executor.submit(run_metric, name, func, audio): name for name, func in pending}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+    return _to_scores(results)
+
+def compute_scores_batch(audios, threads=None, on_metric_done=None, metrics=None):
+    """
+    compute_scores for several files / clips. Metrics in BATCH_TASKS run batched over
+    every item that is not already cached; the others run per item as usual.
+    Returns one scores dict per item, in order.
+    """
+    audios = [as_audio(audio) for audio in audios]
+    cache = get_cache()
+    keys = [_cache_keys(cache, audio, metrics) for audio in audios]
+    precomputed = [{} for _ in audios]
+
+    for name, batch_func in BATCH_TASKS.items():
+        if metrics is not None and name not in metrics:
+            continue
+        todo = []
+        for i, audio in enumerate(audios):
+            if name in keys[i] and cache.get(*keys[i][name])[0]:
+                continue
+            todo.append(i)
+        # A single item gains nothing from batching; it runs alongside its other metrics
+        if len(todo) > 1:
+            batch = [audios[i] for i in todo]
+            for i, value in zip(todo, run_metric(name, batch_func, batch)):
+                precomputed[i][name] = value
+
+    return [compute_scores(audio, threads=threads, on_metric_done=on_metric_done, precomputed=pre, metrics=metrics)
+            for audio, pre in zip(audios, precomputed)]
@@ -1,34 +1,102 @@
+import itertools
 import librosa
 import numpy as np
 import soundfile as sf
+from metrics import trace
+from metrics.audio import AudioBuffer, as_audio
 
-def get_recording_sr(audio_path):
+# librosa.stft defaults (what the Mic SR estimate was calibrated with)
+N_FFT = 2048
+HOP_LENGTH = N_FFT // 4
+
+# Samples per streamed block (~6 s at 44.1 kHz)
+BLOCK_SIZE = 2 ** 18
+
+def model_fingerprint():
     """
-    Returns the metadata sample rate of the file.
+    Identifies the estimator behind cached Mic SR / Recording SR values.
+    """
+    return f"maxhold-{N_FFT}-{HOP_LENGTH}:-80dB"
+
+def get_recording_sr(audio):
+    """
+    Returns the metadata sample rate of the file (path or AudioBuffer).
     """
     try:
-        info = sf.info(audio_path)
+        if isinstance(audio, AudioBuffer):
+            return audio.sr
+        info = sf.info(audio)
         return info.samplerate
     except Exception as e:
         print(f"Error getting recording SR: {e}")
         return 0
 
-def get_mic_sr(audio_path):
+def max_hold_spectrum(blocks):
+    """
+    Running per-bin max of the STFT magnitude over a stream of mono blocks.
+    Frames are exactly those of librosa.stft(y) (centered, zero padded), but only
+    one block plus one frame of overlap is held, never the full spectrogram.
+    """
+    pad = N_FFT // 2
+    # Leading center padding; carries the unfinished frame between blocks
+    tail = np.zeros(pad, dtype=np.float32)
+    S_max = None
+    
+    for block in itertools.chain(blocks, [np.zeros(pad, dtype=np.float32)]):
+        buf = np.concatenate([tail, block])
+        n_frames = 1 + (len(buf) - N_FFT) // HOP_LENGTH if len(buf) >= N_FFT else 0
+        if n_frames > 0:
+            frames = buf[:(n_frames - 1) * HOP_LENGTH + N_FFT]
+            S = np.abs(librosa.stft(frames, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+            block_max = np.max(S, axis=1)
+            S_max = block_max if S_max is None else np.maximum(S_max, block_max)
+        tail = buf[n_frames * HOP_LENGTH:]
+        
+    return S_max
+
+def _file_blocks(path):
+    # Mono downmix per block, same as librosa.load(mono=True)
+    for block in sf.blocks(path, blocksize=BLOCK_SIZE, dtype='float32', always_2d=True):
+        yield np.mean(block, axis=1)
+
+def _array_blocks(y):
+    for start in range(0, len(y), BLOCK_SIZE):
+        yield y[start:start + BLOCK_SIZE]
+
+def get_mic_sr(audio, streaming=True):
     """
     Estimates the 'Mic Sampling Rate' (Effective Sample Rate) based on bandwidth.
     Calculates the 99% power roll-off frequency and multiplies by 2.
+    Paths, and AudioBuffers of a whole file that nothing has decoded yet, are streamed
+    from disk block by block (streaming=True), so memory does not grow with file
+    duration. Decoded buffers and in-memory clips are scanned in blocks too.
     """
     try:
-        # Load with high SR to capture full bandwidth (native sr)
-        y, sr = librosa.load(audio_path, sr=None)
-        
-        # Compute magnitude spectrum
-        S_full, phase = librosa.magphase(librosa.stft(y))
-        
+        # Use native sr (mono downmix) to capture full bandwidth
         # Max Hold Spectrum (Peak detection across time)
         # Instead of average, we take the MAX magnitude at each frequency bin across all time frames.
         # This aligns with "Max peaks on the spectrogram".
-        S_max = np.max(S_full, axis=1)
+        S_max = None
+        path = audio
+        if isinstance(audio, AudioBuffer):
+            # Already decoded samples are reused rather than read again
+            path = audio.source if not audio.decoded and not audio.sampling else None
+        if streaming and path is not None:
+            try:
+                sr = sf.info(path).samplerate
+                # Streamed: decoding is part of this span
+                with trace.span('features'):
+                    S_max = max_hold_spectrum(_file_blocks(path))
+            except RuntimeError:
+                # libsndfile cannot read this format; decode in memory instead
+                S_max = None
+                
+        if S_max is None:
+            audio = as_audio(audio)
+            sr = audio.sr
+            y = audio.get(channels='mono')
+            with trace.span('features'):
+                S_max = max_hold_spectrum(_array_blocks(y))
         
         # Normalize to Max Peak (0 Reference)
         S_ref = np.max(S_max)
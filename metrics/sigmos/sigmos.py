@@ -6,28 +6,42 @@ import numpy as np
 import onnxruntime as ort
 from enum import Enum
 
+from ..resample import resample
+from .. import trace
 
-__all__ = ["SigMOS", "Version"]
+
+__all__ = ["SigMOS", "Version", "MODEL_FILES"]
+
+# STFT frames per block in stft_features: bounds the frame / FFT temporaries (~20 s at 48 kHz)
+FEATURE_BLOCK_FRAMES = 2048
 
 
 class Version(Enum):
     V1 = "v1"  # 15.10.2023
 
 
+MODEL_FILES = {
+    Version.V1: 'model-sigmos_1697718653_41d092e8-epo-200.onnx'
+}
+
+
 class SigMOS:
     '''
     MOS Estimator for the P.804 standard.
     See https://arxiv.org/pdf/2309.07385.pdf
     '''
-    def __init__(self, model_dir, model_version=Version.V1):
+    def __init__(self, model_dir, model_version=Version.V1, session_options=None, optimized_model_path=None):
+        '''
+        session_options: ort.SessionOptions (default: one thread, default graph optimization).
+        optimized_model_path: where to keep the optimized graph. Written on first use,
+        then loaded with graph optimization disabled so later processes skip it.
+        '''
         assert model_version in [v for v in Version]
 
-        model_path_history = {
-            Version.V1: os.path.join(model_dir, 'model-sigmos_1697718653_41d092e8-epo-200.onnx')
-        }
+        model_path_history = {version: os.path.join(model_dir, filename) for version, filename in MODEL_FILES.items()}
 
         self.sampling_rate = 48_000
-        self.resample_type = 'fft'
+        self.resample_type = 'polyphase'
         self.model_version = model_version
 
         # STFT params
@@ -36,10 +50,42 @@ class SigMOS:
         self.window_length = 960
         self.window = np.sqrt(np.hanning(int(self.window_length) + 1)[:-1]).astype(np.float32)
 
-        options = ort.SessionOptions()
-        options.inter_op_num_threads = 1
-        options.intra_op_num_threads = 1
-        self.session = ort.InferenceSession(model_path_history[model_version], options)
+        if session_options is None:
+            session_options = ort.SessionOptions()
+            session_options.inter_op_num_threads = 1
+            session_options.intra_op_num_threads = 1
+        self.session = self._create_session(model_path_history[model_version], session_options, optimized_model_path)
+        # Whether stacking along the batch axis works with this graph (None: not tried yet)
+        self._batching = None
+
+    @staticmethod
+    def _create_session(model_path, options, optimized_model_path=None):
+        if optimized_model_path is None:
+            return ort.InferenceSession(model_path, options)
+
+        # Reuse the optimized graph unless the model changed since it was written
+        if os.path.exists(optimized_model_path) and os.path.getmtime(optimized_model_path) >= os.path.getmtime(model_path):
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            try:
+                return ort.InferenceSession(optimized_model_path, options)
+            except Exception as e:
+                print(f"Ignoring unreadable optimized SigMOS model {optimized_model_path}: {e}")
+
+        # Written under a per-process name and moved into place, so pool workers
+        # starting together never read a half-written file
+        tmp_path = f"{optimized_model_path}.{os.getpid()}.tmp"
+        options.optimized_model_filepath = tmp_path
+        try:
+            session = ort.InferenceSession(model_path, options)
+            os.replace(tmp_path, optimized_model_path)
+        except Exception as e:
+            # Unwritable cache dir, full disk, ...: optimize in memory as without a cache
+            print(f"Could not cache the optimized SigMOS model: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            options.optimized_model_filepath = ''
+            session = ort.InferenceSession(model_path, options)
+        return session
 
     def stft(self, signal):
         last_frame = len(signal) % self.frame_size
@@ -65,24 +111,132 @@ class SigMOS:
         features = np.transpose(features, (1, 0, 2))
         return np.expand_dims(features, 0)
 
-    def run(self, audio: np.ndarray, sr=None):
+    def stft_features(self, signal, compress_factor=0.3, block_frames=FEATURE_BLOCK_FRAMES):
+        '''
+        compressed_mag_complex(stft(signal)) without the full-size temporaries: frames are
+        windowed, transformed and compressed block by block, straight into the preallocated
+        [1, 3, frames, bins] float32 output. Same values as the two-step path.
+        '''
+        signal = np.asarray(signal)
+        # Frame / FFT precision of the two-step path (that of the padded signal)
+        dtype = np.result_type(signal.dtype, np.float32)
+
+        last_frame = len(signal) % self.frame_size
+        if last_frame == 0:
+            last_frame = self.frame_size
+        lead = self.window_length - self.frame_size
+        padded = np.zeros(lead + len(signal) + self.window_length - last_frame, dtype=dtype)
+        padded[lead:lead + len(signal)] = signal
+        frames = librosa.util.frame(padded, frame_length=len(self.window), hop_length=self.frame_size, axis=0)  # view
+
+        num_frames = frames.shape[0]
+        num_bins = self.dft_size // 2 + 1
+        features = np.empty((1, 3, num_frames, num_bins), dtype=np.float32)
+        block_frames = min(block_frames, num_frames)
+        windowed = np.empty((block_frames, len(self.window)), dtype=dtype)
+        power = np.empty((block_frames, num_bins), dtype=np.float32)
+
+        for start in range(0, num_frames, block_frames):
+            end = min(start + block_frames, num_frames)
+            n = end - start
+            np.multiply(frames[start:end], self.window, out=windowed[:n])
+            spec = scipy.fft.rfft(windowed[:n], n=self.dft_size)
+
+            mag, real, imag = features[0, 0, start:end], features[0, 1, start:end], features[0, 2, start:end]
+            # complex64 cast of the two-step path, component by component
+            real[...] = spec.real
+            imag[...] = spec.imag
+            del spec
+
+            x2 = power[:n]
+            np.multiply(real, real, out=x2)
+            x2 += imag * imag
+            np.maximum(x2, 1e-12, out=x2)
+            if compress_factor == 1:
+                np.sqrt(x2, out=mag)
+            else:
+                np.power(x2, compress_factor / 2, out=mag)
+                np.power(x2, (compress_factor - 1) / 2, out=x2)
+                real *= x2
+                imag *= x2
+        return features
+
+    def features(self, audio: np.ndarray, sr=None):
         if sr is not None and sr != self.sampling_rate:
-            audio = librosa.resample(audio, orig_sr=sr, target_sr=self.sampling_rate, res_type=self.resample_type)
+            if self.resample_type == 'polyphase':
+                audio = resample(audio, sr, self.sampling_rate)
+            else:
+                audio = librosa.resample(audio, orig_sr=sr, target_sr=self.sampling_rate, res_type=self.resample_type)
             print(f"Audio file resampled from {sr} to {self.sampling_rate}!")
 
-        features = self.stft(audio)
-        features = self.compressed_mag_complex(features)
-
-        onnx_inputs = {inp.name: features for inp in self.session.get_inputs()}
-        output = self.session.run(None, onnx_inputs)[0][0]
+        return self.stft_features(audio)
 
-        result = {
+    @staticmethod
+    def _result(output):
+        return {
             'MOS_COL': float(output[0]), 'MOS_DISC': float(output[1]), 'MOS_LOUD': float(output[2]),
             'MOS_NOISE': float(output[3]), 'MOS_REVERB': float(output[4]), 'MOS_SIG': float(output[5]),
             'MOS_OVRL': float(output[6])
         }
-        return result
 
+    def run(self, audio: np.ndarray, sr=None):
+        with trace.span('features'):
+            features = self.features(audio, sr)
+
+        onnx_inputs = {inp.name: features for inp in self.session.get_inputs()}
+        with trace.span('inference'):
+            output = self.session.run(None, onnx_inputs)[0][0]
+
+        return self._result(output)
+
+    def batch_dim_dynamic(self):
+        # Symbolic / unknown first dimension on every input
+        return all(not isinstance(inp.shape[0], int) or inp.shape[0] < 1 for inp in self.session.get_inputs())
+
+    def run_batch(self, audios, sr=None):
+        '''
+        run() for several signals. Signals with the same number of STFT frames are
+        stacked into one session call when the model's batch axis is dynamic (no padding:
+        padded frames would change the scores); everything else goes through an
+        IO-binding loop with the input / output names bound once.
+        '''
+        with trace.span('features'):
+            features = [self.features(audio, sr) for audio in audios]
+        results = [None] * len(features)
+
+        groups = {}
+        for i, feature in enumerate(features):
+            groups.setdefault(feature.shape, []).append(i)
+
+        single = []
+        for indices in groups.values():
+            if len(indices) > 1 and self._batching is not False and self.batch_dim_dynamic():
+                try:
+                    stacked = np.concatenate([features[i] for i in indices])
+                    onnx_inputs = {inp.name: stacked for inp in self.session.get_inputs()}
+                    with trace.span('inference', batch=len(indices)):
+                        output = self.session.run(None, onnx_inputs)[0]
+                    for i, row in zip(indices, output):
+                        results[i] = self._result(row)
+                    self._batching = True
+                    continue
+                except Exception as e:
+                    # Declared dynamic but the graph can't take it (e.g. a hard reshape)
+                    print(f"SigMOS batched run failed ({e}), scoring one at a time")
+                    self._batching = False
+            single.extend(indices)
+
+        if single:
+            binding = self.session.io_binding()
+            output_name = self.session.get_outputs()[0].name
+            for i in single:
+                for inp in self.session.get_inputs():
+                    binding.bind_cpu_input(inp.name, features[i])
+                binding.bind_output(output_name)
+                with trace.span('inference'):
+                    self.session.run_with_iobinding(binding)
+                results[i] = self._result(binding.copy_outputs_to_cpu()[0][0])
+        return results
 
 if __name__ == '__main__':
     ''' 
@@ -1,23 +1,117 @@
 import os
-import numpy as np
-import soundfile as sf
-import librosa
-# Import SigMOS from the local copy
-from metrics.sigmos.sigmos import SigMOS
+import hashlib
+import platform
+import config
+from metrics.audio import as_audio
+from metrics.audio import FINGERPRINT as PREPROCESSING
+from metrics.cache import file_digest
+from metrics.registry import get_registry
 
-# Initialize the estimator once to avoid reloading model
-_sigmos_estimator = None
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'sigmos')
+
+# onnxruntime enum members by config name (looked up when a session is built,
+# so importing this module doesn't import onnxruntime)
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL',
+}
+
+EXECUTION_MODES = {
+    'sequential': 'ORT_SEQUENTIAL',
+    'parallel': 'ORT_PARALLEL',
+}
+
+def intra_op_threads():
+    """
+    config.SIGMOS_INTRA_OP_THREADS, with 'auto' resolved to the cores per concurrent metric thread.
+    """
+    if config.SIGMOS_INTRA_OP_THREADS == 'auto':
+        return max(1, (os.cpu_count() or 1) // max(1, config.METRIC_THREADS))
+    return int(config.SIGMOS_INTRA_OP_THREADS)
+
+def session_options():
+    """
+    onnxruntime session options from config.SIGMOS_* (0 threads = onnxruntime's default, all cores).
+    """
+    if config.SIGMOS_GRAPH_OPTIMIZATION not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown SIGMOS_GRAPH_OPTIMIZATION: {config.SIGMOS_GRAPH_OPTIMIZATION}")
+    if config.SIGMOS_EXECUTION_MODE not in EXECUTION_MODES:
+        raise ValueError(f"Unknown SIGMOS_EXECUTION_MODE: {config.SIGMOS_EXECUTION_MODE}")
+
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads()
+    options.inter_op_num_threads = config.SIGMOS_INTER_OP_THREADS
+    options.execution_mode = getattr(ort.ExecutionMode, EXECUTION_MODES[config.SIGMOS_EXECUTION_MODE])
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[config.SIGMOS_GRAPH_OPTIMIZATION])
+    return options
+
+def machine_fingerprint():
+    """
+    Architecture and a short hash of the CPU feature flags: the 'all' level bakes kernels
+    for the instruction sets it finds (e.g. NCHWc layouts for AVX2/AVX-512) into the graph.
+    """
+    features = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                # 'flags' on x86, 'Features' on ARM
+                if line.split(':')[0].strip() in ('flags', 'Features'):
+                    features = line.split(':', 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return f"{platform.machine() or 'unknown'}-{hashlib.sha1(features.encode()).hexdigest()[:8]}"
+
+def optimized_model_path():
+    """
+    Cached optimized graph under the user cache dir, or None when caching is off, there is nothing
+    to optimize, or the cache dir can't be created. Keyed by optimization level, onnxruntime version
+    and machine: optimized graphs aren't portable across any of them.
+    """
+    if not config.SIGMOS_CACHE_OPTIMIZED or config.SIGMOS_GRAPH_OPTIMIZATION == 'disable':
+        return None
+    import onnxruntime as ort
+    from metrics.sigmos.sigmos import Version, MODEL_FILES
+    cache_dir = os.path.join(config.CACHE_DIR, 'sigmos')
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Not caching the optimized SigMOS model ({cache_dir}: {e})")
+        return None
+    model_name = os.path.splitext(MODEL_FILES[Version.V1])[0]
+    key = f"{config.SIGMOS_GRAPH_OPTIMIZATION}.ort-{ort.__version__}.{machine_fingerprint()}"
+    return os.path.join(cache_dir, f"{model_name}.{key}.onnx")
+
+def load_estimator():
+    # Import SigMOS from the local copy (onnxruntime is only loaded here)
+    from metrics.sigmos.sigmos import SigMOS
+    return SigMOS(model_dir=MODEL_DIR, session_options=session_options(),
+                  optimized_model_path=optimized_model_path())
+
+def estimator_size(estimator):
+    # The session holds the graph's weights: about the size of the model file
+    from metrics.sigmos.sigmos import Version, MODEL_FILES
+    return os.path.getsize(os.path.join(MODEL_DIR, MODEL_FILES[Version.V1]))
+
+# Loaded once and kept in the model registry (evicted only to respect its memory budget)
+get_registry().register('SIGMOS', load_estimator, size=estimator_size)
 
 def get_estimator():
-    global _sigmos_estimator
-    if _sigmos_estimator is None:
-        model_dir = os.path.join(os.path.dirname(__file__), 'sigmos')
-        _sigmos_estimator = SigMOS(model_dir=model_dir)
-    return _sigmos_estimator
+    return get_registry().get('SIGMOS')
 
-def calculate_sigmos(audio_path):
+def model_fingerprint():
+    """
+    Identifies the model + preprocessing behind cached SIGMOS scores.
     """
-    Calculates SIGMOS scores.
+    from metrics.sigmos.sigmos import Version, MODEL_FILES
+    return f"{file_digest(os.path.join(MODEL_DIR, MODEL_FILES[Version.V1]))}:48k-{PREPROCESSING}"
+
+def calculate_sigmos(audio):
+    """
+    Calculates SIGMOS scores for the given audio file (path or AudioBuffer).
     Returns a dictionary with SIGMOS_DISC, SIGMOS_OVRL, SIGMOS_REVERB.
     Thresholds:
     - DISC: >= 4.0
@@ -27,12 +121,10 @@ def calculate_sigmos(audio_path):
     try:
         estimator = get_estimator()
         
-        # Load audio
-        # SigMOS expects 48kHz. The run method handles resampling if sr is provided.
-        y, fs = sf.read(audio_path)
-        
-        if len(y.shape) > 1:
-            y = y[:, 0]
+        # SigMOS expects 48kHz. Take the shared 48kHz first-channel variant
+        # (same polyphase resampling the run method would otherwise do internally).
+        fs = estimator.sampling_rate
+        y = as_audio(audio).get(fs, channels='first', res_type=estimator.resample_type)
             
         result = estimator.run(y, sr=fs)
         
@@ -44,5 +136,41 @@ def calculate_sigmos(audio_path):
     except Exception as e:
         import traceback
         traceback.print_exc()
-        print(f"Error calculating SIGMOS for {audio_path}: {e}")
+        print(f"Error calculating SIGMOS for {audio}: {e}")
         return None
+
+def calculate_sigmos_batch(audios):
+    """
+    SIGMOS for many files / clips (paths or AudioBuffers): equal-length items
+    (e.g. the 30 s smart-sampling clips) share one model call.
+    Returns a list of score dicts (None for items that failed).
+    """
+    try:
+        estimator = get_estimator()
+    except Exception as e:
+        print(f"Error loading SIGMOS model: {e}")
+        return [None] * len(audios)
+    
+    fs = estimator.sampling_rate
+    signals = []
+    indices = []
+    for i, audio in enumerate(audios):
+        try:
+            signals.append(as_audio(audio).get(fs, channels='first', res_type=estimator.resample_type))
+            indices.append(i)
+        except Exception as e:
+            print(f"Error calculating SIGMOS for {audio}: {e}")
+    
+    scores = [None] * len(audios)
+    try:
+        for i, result in zip(indices, estimator.run_batch(signals, sr=fs)):
+            scores[i] = {
+                'SIGMOS_DISC': result['MOS_DISC'],
+                'SIGMOS_OVRL': result['MOS_OVRL'],
+                'SIGMOS_REVERB': result['MOS_REVERB']
+            }
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error calculating SIGMOS for a batch of {len(audios)}: {e}")
+    return scores
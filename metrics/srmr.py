@@ -0,0 +1,403 @@
+"""
+Native SRMR (speech-to-reverberation modulation energy ratio, Falk et al. 2010).
+Same algorithm and defaults as srmrpy.srmr: by default (fast=True) the envelopes come from
+the FFT-based gammatonegram at 400 Hz, with fast=False from the gammatone filterbank + Hilbert
+envelope at the input rate. The filterbanks run over all channels at once instead of per-band
+Python loops, and the gammatonegram is computed in blocks of columns.
+"""
+from functools import lru_cache
+
+import numpy as np
+import scipy.fft
+from scipy.signal import lfilter, sosfilt
+
+# Glasberg and Moore ERB parameters
+EAR_Q = 9.26449
+MIN_BW = 24.7
+
+# Modulation energy frames (s)
+WINDOW_LENGTH = 0.256
+WINDOW_INCREMENT = 0.064
+
+# Gammatonegram (fast=True): 10 ms windows every 2.5 ms, i.e. envelopes at 400 Hz
+FAST_WINDOW = 0.010
+FAST_HOP = 0.0025
+FAST_ENVELOPE_RATE = 400.0
+# Gammatonegram columns per block (bounds memory on long inputs; blocks are exact)
+FAST_BLOCK_COLUMNS = 8192
+
+# Envelope context on each side of a chunk when the input is processed in chunks (s)
+CHUNK_MARGIN = 2.0
+
+# Gammatone filterbank (fast=False) as block matrix products: samples per block, and blocks
+# per product (keeps the temporaries in cache)
+GAMMATONE_BLOCK = 128
+GAMMATONE_GROUP = 128
+
+# Added to the input once: the gammatone IIRs decaying into digital silence otherwise
+# run on denormals, which is tens of times slower (far below float32 resolution of speech)
+DENORMAL_OFFSET = 1e-20
+
+
+def centre_freqs(fs, num_freqs, low_freq):
+    """
+    ERB-spaced centre frequencies from fs / 2 down to low_freq (gammatone.filters.centre_freqs).
+    """
+    high_freq = fs / 2
+    fraction = np.arange(1, num_freqs + 1) / num_freqs
+    return -EAR_Q * MIN_BW + np.exp(
+        fraction * (-np.log(high_freq + EAR_Q * MIN_BW) + np.log(low_freq + EAR_Q * MIN_BW))
+    ) * (high_freq + EAR_Q * MIN_BW)
+
+
+def calc_erbs(low_freq, fs, n_filters):
+    return centre_freqs(fs, n_filters, low_freq) / EAR_Q + MIN_BW
+
+
+def erb_filters(fs, cfs):
+    """
+    Numerator terms A11..A14 [4, channels], pole terms B1, B2 and gains of the
+    gammatone filters at centre frequencies cfs (gammatone.filters.make_erb_filters).
+    """
+    T = 1 / fs
+    B = 1.019 * 2 * np.pi * (cfs / EAR_Q + MIN_BW)
+    arg = 2 * cfs * np.pi * T
+    vec = np.exp(2j * arg)
+
+    rt_pos = np.sqrt(3 + 2 ** 1.5)
+    rt_neg = np.sqrt(3 - 2 ** 1.5)
+    common = -T * np.exp(-(B * T))
+    ks = [np.cos(arg) + rt_pos * np.sin(arg), np.cos(arg) - rt_pos * np.sin(arg),
+          np.cos(arg) + rt_neg * np.sin(arg), np.cos(arg) - rt_neg * np.sin(arg)]
+
+    gain_arg = np.exp(1j * arg - B * T)
+    gain = np.abs(
+        (vec - gain_arg * ks[0]) * (vec - gain_arg * ks[1]) * (vec - gain_arg * ks[2]) * (vec - gain_arg * ks[3])
+        * (T * np.exp(B * T) / (-1 / np.exp(B * T) + 1 + vec * (1 - np.exp(B * T)))) ** 4
+    )
+    return common * np.array(ks), -2 * np.cos(arg) / np.exp(B * T), np.exp(-2 * B * T), gain
+
+
+@lru_cache(maxsize=None)
+def gammatone_sos(fs, n_filters, low_freq):
+    """
+    Gammatone filterbank as [channels, 4, 6] second-order sections
+    (gammatone.filters.make_erb_filters; the gain is folded into the first section).
+    """
+    a1, b1, b2, gain = erb_filters(fs, centre_freqs(fs, n_filters, low_freq))
+    sos = np.zeros((n_filters, 4, 6))
+    for section in range(4):
+        # Numerator (A0, A1k, A2), shared poles (1, B1, B2)
+        sos[:, section, 0] = 1 / fs
+        sos[:, section, 1] = a1[section]
+        sos[:, section, 3] = 1
+        sos[:, section, 4] = b1
+        sos[:, section, 5] = b2
+    sos[:, 0, :3] /= gain[:, None]
+    return sos
+
+
+@lru_cache(maxsize=None)
+def gammatone_blocks(fs, n_filters, low_freq, block=GAMMATONE_BLOCK):
+    """
+    The gammatone filterbank as linear maps over blocks of `block` samples. With the sosfilt
+    states of a channel flattened to s (4 sections x 2):
+        outputs = x_block @ inputs[:, ch] + s @ from_state[ch]
+        next s  = x_block @ to_state[:, ch] + s @ transitions[block][ch]
+    Returns (inputs [block, ch * block], from_state [ch, 8, block], to_state [block, ch * 8],
+    transitions [block + 1, ch, 8, 8] over 0..block samples); the inputs of all channels side
+    by side so a block of samples goes through every channel in one product. Built by running
+    sosfilt on unit inputs and states, so it is the same filter.
+    """
+    sos = gammatone_sos(fs, n_filters, low_freq)
+    n_states = 2 * sos.shape[1]
+    inputs = np.zeros((n_filters, block, block))
+    from_state = np.zeros((n_filters, n_states, block))
+    to_state = np.zeros((n_filters, block, n_states))
+    step = np.zeros((n_filters, n_states, n_states))
+    impulse = np.zeros(block)
+    impulse[0] = 1
+    for ch in range(n_filters):
+        response = sosfilt(sos[ch], impulse)
+        for i in range(block):
+            # Input i reaches output j >= i through the impulse response
+            inputs[ch, i, i:] = response[:block - i]
+            # ... and leaves the state the impulse response has after block - i samples
+            to_state[ch, i] = sosfilt(sos[ch], impulse[:block - i], zi=np.zeros((sos.shape[1], 2)))[1].ravel()
+        for j in range(n_states):
+            unit = np.zeros(n_states)
+            unit[j] = 1
+            from_state[ch, j] = sosfilt(sos[ch], np.zeros(block), zi=unit.reshape(-1, 2))[0]
+            step[ch, j] = sosfilt(sos[ch], np.zeros(1), zi=unit.reshape(-1, 2))[1].ravel()
+    transitions = np.empty((block + 1, n_filters, n_states, n_states))
+    transitions[0] = np.eye(n_states)
+    for r in range(1, block + 1):
+        transitions[r] = transitions[r - 1] @ step
+    inputs = inputs.transpose(1, 0, 2).reshape(block, -1)
+    to_state = to_state.transpose(1, 0, 2).reshape(block, -1)
+    return np.ascontiguousarray(inputs), from_state, np.ascontiguousarray(to_state), transitions
+
+
+@lru_cache(maxsize=None)
+def gammatonegram_weights(fs, n_filters, low_freq, nfft):
+    """
+    [channels, nfft // 2 + 1] weights combining FFT magnitudes into gammatone bands, lowest
+    band first (gammatone.fftweight.fft_weights with width 1, up to fs / 2).
+    """
+    cfs = centre_freqs(fs, n_filters, low_freq)[::-1]
+    a1, _, b2, gain = erb_filters(fs, cfs)
+    ucirc = np.exp(1j * 2 * np.pi * np.arange(0, nfft / 2 + 1) / nfft)[None, :]
+    pole = (np.sqrt(b2) * np.exp(1j * 2 * np.pi * cfs / fs))[:, None]
+    weights = np.abs(ucirc + a1[0][:, None] * fs)
+    for a in a1[1:]:
+        weights = weights * np.abs(ucirc + a[:, None] * fs)
+    return weights * np.abs(fs * (pole - ucirc) * (pole.conj() - ucirc)) ** -4 / gain[:, None]
+
+
+def round_half_up(x):
+    return int(np.floor(x + 0.5))
+
+
+def specgram_window(nfft, nwin):
+    """
+    Hann window of width nwin centred in nfft samples (gammatone.fftweight.specgram_window).
+    """
+    halflen = nwin // 2
+    halff = nfft // 2
+    acthalflen = min(halff, halflen)
+    halfwin = 0.5 * (1 + np.cos(np.pi * np.arange(0, halflen + 1) / halflen))
+    win = np.zeros(nfft)
+    win[halff:halff + acthalflen] = halfwin[:acthalflen]
+    win[halff:halff - acthalflen:-1] = halfwin[:acthalflen]
+    return win
+
+
+def gammatonegram_columns(n_samples, fs):
+    """
+    (nfft, hop, columns) of the gammatonegram of n_samples at fs (gammatone.fftweight.fft_gtgram).
+    """
+    nfft = int(2 ** np.ceil(np.log2(2 * FAST_WINDOW * fs)))
+    hop = round_half_up(FAST_HOP * fs)
+    return nfft, hop, 1 + int(np.floor((n_samples - nfft) / hop))
+
+
+def gammatonegram_chunks(x, fs, n_filters, low_freq, block=FAST_BLOCK_COLUMNS):
+    """
+    Yields consecutive column blocks [channels, n] of the FFT-based gammatonegram of x
+    (gammatone.fftweight.fft_gtgram: Hann-windowed FFT magnitudes weighted into bands).
+    """
+    nfft, hop, n_columns = gammatonegram_columns(len(x), fs)
+    weights = gammatonegram_weights(fs, n_filters, low_freq, nfft)
+    window = specgram_window(nfft, round_half_up(FAST_WINDOW * fs))
+    # gammatone's specgram fills the columns starting before len(x) - nfft; any last one stays 0
+    filled = len(range(0, len(x) - nfft, hop))
+    frames = np.lib.stride_tricks.sliding_window_view(x, nfft)[::hop]
+    for start in range(0, n_columns, block):
+        stop = min(start + block, n_columns)
+        magnitudes = np.zeros((stop - start, nfft // 2 + 1))
+        if start < filled:
+            spectrum = np.fft.rfft(frames[start:min(stop, filled)] * window, axis=-1)
+            magnitudes[:len(spectrum)] = np.abs(spectrum)
+        yield weights.dot(magnitudes.T) / nfft
+
+
+@lru_cache(maxsize=None)
+def modulation_filterbank(min_cf, max_cf, fs, n=8, q=2):
+    """
+    Centre frequencies and (b, a) band-pass filters (at envelope rate fs) of the n log-spaced modulation filters.
+    """
+    cfs = min_cf * ((max_cf / min_cf) ** (1.0 / (n - 1))) ** np.arange(n)
+    filters = []
+    for w0 in 2 * np.pi * cfs / fs:
+        W0 = np.tan(w0 / 2)
+        B0 = W0 / q
+        filters.append((np.array([B0, 0, -B0]), np.array([1 + B0 + W0 ** 2, 2 * W0 ** 2 - 2, 1 - B0 + W0 ** 2])))
+    return cfs, filters
+
+
+def lower_cutoffs(cfs, fs, q=2):
+    # srmrpy takes these at the audio rate, also when the envelopes are at 400 Hz (fast=True)
+    return cfs - np.tan(2 * np.pi * cfs / fs / 2) / q * fs / (2 * np.pi)
+
+
+def hilbert_envelope(x, n=None):
+    """
+    |analytic signal| along the last axis. The FFT length defaults to srmrpy's
+    (rounded up to a multiple of 16); only the positive half-spectrum is computed.
+    """
+    length = x.shape[-1]
+    if n is None:
+        n = -(-length // 16) * 16
+    half = scipy.fft.rfft(x, n=n, axis=-1)
+    # One-sided spectrum: DC (and Nyquist) once, positive frequencies doubled, negative ones zero
+    half[..., 1:(n + 1) // 2] *= 2
+    spectrum = np.zeros(x.shape[:-1] + (n,), dtype=half.dtype)
+    spectrum[..., :half.shape[-1]] = half
+    del half
+    return np.abs(scipy.fft.ifft(spectrum, axis=-1, overwrite_x=True)[..., :length])
+
+
+def gammatone(x, bank, zi):
+    """
+    Runs every gammatone channel over x, from and to the filter states zi [channels, 4, 2].
+    bank: gammatone_blocks() in x's dtype. All channels are filtered together: the outputs
+    of a group of blocks are two batched matrix products, and only the 8 filter states per
+    channel are carried from block to block.
+    """
+    inputs, from_state, to_state, transitions = bank
+    channels, block = from_state.shape[0], from_state.shape[2]
+    out = np.empty((channels, len(x)), dtype=x.dtype)
+    if not len(x):
+        return out, zi
+    n_blocks = -(-len(x) // block)
+    blocks = np.zeros(n_blocks * block, dtype=x.dtype)
+    blocks[:len(x)] = x
+    blocks = blocks.reshape(n_blocks, block)
+
+    # Filter states at the start of every block
+    driven = (blocks @ to_state).reshape(n_blocks, channels, 1, -1)
+    states = np.empty_like(driven)
+    state = zi.reshape(channels, 1, -1).astype(x.dtype)
+    transition = transitions[block]
+    for k in range(n_blocks):
+        states[k] = state
+        state = np.matmul(state, transition) + driven[k]
+    # The last block may be partial: the state after the samples actually there
+    last = len(x) - (n_blocks - 1) * block
+    zf = np.matmul(states[-1], transitions[last]).ravel() + blocks[-1, :last] @ to_state[block - last:]
+
+    for start in range(0, n_blocks, GAMMATONE_GROUP):
+        stop = min(start + GAMMATONE_GROUP, n_blocks)
+        y = (blocks[start:stop] @ inputs).reshape(stop - start, channels, block)
+        y += np.matmul(states[start:stop], from_state)[:, :, 0]
+        y = y.transpose(1, 0, 2).reshape(channels, -1)
+        out[:, start * block:stop * block] = y[:, :len(x) - start * block]
+    return out, zf.reshape(zi.shape)
+
+
+def envelope_chunks(x, bank, chunk, margin):
+    """
+    Yields the gammatone envelopes [channels, n] of consecutive pieces of x.
+    The filters run continuously; each piece's Hilbert envelope sees `margin`
+    samples of context on both sides (whole-signal envelope when chunk is None).
+    """
+    channels = bank[1].shape[0]
+    zi = np.zeros((channels, 4, 2), dtype=x.dtype)
+    if chunk is None or chunk >= len(x):
+        yield hilbert_envelope(gammatone(x, bank, zi)[0])
+        return
+
+    before = np.zeros((channels, 0), dtype=x.dtype)
+    for start in range(0, len(x), chunk):
+        core, zi = gammatone(x[start:start + chunk], bank, zi)
+        # Look-ahead from a copy of the state; filtered again as part of the next chunk
+        after = gammatone(x[start + chunk:start + chunk + margin], bank, zi)[0]
+        context = np.concatenate([before, core, after], axis=1)
+        envelope = hilbert_envelope(context, n=scipy.fft.next_fast_len(context.shape[1], real=True))
+        yield envelope[:, before.shape[1]:before.shape[1] + core.shape[1]]
+        before = np.concatenate([before, core], axis=1)[:, -margin:]
+
+
+def frame_energies(y2, weights, inc, n_frames):
+    """
+    Windowed energies sum(weights * y2[..., f * inc:f * inc + len(weights)]) of the first
+    n_frames frames, as one matmul over inc-sized blocks (no framed copy of the signal).
+    """
+    n_blocks = -(-len(weights) // inc)
+    W = np.zeros(n_blocks * inc, dtype=y2.dtype)
+    W[:len(weights)] = weights
+    W = W.reshape(n_blocks, inc)
+
+    needed = (n_frames - 1 + n_blocks) * inc
+    if y2.shape[-1] < needed:
+        y2 = np.concatenate([y2, np.zeros(y2.shape[:-1] + (needed - y2.shape[-1],), dtype=y2.dtype)], axis=-1)
+    blocks = y2[..., :needed].reshape(y2.shape[:-1] + (n_frames - 1 + n_blocks, inc))
+    partial = blocks @ W.T  # [..., blocks, n_blocks]
+    return sum(partial[..., j:j + n_frames, j] for j in range(n_blocks))
+
+
+def normalize_energy(energy, drange=30.0):
+    peak_energy = np.max(np.mean(energy, axis=0))
+    min_energy = peak_energy * 10.0 ** (-drange / 10.0)
+    return np.clip(energy, min_energy, peak_energy)
+
+
+def srmr(x, fs, n_cochlear_filters=23, low_freq=125, min_cf=4, max_cf=128, fast=True, norm=False,
+         chunk_seconds=None):
+    """
+    SRMR of a mono signal. Returns (score, energy [channels, 8, frames]) like srmrpy.srmr.
+    fast=True (srmrpy's default) takes the envelopes from the gammatonegram, in blocks of
+    FAST_BLOCK_COLUMNS columns (exact, bounded memory at any length), in float64.
+    fast=False filters at the input rate. chunk_seconds then processes long inputs in pieces
+    of this length to bound memory; the gammatone and modulation filters run continuously
+    across pieces and only the Hilbert envelope is taken per piece (with CHUNK_MARGIN of
+    context), so scores stay within ~1e-4 of the whole-signal result. None processes the
+    signal in one piece (exact). Float32 input keeps the gammatone and Hilbert stages in
+    float32; the modulation filters and energies always run in float64 (scores within
+    ~1e-5 of float64 input).
+    """
+    x = np.asarray(x)
+    if fast:
+        mfs = FAST_ENVELOPE_RATE
+        x = x.astype(np.float64, copy=False)
+        n_envelope = gammatonegram_columns(len(x), fs)[2]
+        envelopes = gammatonegram_chunks(x, fs, n_cochlear_filters, low_freq)
+    else:
+        mfs = fs
+        dtype = np.float32 if x.dtype == np.float32 else np.float64
+        x = x.astype(dtype, copy=False) + dtype(DENORMAL_OFFSET)
+        n_envelope = len(x)
+        chunk = None
+        if chunk_seconds is not None:
+            # Pieces on frame-increment boundaries
+            w_inc = int(np.ceil(WINDOW_INCREMENT * fs))
+            chunk = max(1, int(chunk_seconds * fs) // w_inc) * w_inc
+        bank = [matrix.astype(dtype) for matrix in gammatone_blocks(fs, n_cochlear_filters, low_freq)]
+        envelopes = envelope_chunks(x, bank, chunk, int(CHUNK_MARGIN * fs))
+    w_length = int(np.ceil(WINDOW_LENGTH * mfs))
+    w_inc = int(np.ceil(WINDOW_INCREMENT * mfs))
+    n_frames = int(1 + (n_envelope - w_length) // w_inc)
+    if n_frames < 1:
+        raise ValueError(f"SRMR needs at least {WINDOW_LENGTH}s of audio")
+
+    cfs, filters = modulation_filterbank(min_cf, max_cf, mfs)
+
+    # Periodic hamming window, squared once for the energies
+    weights = (0.54 - 0.46 * np.cos(2 * np.pi * np.arange(w_length) / w_length)) ** 2
+
+    # [modulation band, cochlear channel, frame]: each band filters all channels at once
+    energy = np.zeros((len(filters), n_cochlear_filters, n_frames))
+    mod_zi = np.zeros((len(filters), n_cochlear_filters, 2))
+    # Per band, squared outputs not yet consumed by whole frames (they start at frame `done`)
+    pending = [np.zeros((n_cochlear_filters, 0)) for _ in filters]
+    filtered = 0
+    done = 0
+    for envelope in envelopes:
+        filtered += envelope.shape[1]
+        # Frames that lie entirely within what has been filtered so far
+        ready = min(n_frames, (filtered - w_length) // w_inc + 1) if filtered >= w_length else 0
+        for k, (b, a) in enumerate(filters):
+            mod_out, mod_zi[k] = lfilter(b, a, envelope, axis=-1, zi=mod_zi[k])
+            np.square(mod_out, out=mod_out)
+            if pending[k].shape[1]:
+                mod_out = np.concatenate([pending[k], mod_out], axis=1)
+            if ready > done:
+                energy[k, :, done:ready] = frame_energies(mod_out, weights, w_inc, ready - done)
+            pending[k] = mod_out[:, (ready - done) * w_inc:]
+        done = ready
+    energy = energy.transpose(1, 0, 2)
+
+    if norm:
+        energy = normalize_energy(energy)
+
+    erbs = np.flipud(calc_erbs(low_freq, fs, n_cochlear_filters))
+
+    avg_energy = np.mean(energy, axis=2)
+    total_energy = np.sum(avg_energy)
+    ac_perc = np.sum(avg_energy, axis=1) * 100 / total_energy
+    k90_idx = np.where(np.cumsum(np.flipud(ac_perc)) > 90)[0][0]
+    bw = erbs[k90_idx]
+
+    # Highest modulation band still below the 90% acoustic bandwidth
+    kstar = 5 + int(np.sum(bw > lower_cutoffs(cfs, fs)[5:]))
+    return np.sum(avg_energy[:, :4]) / np.sum(avg_energy[:, 4:kstar]), energy
@@ -1,34 +1,36 @@
 import numpy as np
-import soundfile as sf
-from srmrpy.srmr import srmr
+from metrics import trace
+from metrics.audio import as_audio
+from metrics.audio import FINGERPRINT as PREPROCESSING
 
-def calculate_srmr(audio_path):
+def model_fingerprint():
     """
-    Calculates SRMR score for the given audio file.
+    Identifies the implementation + preprocessing behind cached SRMR scores.
+    """
+    return f"native-fast:16k-{PREPROCESSING}"
+
+def calculate_srmr(audio):
+    """
+    Calculates SRMR score for the given audio file (path or AudioBuffer).
     Threshold: >= 8.0
     """
     try:
-        y, fs = sf.read(audio_path)
-        
+        # scipy.signal is only imported once SRMR actually runs
+        from metrics.srmr import srmr
         # Handle multi-channel audio by taking the first channel
-        if len(y.shape) > 1:
-            y = y[:, 0]
-        
-        # Ensure float and normalize if integer
-        if np.issubdtype(y.dtype, np.integer):
-            y = y.astype('float') / np.iinfo(y.dtype).max
-
         # Resample to 16kHz for SRMR (standard for threshold 8.0)
         TARGET_SR = 16000
-        if fs != TARGET_SR:
-            import librosa
-            y = librosa.resample(y, orig_sr=fs, target_sr=TARGET_SR)
-            fs = TARGET_SR
+        y = as_audio(audio).get(TARGET_SR, channels='first')
+        fs = TARGET_SR
             
-        score = srmr(y, fs)
+        # Modulation-spectrum energies and their ratio: all signal processing, no model.
+        # srmrpy's defaults (gammatonegram envelopes, fast=True), computed in blocks: exact
+        # and bounded memory at any length, so long files need no chunk_seconds approximation
+        with trace.span('features'):
+            score = srmr(y, fs)
         if isinstance(score, (tuple, list, np.ndarray)) and len(score) > 0:
              score = score[0]
         return float(score)
     except Exception as e:
-        print(f"Error calculating SRMR for {audio_path}: {e}")
+        print(f"Error calculating SRMR for {audio}: {e}")
         return None
@@ -0,0 +1,252 @@
+# Per-stage timing / memory instrumentation, off unless a trace file is set:
+#     python evaluate.py DIR --trace run.json     Chrome trace (chrome://tracing, ui.perfetto.dev)
+#     python evaluate.py DIR --trace run.jsonl    one JSON event per line (appended)
+# The app traces to config.TRACE_PATH (TRACE_PATH environment variable).
+# Summarize a trace with: python -m metrics.trace run.jsonl
+import os
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+
+import config
+
+# Stages recorded inside a metric; 'metric' spans one whole metric call, 'file' one file
+STAGES = ('decode', 'resample', 'features', 'inference', 'aggregate')
+
+# How often resident memory is sampled while spans are open (allocations held for less may be missed)
+SAMPLE_SECONDS = 0.005
+
+_events = []
+_events_lock = threading.Lock()
+# Current file / metric of each thread (set by context(), picked up by every span)
+_local = threading.local()
+# Peak RSS seen so far by each open span ([bytes], updated by the sampler thread)
+_open_spans = {}
+_sampling = threading.Condition()
+_sampler = None
+
+
+def enabled():
+    return bool(config.TRACE_PATH)
+
+
+def rss_bytes():
+    """
+    This process's resident memory right now (Linux), or None where unavailable.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _sample():
+    # Runs while any span is open: raises the peak of every open span to the current RSS
+    while True:
+        with _sampling:
+            while not _open_spans:
+                _sampling.wait()
+            peaks = list(_open_spans.values())
+        rss = rss_bytes()
+        for peak in peaks:
+            if rss is not None and rss > peak[0]:
+                peak[0] = rss
+        time.sleep(SAMPLE_SECONDS)
+
+
+def _watch(token, peak):
+    global _sampler
+    with _sampling:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name='trace-rss', daemon=True)
+            _sampler.start()
+        _open_spans[token] = peak
+        _sampling.notify()
+
+
+def _unwatch(token):
+    with _sampling:
+        _open_spans.pop(token, None)
+
+
+@contextmanager
+def context(file=None, metric=None):
+    """
+    Attributes the spans this thread records inside the block to `file` / `metric`.
+    """
+    previous = getattr(_local, 'context', (None, None))
+    _local.context = (file if file is not None else previous[0], metric if metric is not None else previous[1])
+    try:
+        yield
+    finally:
+        _local.context = previous
+
+
+@contextmanager
+def span(stage, name=None, **args):
+    """
+    Records the wall time of the block as one event of `stage`, with the peak resident memory
+    while it ran (peak_rss_mb; sampled every SAMPLE_SECONDS, so transient allocations inside the
+    stage count) and that peak's growth over the memory at its start (peak_delta_mb).
+    RSS is a process figure: spans running at the same time (metrics on other threads) see each
+    other's allocations.
+    Yields a dict of event arguments the block can add to (e.g. audio_seconds, from which the
+    real-time factor is derived); None when tracing is off, which costs nothing else.
+    """
+    if not enabled():
+        yield None
+        return
+    file, metric = getattr(_local, 'context', (None, None))
+    start = time.time()
+    rss_start = rss_bytes()
+    peak = [rss_start]
+    token = object()
+    if rss_start is not None:
+        _watch(token, peak)
+    started = time.perf_counter()
+    try:
+        yield args
+    finally:
+        seconds = time.perf_counter() - started
+        _unwatch(token)
+        event = {
+            'stage': stage,
+            'name': name or metric or stage,
+            'file': file,
+            'metric': metric,
+            'start': start,
+            'seconds': seconds,
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+        }
+        rss = rss_bytes()
+        if rss_start is not None and rss is not None:
+            peak_bytes = max(peak[0], rss)
+            event['peak_rss_mb'] = peak_bytes / (1024 * 1024)
+            event['peak_delta_mb'] = (peak_bytes - rss_start) / (1024 * 1024)
+        if args.get('audio_seconds'):
+            event['rtf'] = seconds / args['audio_seconds']
+        event.update({key: value for key, value in args.items() if value is not None})
+        with _events_lock:
+            _events.append(event)
+
+
+def audio_seconds(audios):
+    """
+    Total duration of already decoded AudioBuffers (others count as 0: never decoded just to time them).
+    """
+    from metrics.audio import AudioBuffer
+    if not isinstance(audios, (list, tuple)):
+        audios = [audios]
+    return sum(audio.duration for audio in audios if isinstance(audio, AudioBuffer) and audio.decoded)
+
+
+def events():
+    with _events_lock:
+        return list(_events)
+
+
+def drain():
+    """
+    Returns the recorded events and forgets them (process-pool workers hand theirs back this way).
+    """
+    with _events_lock:
+        drained = list(_events)
+        _events.clear()
+    return drained
+
+
+def extend(new_events):
+    with _events_lock:
+        _events.extend(new_events)
+
+
+def chrome_trace(trace_events):
+    """
+    Events in the Chrome trace event format (complete 'X' events, microseconds).
+    """
+    chrome_events = []
+    for event in trace_events:
+        args = {key: value for key, value in event.items() if key not in ('stage', 'name', 'start', 'seconds', 'pid', 'tid')}
+        chrome_events.append({
+            'name': event['name'], 'cat': event['stage'], 'ph': 'X',
+            'ts': event['start'] * 1e6, 'dur': event['seconds'] * 1e6,
+            'pid': event['pid'], 'tid': event['tid'], 'args': args,
+        })
+    return {'traceEvents': chrome_events, 'displayTimeUnit': 'ms'}
+
+
+def save(path=None):
+    """
+    Writes the recorded events to `path` (default config.TRACE_PATH) and forgets them.
+    .jsonl files get one event per line, appended; anything else is (over)written as a Chrome trace.
+    """
+    path = path or config.TRACE_PATH
+    trace_events = drain()
+    if path.endswith('.jsonl'):
+        with open(path, 'a') as f:
+            for event in trace_events:
+                f.write(json.dumps(event) + '\n')
+    else:
+        with open(path, 'w') as f:
+            json.dump(chrome_trace(trace_events), f)
+    return path
+
+
+def load(path):
+    """
+    Events of a trace written by save(), in either format.
+    """
+    with open(path) as f:
+        if not path.endswith('.jsonl'):
+            return [dict(event['args'], stage=event['cat'], name=event['name'], start=event['ts'] / 1e6,
+                         seconds=event['dur'] / 1e6, pid=event['pid'], tid=event['tid'])
+                    for event in json.load(f)['traceEvents']]
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summary(trace_events):
+    """
+    [{metric, stage, count, seconds, audio_seconds, rtf, peak_rss_mb, peak_delta_mb}] per (metric, stage), slowest first.
+    Audio seconds (and so the real-time factor) come from the 'metric' and 'file' spans;
+    the memory figures are the largest of any one span.
+    """
+    groups = {}
+    for event in trace_events:
+        key = (event.get('metric') or ('' if event['stage'] != 'file' else 'all'), event['stage'])
+        row = groups.setdefault(key, {'metric': key[0], 'stage': key[1], 'count': 0, 'seconds': 0.0,
+                                      'audio_seconds': 0.0, 'peak_rss_mb': None, 'peak_delta_mb': None})
+        row['count'] += 1
+        row['seconds'] += event['seconds']
+        row['audio_seconds'] += event.get('audio_seconds') or 0.0
+        for field in ('peak_rss_mb', 'peak_delta_mb'):
+            if event.get(field) is not None:
+                row[field] = event[field] if row[field] is None else max(row[field], event[field])
+    rows = sorted(groups.values(), key=lambda row: row['seconds'], reverse=True)
+    for row in rows:
+        row['rtf'] = row['seconds'] / row['audio_seconds'] if row['audio_seconds'] else None
+    return rows
+
+
+def print_summary(trace_events):
+    print(f"{'Metric':<14} {'Stage':<10} {'Count':>6} {'Seconds':>9} {'Audio s':>9} {'RTF':>8} {'Peak RSS':>10} {'Peak +':>9}")
+    for row in summary(trace_events):
+        rtf = f"{row['rtf']:.4f}" if row['rtf'] is not None else '-'
+        rss = f"{row['peak_rss_mb']:.0f} MB" if row['peak_rss_mb'] is not None else '-'
+        growth = f"{row['peak_delta_mb']:.0f} MB" if row['peak_delta_mb'] is not None else '-'
+        audio = f"{row['audio_seconds']:.1f}" if row['audio_seconds'] else '-'
+        print(f"{row['metric']:<14} {row['stage']:<10} {row['count']:>6} {row['seconds']:>9.2f} {audio:>9} {rtf:>8} {rss:>10} {growth:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a metrics trace (.jsonl or Chrome trace .json)')
+    parser.add_argument('trace', help='Trace file written with --trace / TRACE_PATH')
+    args = parser.parse_args()
+    print_summary(load(args.trace))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,35 @@
 import os
 import sys
 import yaml
-import torch
-import torchaudio
 import numpy as np
 
 # Add metrics directory to sys.path to allow importing vqscore_models
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from metrics.vqscore_models.VQVAE_models import VQVAE_QE
+from metrics import trace
+from metrics.audio import as_audio
+from metrics.audio import FINGERPRINT as PREPROCESSING
+from metrics.cache import file_digest
+from metrics.registry import get_registry, tensor_bytes
+
+BASE_DIR = os.path.dirname(__file__)
+CONFIG_PATH = os.path.join(BASE_DIR, 'vqscore_config', 'QE_cbook_size_2048_1_32_IN_input_encoder_z_Librispeech_clean_github.yaml')
+# Find the checkpoint file
+EXP_DIR = os.path.join(BASE_DIR, 'vqscore_exp', 'QE_cbook_size_2048_1_32_IN_input_encoder_z_Librispeech_clean_github')
+CHECKPOINT_PATH = os.path.join(EXP_DIR, 'checkpoint-dnsmos_ovr_CC=0.835.pkl')
+# Frozen encoder + codebook (python -m metrics.vqscore_models.export_torchscript); preferred when present
+TORCHSCRIPT_PATH = os.path.join(EXP_DIR, 'vqscore_inference.pt')
+
+# Batched scoring: padded frames per forward pass (~17 min of 16k audio), and
+# items only share a batch if padding wastes at most this fraction of it
+MAX_BATCH_FRAMES = 65536
+MAX_PAD_FRACTION = 0.1
 
-_vqscore_model = None
 _vqscore_config = None
 _device = None
 
 def stft_magnitude(x, hop_size, fft_size=512, win_length=512):
+    import torch
     window = torch.hann_window(win_length).to(x.device)
         
     x_stft = torch.stft(
@@ -26,26 +41,51 @@ def stft_magnitude(x, hop_size, fft_size=512, win_length=512):
     return torch.sqrt(torch.clamp(real ** 2 + imag ** 2, min=1e-7)).transpose(2, 1)
 
 def cos_loss(SP_noisy, SP_y_noisy):  
+    import torch
     eps=1e-5
     SP_noisy_norm = torch.norm(SP_noisy, p=2, dim=-1, keepdim=True)+eps
     SP_y_noisy_norm = torch.norm(SP_y_noisy, p=2, dim=-1, keepdim=True)+eps  
     Cos_frame = torch.sum(SP_noisy/SP_noisy_norm * SP_y_noisy/SP_y_noisy_norm, dim=-1) 
     return -torch.mean(Cos_frame)
 
-def load_model():
-    global _vqscore_model, _vqscore_config, _device
-    if _vqscore_model is not None:
-        return
-    
-    base_dir = os.path.dirname(__file__)
-    config_path = os.path.join(base_dir, 'vqscore_config', 'QE_cbook_size_2048_1_32_IN_input_encoder_z_Librispeech_clean_github.yaml')
+def read_config():
+    with open(CONFIG_PATH, 'r') as f:
+        return yaml.load(f, Loader=yaml.FullLoader)
+
+def build_model(device):
+    """
+    Builds the scoring model from the YAML config and the training checkpoint.
+    """
+    # Scoring only needs the encoder + codebook of VQVAE_QE (no decoder / training quantizer)
+    import torch
+    from metrics.vqscore_models.vqscore_inference import VQScoreInference
+    params = read_config()['VQVAE_params']
+    model = VQScoreInference(params['codebook_size'], params['codebook_dim'])
     
-    # Find the checkpoint file
-    exp_dir = os.path.join(base_dir, 'vqscore_exp', 'QE_cbook_size_2048_1_32_IN_input_encoder_z_Librispeech_clean_github')
-    checkpoint_path = os.path.join(exp_dir, 'checkpoint-dnsmos_ovr_CC=0.835.pkl')
+    # Load weights
+    # inference.py says: VQVAE.load_state_dict(torch.load(args.path_of_model_weights)['model']['VQVAE'])
+    checkpoint = torch.load(CHECKPOINT_PATH, map_location='cpu')
+    model.load_vqvae_state_dict(checkpoint['model']['VQVAE'])
+    return model.to(device).eval()
+
+def _load_exported(device):
+    """
+    The exported TorchScript model, or None if there is none or it is older than the checkpoint.
+    """
+    if not os.path.exists(TORCHSCRIPT_PATH):
+        return None
+    from metrics.vqscore_models import export_torchscript
+    model, checkpoint_digest = export_torchscript.load(TORCHSCRIPT_PATH, device)
+    if os.path.exists(CHECKPOINT_PATH) and checkpoint_digest != file_digest(CHECKPOINT_PATH):
+        print(f"{TORCHSCRIPT_PATH} was exported from a different checkpoint; re-export it. Using the checkpoint.")
+        return None
+    return model
+
+def create_model():
+    global _vqscore_config, _device
+    import torch
     
-    with open(config_path, 'r') as f:
-        _vqscore_config = yaml.load(f, Loader=yaml.FullLoader)
+    _vqscore_config = read_config()
         
     if torch.backends.mps.is_available():
         _device = torch.device('mps')
@@ -55,55 +95,146 @@ def load_model():
         _device = torch.device('cpu')
         
     print(f"Loading VQScore model on {_device}...")
-    _vqscore_model = VQVAE_QE(**_vqscore_config['VQVAE_params']).to(_device).eval()
+    model = _load_exported(_device)
+    if model is None:
+        model = build_model(_device)
+    return model
+
+def model_size(model):
+    # The frozen export keeps its weights as constants rather than parameters
+    return tensor_bytes(model) or os.path.getsize(TORCHSCRIPT_PATH)
+
+# Loaded once and kept in the model registry (evicted only to respect its memory budget);
+# a failed load publishes nothing, so random weights are never left behind
+get_registry().register('VQScore', create_model, size=model_size)
+
+def load_model():
+    return get_registry().get('VQScore')
+
+def model_fingerprint():
+    """
+    Identifies the model + preprocessing behind cached VQScore scores.
+    """
+    # The export scores exactly like its checkpoint; it is only hashed when deployed without one
+    if not os.path.exists(CHECKPOINT_PATH) and os.path.exists(TORCHSCRIPT_PATH):
+        return f"{file_digest(TORCHSCRIPT_PATH)}:16k-{PREPROCESSING}"
+    return f"{file_digest(CHECKPOINT_PATH)}:16k-{PREPROCESSING}"
+
+def spectrogram(audio):
+    """
+    VQScore input for one file: STFT magnitude of every channel at 16k, [C, T, 257] on the model device.
+    """
+    import torch
+    hop_size = 256
+    # All channels, (C, T); VQScore expects 16k
+    wav_input = torch.from_numpy(as_audio(audio).get(16000, channels='all'))
+        
+    wav_input = wav_input.to(_device)
+    SP_input = stft_magnitude(wav_input, hop_size=hop_size)
     
-    # Load weights
-    # The checkpoint seems to be a full pickle or state dict?
-    # inference.py says: VQVAE.load_state_dict(torch.load(args.path_of_model_weights)['model']['VQVAE'])
-    checkpoint = torch.load(checkpoint_path, map_location=_device)
-    _vqscore_model.load_state_dict(checkpoint['model']['VQVAE'])
+    if _vqscore_config['input_transform'] == 'log1p':
+        SP_input = torch.log1p(SP_input)
+    return SP_input
 
-def calculate_vqscore(audio_path):
+def calculate_vqscore(audio):
     """
-    Calculates VQScore.
+    Calculates VQScore for the given audio file (path or AudioBuffer).
     Threshold: >= 0.67
     """
     try:
-        load_model()
-        
-        hop_size = 256
-        # Use librosa for robust loading on Cloud (avoids torchaudio backend issues)
-        import librosa
-        wav_input, fs = librosa.load(audio_path, sr=None, mono=False)
-        wav_input = torch.from_numpy(wav_input)
-        
-        # Ensure (C, T) shape
-        if wav_input.ndim == 1:
-            wav_input = wav_input.unsqueeze(0)
-            
-        # VQScore expects 16k
-        if fs != 16000:
-            resampler = torchaudio.transforms.Resample(fs, 16000)
-            wav_input = resampler(wav_input)
-            
-        wav_input = wav_input.to(_device)
-        SP_input = stft_magnitude(wav_input, hop_size=hop_size)
-        
-        if _vqscore_config['input_transform'] == 'log1p':
-            SP_input = torch.log1p(SP_input)
+        import torch
+        model = load_model()
+        with trace.span('features'):
+            SP_input = spectrogram(audio)
             
-        with torch.no_grad():
-            z = _vqscore_model.CNN_1D_encoder(SP_input)
-            zq, indices, vqloss, distance = _vqscore_model.quantizer(z, stochastic=False, update=False)
-            
-            # VQScore is calculated as negative cos loss between z and zq?
+        with trace.span('inference'), torch.no_grad():
+            # VQScore is the negative cos loss between z and its quantized zq
             # inference.py: VQScore_cos_z = -cos_loss(z.transpose(2, 1).cpu(), zq.cpu()).numpy()
-            
-            score = -cos_loss(z.transpose(2, 1).cpu(), zq.cpu()).item()
+            score = model(SP_input).item()
             
         return score
     except Exception as e:
         import traceback
         traceback.print_exc()
-        print(f"Error calculating VQScore for {audio_path}: {e}")
+        print(f"Error calculating VQScore for {audio}: {e}")
         return None
+
+def length_buckets(lengths, max_batch, max_pad_fraction=MAX_PAD_FRACTION):
+    """
+    Groups indices into batches of similar length, longest first: a batch's padded size
+    (rows x longest) stays under max_batch and padding wastes at most max_pad_fraction.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = lengths[order[start]]
+        limit = max(1, max_batch // max(longest, 1))
+        batch = [order[start]]
+        for i in order[start + 1:]:
+            if len(batch) >= limit or lengths[i] < longest * (1 - max_pad_fraction):
+                break
+            batch.append(i)
+        start += len(batch)
+        batches.append(batch)
+    return batches
+
+def calculate_vqscore_batch(audios):
+    """
+    VQScore for many files / clips (paths or AudioBuffers) in padded, masked batches.
+    Each item scores as it would alone; multi-channel items contribute one row per channel.
+    Returns a list of scores (None for items that failed).
+    """
+    try:
+        import torch
+        model = load_model()
+    except Exception as e:
+        print(f"Error loading VQScore model: {e}")
+        return [None] * len(audios)
+    
+    # Exports made before batching existed lack score_padded: score those one by one
+    if not hasattr(model, 'score_padded'):
+        return [calculate_vqscore(audio) for audio in audios]
+    
+    scores = [None] * len(audios)
+    rows = []  # (item, spectrogram of one channel [T, 257])
+    for n, audio in enumerate(audios):
+        try:
+            with trace.span('features'):
+                for channel in spectrogram(audio):
+                    rows.append((n, channel))
+        except Exception as e:
+            print(f"Error calculating VQScore for {audio}: {e}")
+    
+    sums = [0.0] * len(audios)
+    counts = [0.0] * len(audios)
+    try:
+        for batch in length_buckets([channel.shape[0] for _, channel in rows], MAX_BATCH_FRAMES):
+            with trace.span('inference', batch=len(batch)), torch.no_grad():
+                if len(batch) == 1:
+                    # Alone: plain forward, exactly what calculate_vqscore computes
+                    n, channel = rows[batch[0]]
+                    sums[n] += model(channel[None]).item() * channel.shape[0]
+                    counts[n] += channel.shape[0]
+                    continue
+                
+                longest = rows[batch[0]][1].shape[0]
+                SP_input = torch.zeros(len(batch), longest, rows[batch[0]][1].shape[1], device=_device)
+                for row, i in enumerate(batch):
+                    SP_input[row, :rows[i][1].shape[0]] = rows[i][1]
+                lengths = torch.tensor([rows[i][1].shape[0] for i in batch], device=_device)
+                
+                cos_sums, frames = model.score_padded(SP_input, lengths)
+                for i, cos_sum, frame_count in zip(batch, cos_sums.tolist(), frames.tolist()):
+                    sums[rows[i][0]] += cos_sum
+                    counts[rows[i][0]] += frame_count
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error calculating VQScore for a batch of {len(audios)}: {e}")
+        return [None] * len(audios)
+    
+    for n in range(len(audios)):
+        if counts[n]:
+            scores[n] = sums[n] / counts[n]
+    return scores
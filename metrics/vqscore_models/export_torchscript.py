@@ -0,0 +1,55 @@
+# Exports the scoring-only VQScore model (encoder + codebook) as a frozen TorchScript artifact:
+#     python -m metrics.vqscore_models.export_torchscript [--output path/to/vqscore_inference.pt]
+# vqscore_metric.load_model uses the artifact when present; loading it needs neither
+# the YAML-built model nor vector_quantize_pytorch, and skips unpickling the training checkpoint.
+import os
+import argparse
+
+import torch
+
+# Stored inside the artifact so a stale export (older checkpoint) is detected at load time
+CHECKPOINT_DIGEST_KEY = 'checkpoint_digest'
+
+
+def export(model, output, checkpoint_digest=''):
+    """
+    Scripts and freezes a VQScoreInference model (weights become constants, conv / norm folded).
+    """
+    model = model.cpu().eval()
+    # score_padded is kept for batched scoring (vqscore_metric.calculate_vqscore_batch)
+    frozen = torch.jit.freeze(torch.jit.script(model), preserved_attrs=['score_padded'])
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    torch.jit.save(frozen, output, _extra_files={CHECKPOINT_DIGEST_KEY: checkpoint_digest})
+    return output
+
+
+def load(path, device='cpu'):
+    """
+    Returns (scripted model, digest of the checkpoint it was exported from).
+    """
+    extra_files = {CHECKPOINT_DIGEST_KEY: ''}
+    model = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+    digest = extra_files[CHECKPOINT_DIGEST_KEY]
+    if isinstance(digest, bytes):
+        digest = digest.decode()
+    return model, digest
+
+
+def main():
+    from metrics import vqscore_metric
+    from metrics.cache import file_digest
+
+    parser = argparse.ArgumentParser(description='Export the VQScore encoder + codebook to TorchScript')
+    parser.add_argument('--output', default=vqscore_metric.TORCHSCRIPT_PATH, help='Where to write the artifact')
+    args = parser.parse_args()
+
+    print("Building VQScore model from the checkpoint...")
+    model = vqscore_metric.build_model('cpu')
+    print(f"Exporting to {args.output}...")
+    export(model, args.output, checkpoint_digest=file_digest(vqscore_metric.CHECKPOINT_PATH))
+    print(f"Exported VQScore to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
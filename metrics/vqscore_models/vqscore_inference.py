@@ -0,0 +1,98 @@
+import torch
+import torch.nn.functional as F
+
+from .VQVAE_models import CNN_1D_encoder_QE
+
+# Frames per codebook matmul block: bounds the [frames, codebook_size] similarity tensor
+BLOCK_FRAMES = 4096
+
+
+def masked_instance_norm(x, mask, count, eps: float):
+    """
+    InstanceNorm1d (no affine) over the valid frames only; padded frames come out as 0
+    so the next conv sees the same zero padding as an unbatched item.
+    x - [B, C, T], mask - [B, 1, T], count - [B, 1, 1] valid frames
+    """
+    mean = (x * mask).sum(dim=-1, keepdim=True) / count
+    var = (((x - mean) * mask) ** 2).sum(dim=-1, keepdim=True) / count
+    return (x - mean) / torch.sqrt(var + eps) * mask
+
+
+class VQScoreInference(torch.nn.Module):
+    """
+    Scoring-only VQScore (quality estimation) model: the CNN_1D_encoder_QE plus a frozen
+    cosine-sim codebook. No decoder, no k-means / EMA / gumbel machinery, and the
+    frame x codebook similarity is computed in blocks instead of all at once.
+    forward(SP_input [B, T, 257]) -> VQScore, i.e. -cos_loss(z, zq) of the full VQVAE_QE.
+    TorchScript-compatible (torch.jit.script).
+    """
+    def __init__(self, codebook_size, codebook_dim, eps: float = 1e-5, block_frames: int = BLOCK_FRAMES):
+        super().__init__()
+        self.CNN_1D_encoder = CNN_1D_encoder_QE(codebook_dim)
+        self.eps = eps
+        self.block_frames = block_frames
+        # Raw codebook (nearest-code search, like CosineSimCodebook) and its
+        # cos_loss-normalized copy (scoring); filled by load_vqvae_state_dict
+        self.register_buffer('codebook', torch.zeros(codebook_size, codebook_dim))
+        self.register_buffer('codebook_unit', torch.zeros(codebook_size, codebook_dim))
+
+    def load_vqvae_state_dict(self, state_dict):
+        """
+        Loads the encoder and codebook out of a full VQVAE_QE state dict (decoder weights are ignored).
+        """
+        prefix = 'CNN_1D_encoder.'
+        encoder_state = {key[len(prefix):]: value for key, value in state_dict.items() if key.startswith(prefix)}
+        self.CNN_1D_encoder.load_state_dict(encoder_state)
+
+        embed = state_dict['quantizer.quantizer._codebook.embed']  # [heads=1, codebook_size, dim]
+        self.set_codebook(embed[0])
+
+    def set_codebook(self, embed):
+        embed = embed.detach().to(self.codebook)
+        self.codebook.copy_(embed)
+        self.codebook_unit.copy_(embed / (torch.norm(embed, p=2, dim=-1, keepdim=True) + self.eps))
+
+    def frame_cosines(self, z):
+        """
+        z [N, dim] -> cosine between each frame and its nearest code [N]
+        """
+        # Nearest code by cosine similarity (same as CosineSimCodebook in eval)
+        z_l2 = F.normalize(z, p=2.0, dim=-1)
+        indices = torch.empty(z.shape[0], dtype=torch.long, device=z.device)
+        for start in range(0, z.shape[0], self.block_frames):
+            end = min(start + self.block_frames, z.shape[0])
+            indices[start:end] = torch.matmul(z_l2[start:end], self.codebook.t()).argmax(dim=-1)
+
+        # cos_loss(z, zq) directly: both sides normalized with the same eps
+        z_unit = z / (torch.norm(z, p=2.0, dim=-1, keepdim=True) + self.eps)
+        return torch.sum(z_unit * self.codebook_unit[indices], dim=-1)
+
+    def forward(self, SP_input):
+        z = self.CNN_1D_encoder(SP_input)          # [B, dim, T]
+        z = z.transpose(2, 1).reshape(-1, z.shape[1])  # [B*T, dim]
+        return torch.mean(self.frame_cosines(z))
+
+    @torch.jit.export
+    def score_padded(self, SP_input, lengths):
+        """
+        SP_input [B, T, 257] zero-padded along T, lengths [B] valid frames per row.
+        Returns ([B] sum of frame cosines over each row's valid frames, [B] valid frames),
+        so rows can be averaged per item (e.g. all channels of one file).
+        """
+        enc = self.CNN_1D_encoder
+        mask = (torch.arange(SP_input.shape[1], device=SP_input.device)[None] < lengths[:, None]).to(SP_input.dtype)
+        mask = mask[:, None, :]  # [B, 1, T]
+        count = lengths.to(SP_input.dtype)[:, None, None]
+        eps = enc.enc_In0.eps
+
+        x = masked_instance_norm(SP_input.transpose(2, 1), mask, count, eps)
+        enc1 = masked_instance_norm(enc.activation(enc.conv_enc1(x)), mask, count, eps)
+        enc2 = masked_instance_norm(enc.activation(enc.conv_enc2(enc1)), mask, count, eps)
+        enc3 = masked_instance_norm(enc.activation(enc.conv_enc3(enc1 + enc2)), mask, count, eps)
+        enc4 = masked_instance_norm(enc.activation(enc.conv_enc4(enc3)), mask, count, eps)
+        enc5 = masked_instance_norm(enc.activation(enc.conv_enc5(enc3 + enc4)), mask, count, eps)
+        z = masked_instance_norm(enc.conv_enc6(enc5), mask, count, eps)  # [B, dim, T]
+
+        rows, dim, frames = z.shape
+        cos_frame = self.frame_cosines(z.transpose(2, 1).reshape(-1, dim)).reshape(rows, frames)
+        return (cos_frame * mask[:, 0]).sum(dim=-1), lengths.to(SP_input.dtype)
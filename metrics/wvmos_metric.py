@@ -1,36 +1,127 @@
+import os
+import config
+import wvmos
 from wvmos import get_wvmos
-import streamlit as st
+from metrics.audio import as_audio
+from metrics.cache import file_digest
+from metrics.audio import FINGERPRINT as PREPROCESSING
+from metrics.registry import get_registry, tensor_bytes
+from wvmos.windows import auto_window_size
 
-_wvmos_model = None
+def get_backend():
+    """
+    'onnx' or 'torch', from config.WVMOS_BACKEND ('auto' picks onnx when the exported model exists).
+    """
+    backend = config.WVMOS_BACKEND
+    if backend == 'auto':
+        backend = 'onnx' if os.path.exists(config.WVMOS_ONNX_PATH) else 'torch'
+    if backend not in ('onnx', 'torch'):
+        raise ValueError(f"Unknown WVMOS backend: {backend}")
+    return backend
+
+def quadratic_attention():
+    """
+    Whether the configured backend materializes the attention scores (the onnx export, torch's
+    eager attention), as the model will report once loaded.
+    """
+    return get_backend() == 'onnx' or config.WVMOS_ATTENTION not in ('sdpa', 'flash_attention_2')
+
+def window_size(quadratic_attention=True):
+    """
+    Long-form window in samples: config.WVMOS_WINDOW_SECONDS, or sized to the machine's memory
+    and the model's attention ('auto').
+    """
+    if config.WVMOS_WINDOW_SECONDS == 'auto':
+        return auto_window_size(quadratic_attention, fraction=config.WVMOS_MEMORY_FRACTION)
+    return int(float(config.WVMOS_WINDOW_SECONDS) * 16000)
+
+def load_model():
+    model = _load_backend()
+    model.window_size = window_size(model.quadratic_attention)
+    print(f"WVMOS window: {model.window_size / 16000:.0f}s")
+    return model
+
+def _load_backend():
+    if get_backend() == 'onnx':
+        # onnxruntime: no torch / transformers import needed
+        from wvmos.onnx_backend import Wav2Vec2MOSOnnx
+        print(f"Loading WVMOS model (onnxruntime) from {config.WVMOS_ONNX_PATH}...")
+        return Wav2Vec2MOSOnnx(config.WVMOS_ONNX_PATH)
+    
+    # Auto-detect device (MPS for Mac, CUDA for NVIDIA, CPU otherwise)
+    import torch
+    if torch.backends.mps.is_available():
+        device = 'mps'
+    elif torch.cuda.is_available():
+        device = 'cuda'
+    else:
+        device = 'cpu'
+        
+    print(f"Loading WVMOS model on {device}...")
+    return get_wvmos(device=device, attn_implementation=config.WVMOS_ATTENTION)
+
+def model_size(model):
+    # torch: the wav2vec2 weights; onnxruntime: about the size of the exported graph
+    return tensor_bytes(model) or os.path.getsize(model.path)
+
+# Loaded once and kept in the model registry (evicted only to respect its memory budget)
+get_registry().register('WVMOS', load_model, size=model_size)
 
 def get_model():
-    global _wvmos_model
-    if _wvmos_model is None:
-        # Auto-detect device (MPS for Mac, CUDA for NVIDIA, CPU otherwise)
-        import torch
-        if torch.backends.mps.is_available():
-            device = 'mps'
-        elif torch.cuda.is_available():
-            device = 'cuda'
-        else:
-            device = 'cpu'
-            
-        print(f"Loading WVMOS model on {device}...")
-        _wvmos_model = get_wvmos(device=device)
-    return _wvmos_model
-
-def calculate_wvmos(audio_path):
-    """
-    Calculates WVMOS score.
+    return get_registry().get('WVMOS')
+
+def effective_window():
+    """
+    The long-form window (samples) scores are computed with: the loaded model's, which shrinks
+    for the rest of the process after running out of memory, else the one it will load with
+    (worked out from the configured backend and attention, so cache lookups never load the model).
+    """
+    model = get_registry().loaded('WVMOS')
+    if model is not None:
+        return model.window_size
+    return window_size(quadratic_attention())
+
+def model_fingerprint():
+    """
+    Identifies the model + preprocessing behind cached WVMOS scores.
+    """
+    seconds = effective_window() // 16000
+    if config.WVMOS_LONG_FORM == 'trimmed':
+        long_form = f"win{seconds}-trim15"
+    else:
+        long_form = f"win{seconds}-stride{seconds // 2}"
+    if get_backend() == 'onnx':
+        return f"{file_digest(config.WVMOS_ONNX_PATH)}:onnx:16k-{PREPROCESSING}:{long_form}"
+    return f"{file_digest(wvmos.checkpoint_path())}:16k-{PREPROCESSING}:{long_form}"
+
+def calculate_wvmos(audio):
+    """
+    Calculates WVMOS score for the given audio file (path or AudioBuffer).
     Threshold: >= 4.0
     """
     try:
         model = get_model()
-        score = model.calculate_one(audio_path)
+        score = model.calculate_signal(as_audio(audio).get(16000, channels='mono'), config.WVMOS_LONG_FORM)
         return score
     except Exception as e:
         import traceback
         traceback.print_exc()
-        print(f"Error calculating WVMOS for {audio_path}: {e}")
-        st.error(f"WVMOS Error: {e}")
+        print(f"Error calculating WVMOS for {audio}: {e}")
         return None
+
+
+def calculate_wvmos_batch(audios):
+    """
+    WVMOS scores for many files / clips at once (paths or AudioBuffers).
+    Windows of all of them are batched through the model together.
+    Returns a list of scores (None for every item if the batch fails).
+    """
+    try:
+        model = get_model()
+        signals = [as_audio(audio).get(16000, channels='mono') for audio in audios]
+        return model.calculate_signals(signals, config.WVMOS_LONG_FORM)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        print(f"Error calculating WVMOS for a batch of {len(audios)}: {e}")
+        return [None] * len(audios)
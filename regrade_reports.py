@@ -1,50 +1,128 @@
+import os
+import glob
+import argparse
+import numpy as np
 import pandas as pd
 import config
-import os
 
 THRESHOLDS = config.THRESHOLDS
+METRIC_DESCRIPTIONS = config.METRIC_DESCRIPTIONS
+
+# Regraded when no reports or runs are given
+DEFAULT_REPORTS = [
+    "brazil_sampled_report.csv",
+    "probono_india_3_report.csv",
+    "probono_india_4_report.csv",
+    "haryanvi_sample_report.csv"
+]
+
+COLUMNS = ['Filename', 'Metric', 'Description', 'Threshold', 'Score', 'PASS OR FAIL']
+
+def regrade(df, thresholds=None):
+    """
+    Applies the thresholds to a report DataFrame (Metric / Score columns) in one pass.
+    Rows of metrics without a threshold are left as they are; missing scores are ERROR.
+    """
+    thresholds = THRESHOLDS if thresholds is None else thresholds
+    df = df.copy()
+
+    threshold = df['Metric'].map(thresholds)
+    known = threshold.notna().to_numpy()
+    score = pd.to_numeric(df['Score'], errors='coerce')
 
-def regrade_csv(file_path):
+    status = np.where(score.isna(), 'ERROR', np.where(score >= threshold, 'PASS', 'FAIL'))
+
+    if 'Threshold' not in df:
+        df['Threshold'] = np.nan
+    if 'PASS OR FAIL' not in df:
+        df['PASS OR FAIL'] = None
+    df['Threshold'] = df['Threshold'].astype('float64')
+    df['PASS OR FAIL'] = df['PASS OR FAIL'].astype('object')
+    df.loc[known, 'Threshold'] = threshold[known]
+    df.loc[known, 'PASS OR FAIL'] = status[known]
+    return df
+
+def regrade_csv(file_path, output=None):
     if not os.path.exists(file_path):
         print(f"Skipping {file_path} (Not found)")
         return
 
     print(f"Regrading {file_path}...")
-    df = pd.read_csv(file_path)
-    
-    # Iterate and update
-    updated_rows = []
+    df = regrade(pd.read_csv(file_path))
+
+    output = output or file_path
+    df.to_csv(output, index=False)
+    print(f"Updated {output}")
+
+def regrade_run(run, output=None, store=None):
+    """
+    Rebuilds the report of a run recorded in the results store (see metrics.cache)
+    from its raw scores, graded with the current thresholds.
+    """
+    from metrics.cache import get_cache
+    store = store or get_cache()
+    if store is None:
+        print("Results store disabled (config.SCORE_CACHE_PATH is not set)")
+        return
+
+    report, rows = store.load_run(run)
+    df = pd.DataFrame(rows, columns=['Filename', 'Metric', 'Score'])
+    df['Description'] = df['Metric'].map(METRIC_DESCRIPTIONS).fillna('')
+    df = regrade(df)[COLUMNS]
+
+    output = output or report or f"{run}.csv"
+    df.to_csv(output, index=False)
+    print(f"Regraded run {run} -> {output}")
+
+def expand_reports(patterns):
+    """
+    CSV paths from paths and glob patterns, in order, without duplicates.
+    """
+    reports = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in reports:
+                reports.append(path)
+    return reports
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply the current config.THRESHOLDS to existing reports without rescoring')
+    parser.add_argument('reports', nargs='*', help='Report CSVs or glob patterns (e.g. "reports/*.csv"), regraded in place')
+    parser.add_argument('--run', action='append', default=[], help='Regrade a run from the results store: a run id, or a report name for its latest run (repeatable)')
+    parser.add_argument('--all-runs', action='store_true', help='Regrade every run in the results store')
+    parser.add_argument('--list-runs', action='store_true', help='List the runs in the results store')
+    parser.add_argument('--output-dir', default=None, help='Write regraded reports here instead of overwriting them')
+    args = parser.parse_args()
+
+    def output_for(path):
+        if args.output_dir is None:
+            return None
+        os.makedirs(args.output_dir, exist_ok=True)
+        return os.path.join(args.output_dir, os.path.basename(path))
+
+    if args.list_runs or args.all_runs:
+        from metrics.cache import get_cache
+        store = get_cache()
+        recorded = store.runs() if store is not None else []
+        if args.list_runs:
+            for run, report, count, created in recorded:
+                print(f"{run:<30} {count:>8} scores  {report}")
+        if args.all_runs:
+            args.run.extend(run for run, _, _, _ in recorded if run not in args.run)
+
+    for run in args.run:
+        try:
+            regrade_run(run, output=output_for(f"{run}.csv"))
+        except KeyError as e:
+            print(e)
+
+    reports = args.reports
+    if not reports and not args.run and not args.list_runs:
+        reports = DEFAULT_REPORTS
     
-    for index, row in df.iterrows():
-        metric = row['Metric']
-        score = row['Score']
-        
-        # Determine new threshold
-        threshold = THRESHOLDS.get(metric)
-        
-        if threshold is not None:
-             # Update Threshold column
-            row['Threshold'] = threshold
-            
-            # Update Status
-            if score >= threshold:
-                row['PASS OR FAIL'] = 'PASS'
-            else:
-                row['PASS OR FAIL'] = 'FAIL'
-        
-        updated_rows.append(row)
-        
-    new_df = pd.DataFrame(updated_rows)
-    new_df.to_csv(file_path, index=False)
-    print(f"Updated {file_path}")
+    for report in expand_reports(reports):
+        regrade_csv(report, output=output_for(report))
 
 if __name__ == "__main__":
-    reports = [
-        "brazil_sampled_report.csv",
-        "probono_india_3_report.csv",
-        "probono_india_4_report.csv",
-        "haryanvi_sample_report.csv"
-    ]
-    
-    for report in reports:
-        regrade_csv(report)
+    main()
@@ -1,12 +1,12 @@
 import os
 import argparse
 import pandas as pd
-import librosa
 import soundfile as sf
-import numpy as np
 import traceback
-from tqdm import tqdm
-from evaluate import evaluate_file
+from evaluate import run_batch, save_trace
+from metrics.audio import AudioBuffer, extract_chunks, chunk_sampling
+from metrics.runner import compute_scores_batch, cached_scores, REPORT_METRICS
+from metrics.cache import record_run
 
 import config
 THRESHOLDS = config.THRESHOLDS
@@ -33,59 +33,41 @@ def process_file_smart(input_path, max_chunks=None, force_full=False):
         # Smart Sampling (Default) vs Full Analysis
         if force_full:
             print("Force Full: Analyzing full duration...")
-            chunk_paths = [input_path]
+            chunks = [input_path]
         elif duration_sec > 180: # > 3 minutes
             num_chunks = 5
             chunk_duration = 30.0
             print(f"Large file. Using Smart Sampling ({num_chunks} chunks of {chunk_duration}s)...")
             
-            # Create chunks list
-            chunk_paths = []
-            segment_length = duration_sec / num_chunks
-            
-            # Ensure chunks temp dir
-            chunks_dir = os.path.join(os.path.dirname(input_path), "temp_smart_chunks")
-            os.makedirs(chunks_dir, exist_ok=True)
-            
-            for i in range(num_chunks):
-                # Center of the segment
-                segment_center = (i * segment_length) + (segment_length / 2)
-                start_time = max(0, segment_center - (chunk_duration / 2))
-                
-                # Boundary checks
-                if start_time + chunk_duration > duration_sec:
-                    start_time = max(0, duration_sec - chunk_duration)
-                
-                try:
-                    y_chunk, sr_chunk = librosa.load(input_path, sr=None, offset=start_time, duration=chunk_duration)
-                    chunk_filename = f"{os.path.basename(input_path)}_chunk_{i}.wav"
-                    chunk_path = os.path.join(chunks_dir, chunk_filename)
-                    sf.write(chunk_path, y_chunk, sr_chunk)
-                    chunk_paths.append(chunk_path)
-                except Exception as e:
-                    print(f"Error extracting chunk {i}: {e}")
+            # If every clip is already in the score cache, skip extraction altogether
+            chunks = [AudioBuffer(None, None, name=f"{input_path}_chunk_{i}", source=input_path,
+                                  sampling=chunk_sampling(i, num_chunks, chunk_duration)) for i in range(num_chunks)]
+            if any(cached_scores(chunk, REPORT_METRICS) is None for chunk in chunks):
+                # Clips are extracted in memory and handed straight to the metrics
+                chunks = extract_chunks(input_path, num_chunks=num_chunks, chunk_duration=chunk_duration)
                     
-            if not chunk_paths:
+            if not chunks:
                 print("Warning: Sampling failed, falling back to full file.")
-                chunk_paths = [input_path]
+                chunks = [input_path]
         else:
             print("Short file. Analyzing full duration...")
-            chunk_paths = [input_path]
+            chunks = [input_path]
         
         chunk_scores = {metric: [] for metric in THRESHOLDS.keys()}
         
-        for chunk_path in chunk_paths:
-            try:
-                # Run existing evaluation logic
-                rows = evaluate_file(chunk_path)
-                # Collect scores
-                for row in rows:
-                    metric = row['Metric']
-                    score = row['Score']
-                    if score is not None:
-                        chunk_scores[metric].append(score)
-            except Exception as e:
-                print(f"Error evaluating chunk {chunk_path}: {e}")
+        try:
+            # Cached metrics are looked up, the rest computed (WVMOS, VQScore and SIGMOS batched over the clips)
+            all_scores = compute_scores_batch(chunks, metrics=REPORT_METRICS)
+        except Exception as e:
+            print(f"Error evaluating chunks of {input_path}: {e}")
+            all_scores = []
+            
+        for scores in all_scores:
+            # Collect scores
+            for metric in THRESHOLDS.keys():
+                score = scores.get(metric)
+                if score is not None:
+                    chunk_scores[metric].append(score)
             
         # Calculate averages for THIS file (single chunk, so average is just the score)
         file_rows = []
@@ -124,8 +106,16 @@ def main():
     parser.add_argument('--output', default='smart_avg_report.csv', help='Output CSV file')
     parser.add_argument('--max-chunks', type=int, default=None, help='Maximum number of chunks to evaluate per file')
     parser.add_argument('--full', action='store_true', help='Force full-file analysis (disable sampling)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (each loads the models once)')
+    parser.add_argument('--threads', type=int, default=config.METRIC_THREADS, help='Threads for running the metrics of one file concurrently')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not update the score cache')
+    parser.add_argument('--trace', default=config.TRACE_PATH, help='Write per-stage timings / memory here (.jsonl: JSON lines, else Chrome trace)')
     
     args = parser.parse_args()
+    config.METRIC_THREADS = args.threads
+    config.TRACE_PATH = args.trace
+    if args.no_cache:
+        config.SCORE_CACHE_PATH = None
     input_path = args.input_path
     
     files = []
@@ -144,10 +134,8 @@ def main():
 
     print(f"Found {len(files)} files to evaluate.")
     
-    all_rows = []
-    for file_path in tqdm(files):
-        file_rows = process_file_smart(file_path, max_chunks=args.max_chunks, force_full=args.full)
-        all_rows.extend(file_rows)
+    all_rows = run_batch(process_file_smart, files, workers=args.workers,
+                         max_chunks=args.max_chunks, force_full=args.full)
         
     # Save master report
     df = pd.DataFrame(all_rows)
@@ -156,7 +144,12 @@ def main():
     df = df[cols] if not df.empty else pd.DataFrame(columns=cols)
     
     df.to_csv(args.output, index=False)
+    # Raw scores are kept so threshold changes can be applied with regrade_reports.py
+    run = record_run(os.path.splitext(os.path.basename(args.output))[0], all_rows, report=os.path.abspath(args.output))
     print(f"Report saved to {args.output}")
+    if run:
+        print(f"Scores recorded as run {run} (regrade with: python regrade_reports.py --run {run})")
+    save_trace()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import soundfile as sf
+
+import config
+import benchmark
+from benchmark import corpus_file, compare, succeeded, report_rows
+
+def test_corpus_is_deterministic():
+    with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+        a = corpus_file(first, 'test-44k-stereo', 44100, 3, 2)
+        b = corpus_file(second, 'test-44k-stereo', 44100, 3, 2)
+        with open(a, 'rb') as fa, open(b, 'rb') as fb:
+            assert fa.read() == fb.read()
+        y, sr = sf.read(a)
+        assert sr == 44100 and y.shape == (44100 * 3, 2)
+        # Speech-like: syllables well above the noise floor, channels correlated but not identical
+        rms = np.sqrt(np.mean(y ** 2, axis=0))
+        assert np.all(rms > 0.01) and np.max(np.abs(y)) <= 1
+        assert not np.allclose(y[:, 0], y[:, 1])
+        # A different name is a different file
+        c = corpus_file(first, 'test-44k-stereo-2', 44100, 3, 2)
+        assert not np.allclose(sf.read(c)[0], y)
+
+def test_regression_gates():
+    baseline = {'seconds': 2.0, 'rtf': 0.2, 'peak_rss_mb': 500.0, 'ok': True}
+    assert compare(dict(baseline, seconds=2.4, rtf=0.24, peak_rss_mb=550.0), baseline) == []
+    found = compare(dict(baseline, seconds=3.0, rtf=0.3, peak_rss_mb=700.0), baseline)
+    assert len(found) == 2 and found[0].startswith('RTF') and found[1].startswith('peak RSS')
+    # Sub-second noise and small allocations are within the absolute slack
+    tiny = {'seconds': 0.01, 'rtf': 0.005, 'peak_rss_mb': 100.0, 'ok': True}
+    assert compare(dict(tiny, seconds=0.03, peak_rss_mb=125.0), tiny) == []
+    # Not comparable: no baseline, skipped, failed, or other models loaded
+    assert compare(baseline, None) is None
+    assert compare({'skipped': 'WVMOS model unavailable'}, baseline) is None
+    assert compare(dict(baseline, ok=False), baseline) is None
+    assert compare(dict(baseline, models=['WVMOS']), dict(baseline, models=[])) is None
+
+def test_missing_scores_fail():
+    rows = [{'Metric': metric, 'Score': 1.0, 'PASS OR FAIL': 'PASS'} for metric in config.THRESHOLDS]
+    expected = report_rows(['SIGMOS', 'VQScore', 'WVMOS'])
+    assert succeeded(rows, expected) and succeeded(2.5) and succeeded({'SIGMOS_OVRL': 3.0})
+    # evaluate_file's ERROR rows, metrics left out by the smart pipeline, failed metrics / batch items
+    errored = [dict(row, Score=None, **{'PASS OR FAIL': 'ERROR'}) if row['Metric'] == 'WVMOS' else row for row in rows]
+    assert not succeeded(errored, expected)
+    assert not succeeded([row for row in rows if row['Metric'] != 'SRMR'], expected)
+    assert not succeeded(None) and not succeeded([]) and not succeeded({'SIGMOS_OVRL': None})
+    assert not succeeded([1.0, None]) and succeeded([1.0, 2.0])
+    # Rows the reports leave unscored (sample rates) or whose model isn't loaded don't count
+    unscored = [dict(row, Score=None, **{'PASS OR FAIL': 'ERROR'}) if row['Metric'] not in ('SRMR',) else row for row in rows]
+    assert report_rows([]) == ['SRMR'] and succeeded(unscored, report_rows([]))
+    assert set(expected) == {'SRMR', 'SIGMOS_DISC', 'SIGMOS_OVRL', 'SIGMOS_REVERB', 'VQScore', 'WVMOS'}
+
+def run_main(result, *extra):
+    """
+    benchmark.main() on one case / target whose measurement returns `result`; the exit code.
+    """
+    saved = benchmark.run_case, benchmark.corpus_file, sys.argv
+    with tempfile.TemporaryDirectory() as tmp:
+        benchmark.run_case = lambda *args: dict(result)
+        benchmark.corpus_file = lambda corpus, name, *args: os.path.join(corpus, name + '.wav')
+        sys.argv = ['benchmark.py', '--cases', '2s-16k-mono', '--targets', 'SRMR', '--corpus', tmp,
+                    '--baseline', os.path.join(tmp, 'baseline.json')] + list(extra)
+        try:
+            benchmark.main()
+            return 0
+        except SystemExit as e:
+            return e.code
+        finally:
+            benchmark.run_case, benchmark.corpus_file, sys.argv = saved
+
+def test_failures_fail_the_run():
+    measured = {'seconds': 0.1, 'audio_seconds': 2.0, 'rtf': 0.05, 'throughput': 20.0,
+                'peak_rss_mb': 200.0, 'peak_delta_mb': 10.0, 'ok': True}
+    assert run_main(measured) == 0
+    assert run_main({'skipped': 'WVMOS model unavailable (OSError)'}) == 0
+    # A metric returning None / ERROR, or a crashed measurement, even while recording a baseline
+    assert run_main(dict(measured, ok=False)) == 1
+    assert run_main({'error': 'RuntimeError: boom'}) == 1
+    assert run_main(dict(measured, ok=False), '--save-baseline') == 1
+
+if __name__ == "__main__":
+    test_corpus_is_deterministic()
+    test_regression_gates()
+    test_missing_scores_fail()
+    test_failures_fail_the_run()
+    print("benchmark: OK")
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+
+import config
+import evaluate
+from evaluate import make_groups, run_batch, THRESHOLDS
+from metrics.runner import compute_scores_batch, REPORT_METRICS
+
+def write_files(tmp, seconds):
+    paths = []
+    for i, duration in enumerate(seconds):
+        path = os.path.join(tmp, f"{i}.wav")
+        sf.write(path, np.zeros(int(8000 * duration), dtype=np.float32), 8000)
+        paths.append(path)
+    return paths
+
+def test_groups_spread_over_workers():
+    with tempfile.TemporaryDirectory() as tmp:
+        files = write_files(tmp, [1, 1, 1, 1])
+        assert make_groups(files, 8) == [files]
+        # One batch per worker instead of one task for the whole pool
+        assert make_groups(files, 8, workers=2) == [files[:2], files[2:]]
+        assert make_groups(files, 8, workers=3) == [files[:2], files[2:]]
+        assert make_groups(files, 8, workers=8) == [[path] for path in files]
+        assert make_groups(files, 1, workers=2) == [[path] for path in files]
+
+        # Long files still get their own batch and don't count towards the cap
+        saved = evaluate.BATCH_MAX_SECONDS
+        evaluate.BATCH_MAX_SECONDS = 5
+        try:
+            files = write_files(tmp, [1, 10, 1, 1, 1])
+            assert make_groups(files, 8, workers=2) == [[files[1]], [files[0], files[2]], files[3:]]
+        finally:
+            evaluate.BATCH_MAX_SECONDS = saved
+
+def test_failed_batch_keeps_other_files():
+    calls = []
+
+    def score(paths):
+        calls.append(list(paths))
+        if 'bad.wav' in paths:
+            raise RuntimeError("cannot decode bad.wav")
+        rows = []
+        for path in paths:
+            rows.extend(evaluate.build_rows(path, {metric: threshold + 1 for metric, threshold in THRESHOLDS.items()}))
+        return rows
+
+    rows = run_batch(score, [['a.wav', 'bad.wav', 'c.wav'], ['d.wav']])
+    # The batch failed, so its files were retried one by one
+    assert calls[1:4] == [['a.wav'], ['bad.wav'], ['c.wav']], calls
+    status = {(row['Filename'], row['Metric']): row['PASS OR FAIL'] for row in rows}
+    assert len(rows) == 4 * len(THRESHOLDS)
+    for metric in THRESHOLDS:
+        assert status[('bad.wav', metric)] == 'ERROR'
+        assert status[('a.wav', metric)] == status[('c.wav', metric)] == status[('d.wav', metric)] == 'PASS'
+    # Report order follows the input order
+    assert [row['Filename'] for row in rows[::len(THRESHOLDS)]] == ['a.wav', 'bad.wav', 'c.wav', 'd.wav']
+
+def test_report_metrics_only():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'speech.wav')
+        sf.write(path, 0.1 * np.random.default_rng(0).standard_normal(16000 * 2), 16000)
+        saved = config.SCORE_CACHE_PATH
+        config.SCORE_CACHE_PATH = None
+        try:
+            # Only the named metrics run; the rest are None like failures
+            scores, = compute_scores_batch([path], threads=1, metrics=('SRMR',))
+            assert scores['SRMR'] is not None
+            assert scores['Mic SR'] is None and scores['Recording SR'] is None and scores['WVMOS'] is None
+        finally:
+            config.SCORE_CACHE_PATH = saved
+
+    # The reports score the model metrics and SRMR; their sample-rate rows stay ERROR
+    assert 'Mic SR' not in REPORT_METRICS and 'Recording SR' not in REPORT_METRICS
+    calls = []
+    saved = evaluate.compute_scores_batch
+    evaluate.compute_scores_batch = lambda audios, **kwargs: calls.append(kwargs) or [{} for _ in audios]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = evaluate.evaluate_files(write_files(tmp, [1]))
+    finally:
+        evaluate.compute_scores_batch = saved
+    assert calls == [{'metrics': REPORT_METRICS}]
+    assert {row['Metric']: row['PASS OR FAIL'] for row in rows}['Mic SR'] == 'ERROR'
+
+if __name__ == "__main__":
+    test_groups_spread_over_workers()
+    test_failed_batch_keeps_other_files()
+    print("evaluate batching: OK")
+    test_report_metrics_only()
+    print("report metrics: OK")
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+import torch
+import warnings
+warnings.filterwarnings("ignore")
+
+from metrics.audio import AudioBuffer
+from metrics import srmr, srmr_metric, sigmos_metric, vqscore_metric, wvmos_metric, samplerate_metric
+from metrics.registry import get_registry
+
+# Every variant a metric asks AudioBuffer for: (sr, channels, res_type)
+VARIANTS = [
+    (None, 'first', 'polyphase'), (None, 'mono', 'polyphase'), (None, 'all', 'polyphase'),
+    (16000, 'first', 'polyphase'), (16000, 'mono', 'polyphase'), (16000, 'all', 'polyphase'),
+    (48000, 'first', 'polyphase'), (16000, 'mono', 'soxr_hq'),
+]
+
+def make_buffers(directory):
+    """
+    Stereo test audio decoded from int16 and float64 files, and built from in-memory arrays.
+    """
+    rng = np.random.default_rng(0)
+    y = 0.1 * rng.standard_normal((44100, 2))
+    paths = {}
+    for subtype in ('PCM_16', 'DOUBLE'):
+        paths[subtype] = os.path.join(directory, f"{subtype}.wav")
+        sf.write(paths[subtype], y, 44100, subtype=subtype)
+    return {
+        'int16 file': AudioBuffer.from_file(paths['PCM_16']),
+        'float64 file': AudioBuffer.from_file(paths['DOUBLE']),
+        'float64 array': AudioBuffer(y, 44100),
+        'int16 array': AudioBuffer((y * 32767).astype(np.int16), 44100),
+    }
+
+def test_buffers_are_float32():
+    with tempfile.TemporaryDirectory() as directory:
+        for name, audio in make_buffers(directory).items():
+            assert audio.data.dtype == np.float32, name
+            for sr, channels, res_type in VARIANTS:
+                y = audio.get(sr, channels=channels, res_type=res_type)
+                assert y.dtype == np.float32, (name, sr, channels, res_type, y.dtype)
+
+class Recorder:
+    """
+    Stands in for a model: records the dtype of what it is given.
+    """
+    def __init__(self, result):
+        self.result = result
+        self.dtypes = []
+
+    def record(self, x):
+        self.dtypes.append(x.dtype)
+        return self.result
+
+class FakeSigMOS(Recorder):
+    sampling_rate = 48000
+    resample_type = 'polyphase'
+
+    def run(self, audio, sr=None):
+        return self.record(audio)
+
+    def run_batch(self, audios, sr=None):
+        return [self.run(audio, sr) for audio in audios]
+
+class FakeVQScore(Recorder):
+    def __call__(self, SP_input):
+        return torch.tensor(self.record(SP_input))
+
+class FakeWVMOS(Recorder):
+    def calculate_signal(self, signal, long_form=True):
+        return self.record(signal)
+
+    def calculate_signals(self, signals, long_form=True):
+        return [self.calculate_signal(signal, long_form) for signal in signals]
+
+def test_metrics_receive_float32():
+    srmr_dtypes = []
+    original_srmr = srmr.srmr
+
+    def recording_srmr(y, fs, **kwargs):
+        srmr_dtypes.append(y.dtype)
+        return original_srmr(y, fs, **kwargs)
+
+    sigmos = FakeSigMOS({'MOS_DISC': 4.0, 'MOS_OVRL': 3.0, 'MOS_REVERB': 3.5})
+    vqscore = FakeVQScore(0.7)
+    wvmos = FakeWVMOS(4.0)
+    registry = get_registry()
+    saved = (srmr.srmr, vqscore_metric._vqscore_config, vqscore_metric._device)
+    srmr.srmr = recording_srmr
+    registry.register('SIGMOS', lambda: sigmos, size=lambda model: 0)
+    registry.register('VQScore', lambda: vqscore, size=lambda model: 0)
+    registry.register('WVMOS', lambda: wvmos, size=lambda model: 0)
+    vqscore_metric._vqscore_config = {'input_transform': 'none'}
+    vqscore_metric._device = torch.device('cpu')
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for name, audio in make_buffers(directory).items():
+                assert srmr_metric.calculate_srmr(audio) is not None, name
+                assert sigmos_metric.calculate_sigmos(audio) is not None, name
+                assert vqscore_metric.calculate_vqscore(audio) is not None, name
+                assert wvmos_metric.calculate_wvmos(audio) is not None, name
+                assert samplerate_metric.get_mic_sr(audio) > 0, name
+            buffers = list(make_buffers(directory).values())
+            sigmos_metric.calculate_sigmos_batch(buffers)
+            wvmos_metric.calculate_wvmos_batch(buffers)
+    finally:
+        srmr.srmr, vqscore_metric._vqscore_config, vqscore_metric._device = saved
+        registry.register('SIGMOS', sigmos_metric.load_estimator, size=sigmos_metric.estimator_size)
+        registry.register('VQScore', vqscore_metric.create_model, size=vqscore_metric.model_size)
+        registry.register('WVMOS', wvmos_metric.load_model, size=wvmos_metric.model_size)
+
+    for name, dtypes in (('SRMR', srmr_dtypes), ('SIGMOS', sigmos.dtypes),
+                         ('VQScore', vqscore.dtypes), ('WVMOS', wvmos.dtypes)):
+        assert dtypes, name
+        assert all(dtype in (np.float32, torch.float32) for dtype in dtypes), (name, dtypes)
+
+if __name__ == "__main__":
+    test_buffers_are_float32()
+    print("AudioBuffer variants float32: OK")
+    test_metrics_receive_float32()
+    print("metrics receive float32: OK")
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+import librosa
+import warnings
+warnings.filterwarnings("ignore")
+
+from metrics import samplerate_metric
+from metrics.audio import AudioBuffer
+from metrics.samplerate_metric import N_FFT, get_mic_sr, max_hold_spectrum
+
+def blocks_of(y, size):
+    return (y[start:start + size] for start in range(0, len(y), size))
+
+def test_max_hold_matches_librosa():
+    rng = np.random.default_rng(0)
+    # Shorter than one frame, odd, exact multiples of the hop / frame, several blocks
+    for length in (1, 100, N_FFT // 2 - 1, N_FFT - 1, N_FFT, N_FFT + 1, 5001, 44100 + 7):
+        y = rng.standard_normal(length).astype(np.float32)
+        expected = np.max(np.abs(librosa.stft(y)), axis=1)
+        for block_size in (1000, 4096, length):
+            actual = max_hold_spectrum(blocks_of(y, block_size))
+            assert actual.shape == expected.shape, (length, block_size)
+            assert np.allclose(actual, expected, rtol=1e-5, atol=1e-6), (length, block_size)
+
+def test_audio_buffers_stream_from_disk():
+    # Content up to ~4 kHz in a 44.1 kHz stereo file
+    t = np.arange(44100 * 3) / 44100
+    # (faded in and out: the edges of the file would splatter energy over every bin)
+    y = 0.1 * np.hanning(len(t)) * sum(np.sin(2 * np.pi * f * t) for f in (220, 1000, 3900))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'speech.wav')
+        sf.write(path, np.stack([y, 0.5 * y], axis=1).astype(np.float32), 44100)
+        expected = get_mic_sr(path)
+
+        # A buffer nothing has decoded yet is streamed: it stays undecoded
+        audio = AudioBuffer.from_file(path)
+        assert get_mic_sr(audio) == expected
+        assert not audio.decoded
+        # Decoded samples are reused instead
+        audio.data
+        assert get_mic_sr(audio) == expected
+        assert get_mic_sr(path, streaming=False) == expected
+    assert 7800 <= expected <= 12000, expected
+
+if __name__ == "__main__":
+    test_max_hold_matches_librosa()
+    print("max-hold spectrum: OK")
+    test_audio_buffers_stream_from_disk()
+    print("Mic SR streaming: OK")
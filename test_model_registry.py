@@ -0,0 +1,103 @@
+import time
+import threading
+
+from metrics.registry import ModelRegistry
+
+MB = 1024 * 1024
+
+class FakeModel:
+    def __init__(self, name, size_mb):
+        self.name = name
+        self.size_mb = size_mb
+
+def make_registry(budget_mb, sizes_mb):
+    """
+    Registry of fake models with the given sizes; returns (registry, load counts).
+    """
+    registry = ModelRegistry(budget_mb=budget_mb)
+    loads = {name: 0 for name in sizes_mb}
+    for name, size_mb in sizes_mb.items():
+        def loader(name=name, size_mb=size_mb):
+            loads[name] += 1
+            return FakeModel(name, size_mb)
+        registry.register(name, loader, size=lambda model: model.size_mb * MB)
+    return registry, loads
+
+def test_evicts_least_recently_used():
+    registry, loads = make_registry(250, {'A': 100, 'B': 100, 'C': 100})
+    registry.get('A')
+    registry.get('B')
+    registry.get('A')  # B is now the least recently used
+    registry.get('C')
+    assert list(registry.resident()) == ['A', 'C']
+    assert registry.resident() == {'A': 100 * MB, 'C': 100 * MB}
+
+    # Reloaded on demand, evicting A (least recently used) this time
+    registry.get('B')
+    assert list(registry.resident()) == ['C', 'B']
+    assert loads == {'A': 1, 'B': 2, 'C': 1}
+
+def test_unlimited_keeps_everything():
+    registry, loads = make_registry(0, {'A': 100, 'B': 100, 'C': 100})
+    for name in ('A', 'B', 'C', 'A', 'B', 'C'):
+        registry.get(name)
+    assert set(registry.resident()) == {'A', 'B', 'C'}
+    assert loads == {'A': 1, 'B': 1, 'C': 1}
+
+def test_held_models_are_not_evicted():
+    registry, loads = make_registry(150, {'A': 100, 'B': 100})
+    with registry.hold('A'):
+        model = registry.get('A')
+        # Over budget, but A is in use: B loads next to it and A stays
+        registry.get('B')
+        assert set(registry.resident()) == {'A', 'B'}
+        assert registry.get('A') is model
+    # Released: back within budget by evicting the least recently used idle model
+    assert list(registry.resident()) == ['A']
+
+def test_waits_for_room_next_to_held_models():
+    registry, loads = make_registry(150, {'A': 100, 'B': 100})
+    # Sizes become known at the first load
+    registry.get('A')
+    registry.get('B')
+    events = []
+
+    def use(name, seconds):
+        with registry.hold(name):
+            registry.get(name)
+            events.append(('start', name))
+            time.sleep(seconds)
+            events.append(('end', name))
+
+    first = threading.Thread(target=use, args=('A', 0.3))
+    first.start()
+    time.sleep(0.05)
+    second = threading.Thread(target=use, args=('B', 0.0))
+    second.start()
+    first.join()
+    second.join()
+    # B only started once A was released: both never resident together
+    assert events == [('start', 'A'), ('end', 'A'), ('start', 'B'), ('end', 'B')]
+    assert list(registry.resident()) == ['B']
+
+def test_failed_load_leaves_nothing_behind():
+    registry = ModelRegistry(budget_mb=0)
+
+    def broken():
+        raise RuntimeError("missing checkpoint")
+    registry.register('A', broken)
+    try:
+        registry.get('A')
+        assert False, "load should fail"
+    except RuntimeError:
+        pass
+    assert registry.resident() == {}
+    assert registry.stats()['A'] == {'loaded': False, 'bytes': None, 'held': 0}
+
+if __name__ == "__main__":
+    test_evicts_least_recently_used()
+    test_unlimited_keeps_everything()
+    test_held_models_are_not_evicted()
+    test_waits_for_room_next_to_held_models()
+    test_failed_load_leaves_nothing_behind()
+    print("model registry: OK")
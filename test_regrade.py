@@ -0,0 +1,71 @@
+import os
+import tempfile
+import pandas as pd
+
+import config
+from evaluate import build_rows, THRESHOLDS
+from metrics import cache as score_cache
+from metrics.cache import ScoreCache, record_run
+from regrade_reports import regrade, regrade_run
+
+def make_rows():
+    """
+    Report rows as evaluate.py writes them: above, at and below each threshold, and failed (None).
+    """
+    rows = []
+    for n, offset in enumerate((1.0, 0.0, -0.01, None)):
+        scores = {metric: None if offset is None else threshold + offset for metric, threshold in THRESHOLDS.items()}
+        rows.extend(build_rows(f"file{n}.wav", scores))
+    return rows
+
+def test_regrade_matches_report_writer():
+    rows = make_rows()
+    original = pd.DataFrame(rows)
+    assert set(original['PASS OR FAIL']) == {'PASS', 'FAIL', 'ERROR'}
+
+    regraded = regrade(original.drop(columns=['PASS OR FAIL', 'Threshold']))
+    assert list(regraded['PASS OR FAIL']) == list(original['PASS OR FAIL'])
+    assert list(regraded['Threshold']) == list(original['Threshold'])
+
+    # Through a CSV round trip (missing scores come back as NaN)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'report.csv')
+        original.to_csv(path, index=False)
+        assert list(regrade(pd.read_csv(path))['PASS OR FAIL']) == list(original['PASS OR FAIL'])
+
+def test_runs_are_not_overwritten():
+    rows = make_rows()
+    saved = config.SCORE_CACHE_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        config.SCORE_CACHE_PATH = os.path.join(tmp, 'cache.sqlite')
+        try:
+            report = os.path.join(tmp, 'evaluation_report.csv')
+            first = record_run('evaluation_report', rows[:len(THRESHOLDS)], report=report)
+            second = record_run('evaluation_report', rows, report=report)
+            assert first != second and first.startswith('evaluation_report@') and second.startswith('evaluation_report@')
+            store = score_cache.get_cache()
+            assert [run for run, _, _, _ in store.runs()] == [first, second]
+            assert len(store.load_run(first)[1]) == len(THRESHOLDS)
+            # A report name loads its latest run
+            assert len(store.load_run('evaluation_report')[1]) == len(rows)
+            try:
+                store.record_run(first, rows)
+                assert False, "should refuse to overwrite a recorded run"
+            except ValueError:
+                pass
+            store.record_run(first, rows, replace=True)
+            assert len(store.load_run(first)[1]) == len(rows)
+
+            # Regrading the recorded scores reproduces the original labels
+            output = os.path.join(tmp, 'regraded.csv')
+            regrade_run(second, output=output)
+            regraded = pd.read_csv(output, keep_default_na=False)
+            assert list(regraded['PASS OR FAIL']) == [row['PASS OR FAIL'] for row in rows]
+        finally:
+            config.SCORE_CACHE_PATH = saved
+            score_cache._score_cache = None
+
+if __name__ == "__main__":
+    test_regrade_matches_report_writer()
+    test_runs_are_not_overwritten()
+    print("regrade: OK")
@@ -0,0 +1,110 @@
+import sys
+import numpy as np
+import librosa
+import scipy.signal
+import torch
+import torchaudio
+import warnings
+warnings.filterwarnings("ignore")
+
+from metrics.audio import AudioBuffer
+from metrics.resample import resample, polyphase_filter
+
+# Minimum agreement with the resamplers the metrics used before, below 85% of the
+# lower Nyquist frequency (above it the filters' roll-offs legitimately differ)
+MIN_PASSBAND_SNR_DB = 45.0
+
+# Resampler each metric used before metrics.resample: (target rate, function)
+PREVIOUS = {
+    'soxr_hq (SRMR, WVMOS)': (16000, lambda y, sr, target: librosa.resample(y, orig_sr=sr, target_sr=target, res_type='soxr_hq')),
+    'fft (SIGMOS)': (48000, lambda y, sr, target: librosa.resample(y, orig_sr=sr, target_sr=target, res_type='fft')),
+    'torchaudio (VQScore)': (16000, lambda y, sr, target: torchaudio.transforms.Resample(sr, target)(torch.from_numpy(y)).numpy()),
+}
+
+def make_signal(sr, seconds=3.0):
+    """
+    Speech-like test signal: a gliding harmonic series under noise.
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(int(sr * seconds)) / sr
+    f0 = 120 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 40) if k * 160 < sr / 2)
+    return (0.1 * y + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+def passband_snr(actual, expected, cutoff):
+    # cutoff: fraction of the signals' Nyquist frequency
+    n = min(len(actual), len(expected))
+    sos = scipy.signal.butter(10, cutoff, output='sos')
+    actual = scipy.signal.sosfiltfilt(sos, actual[:n].astype(np.float64))
+    expected = scipy.signal.sosfiltfilt(sos, expected[:n].astype(np.float64))
+    # Edges depend on each resampler's boundary handling
+    keep = slice(n // 20, n - n // 20)
+    error = np.sum((actual[keep] - expected[keep]) ** 2)
+    return 10 * np.log10(np.sum(expected[keep] ** 2) / max(error, 1e-30))
+
+def test_blockwise_matches_resample_poly():
+    rng = np.random.default_rng(1)
+    for orig_sr, target_sr in ((44100, 16000), (44100, 48000), (22050, 48000), (8000, 16000), (48000, 44100)):
+        up, down, h = polyphase_filter(orig_sr, target_sr)
+        for length in (1, 1000, 123457):
+            y = rng.standard_normal(length)
+            expected = scipy.signal.resample_poly(y, up, down, window=h / up)
+            for block_output in (up, 4096, 1 << 16):
+                actual = resample(y, orig_sr, target_sr, block_output=block_output)
+                assert actual.shape == expected.shape
+                assert np.abs(actual - expected).max() < 1e-12
+
+def test_accuracy_against_previous_resamplers():
+    for name, (target_sr, previous) in PREVIOUS.items():
+        for orig_sr in (8000, 16000, 22050, 44100, 48000, 96000):
+            if orig_sr == target_sr:
+                continue
+            y = make_signal(orig_sr)
+            cutoff = 0.85 * min(orig_sr, target_sr) / target_sr
+            snr = passband_snr(resample(y, orig_sr, target_sr), previous(y, orig_sr, target_sr), cutoff)
+            print(f"{orig_sr:>6} -> {target_sr:<6} vs {name:<22} {snr:6.1f} dB")
+            assert snr >= MIN_PASSBAND_SNR_DB, (orig_sr, target_sr, name, snr)
+
+def score_deltas(path):
+    """
+    Each metric's score with the resampler it used before vs metrics.resample (needs the models).
+    """
+    from metrics.srmr_metric import calculate_srmr
+    from metrics.sigmos_metric import calculate_sigmos
+    from metrics.vqscore_metric import calculate_vqscore
+    from metrics.wvmos_metric import calculate_wvmos
+
+    audio = AudioBuffer.from_file(path)
+
+    def resampled(name, channels):
+        # Buffer already at the metric's rate, resampled the old way, so the metric doesn't resample again
+        target_sr, previous = PREVIOUS[name]
+        y = previous(audio.get(channels=channels), audio.sr, target_sr) if audio.sr != target_sr else audio.get(channels=channels)
+        return AudioBuffer(y.T if channels == 'all' else y, target_sr)
+
+    previous = {
+        'SRMR': (calculate_srmr, resampled('soxr_hq (SRMR, WVMOS)', 'first')),
+        'SIGMOS': (calculate_sigmos, resampled('fft (SIGMOS)', 'first')),
+        'VQScore': (calculate_vqscore, resampled('torchaudio (VQScore)', 'all')),
+        'WVMOS': (calculate_wvmos, resampled('soxr_hq (SRMR, WVMOS)', 'mono')),
+    }
+    for name, (func, old_audio) in previous.items():
+        old, new = func(old_audio), func(audio)
+        if old is None or new is None:
+            print(f"{name:<8} unavailable")
+        elif isinstance(old, dict):
+            for key in old:
+                print(f"{key:<14} before {old[key]:.4f}  now {new[key]:.4f}  diff {new[key] - old[key]:+.4f}")
+        else:
+            print(f"{name:<14} before {old:.4f}  now {new:.4f}  diff {new - old:+.4f}")
+
+if __name__ == "__main__":
+    test_blockwise_matches_resample_poly()
+    print("blockwise vs resample_poly: OK")
+    test_accuracy_against_previous_resamplers()
+    print("accuracy vs previous resamplers: OK")
+    # Optional: python test_resample_accuracy.py file.wav [...] for score deltas on real files
+    for path in sys.argv[1:]:
+        print(f"\n{path}")
+        score_deltas(path)
@@ -0,0 +1,119 @@
+import os
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+
+import config
+from metrics.audio import AudioBuffer
+from metrics.cache import ScoreCache, get_cache
+
+def test_get_put():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ScoreCache(os.path.join(tmp, 'nested', 'cache.sqlite'))
+        assert cache.get('h1', 'SRMR', 'model-a') == (False, None)
+        cache.put('h1', 'SRMR', 'model-a', '', 7.25)
+        cache.put('h1', 'SIGMOS', 'model-a', 'clip0', {'MOS_OVRL': 3.0})
+        assert cache.get('h1', 'SRMR', 'model-a') == (True, 7.25)
+        assert cache.get('h1', 'SIGMOS', 'model-a', 'clip0') == (True, {'MOS_OVRL': 3.0})
+        # Every part of the key counts
+        assert not cache.get('h2', 'SRMR', 'model-a')[0]
+        assert not cache.get('h1', 'SIGMOS', 'model-a', 'clip1')[0]
+        cache.put('h1', 'SRMR', 'model-a', '', 8.5)
+        assert cache.get('h1', 'SRMR', 'model-a') == (True, 8.5)
+        assert cache.stats()['SRMR']['entries'] == 1
+
+def test_fingerprint_invalidation():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ScoreCache(os.path.join(tmp, 'cache.sqlite'))
+        path = os.path.join(tmp, 'a.wav')
+        sf.write(path, np.zeros(1600, dtype=np.float32), 16000)
+        content_hash, params = cache.audio_key(AudioBuffer.from_file(path))
+        cache.put(content_hash, 'WVMOS', 'ckpt1:win300', params, 4.1)
+        assert cache.get(content_hash, 'WVMOS', 'ckpt1:win300', params) == (True, 4.1)
+        # A new model / window / preprocessing fingerprint misses
+        assert not cache.get(content_hash, 'WVMOS', 'ckpt2:win300', params)[0]
+        assert not cache.get(content_hash, 'WVMOS', 'ckpt1:win60', params)[0]
+
+        # New file content -> new content hash (the memo is keyed on size and mtime)
+        time.sleep(0.01)
+        sf.write(path, 0.5 * np.ones(1600, dtype=np.float32), 16000)
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        changed_hash, _ = cache.audio_key(AudioBuffer.from_file(path))
+        assert changed_hash != content_hash
+        assert not cache.get(changed_hash, 'WVMOS', 'ckpt1:win300', params)[0]
+
+        # In-memory audio is keyed on its samples
+        a = cache.audio_key(AudioBuffer(np.zeros(100, dtype=np.float32), 16000))
+        b = cache.audio_key(AudioBuffer(np.ones(100, dtype=np.float32), 16000))
+        assert a != b
+
+def test_invalidate_and_evict():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ScoreCache(os.path.join(tmp, 'cache.sqlite'))
+        for n in range(10):
+            for metric in ('SRMR', 'VQScore'):
+                cache.put(f"h{n}", metric, 'm', '', float(n))
+        assert cache.invalidate(metric='SRMR', content_hash='h0') == 1
+        assert cache.invalidate(metric='SRMR') == 9
+        assert cache.stats() == {'VQScore': {'entries': 10, 'bytes': cache.size()}}
+
+        # Least recently used go first: h0 was just read, so it survives
+        time.sleep(0.01)
+        assert cache.get('h0', 'VQScore', 'm')[0]
+        row_size = cache.size() // 10
+        assert cache.evict(max_bytes=3 * row_size) == 7
+        assert cache.get('h0', 'VQScore', 'm')[0]
+        assert [cache.get(f"h{n}", 'VQScore', 'm')[0] for n in (7, 8, 9)] == [False, True, True]
+        assert cache.evict() == 0  # no limit configured
+        assert cache.invalidate() == 3 and cache.size() == 0
+
+def _put_many(path, worker, count):
+    cache = ScoreCache(path)
+    for n in range(count):
+        cache.put(f"w{worker}-{n}", 'SRMR', 'm', '', float(n))
+        assert cache.get(f"w{worker}-{n}", 'SRMR', 'm') == (True, float(n))
+    return count
+
+def test_concurrent_writers():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.sqlite')
+        ScoreCache(path)
+        # Threads sharing one connection
+        shared = ScoreCache(path)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda n: shared.put(f"t{n}", 'SRMR', 'm', '', n), range(200)))
+        # Processes, each with its own connection (WAL: readers never block the writer)
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(3) as pool:
+            assert pool.starmap(_put_many, [(path, worker, 50) for worker in range(3)]) == [50] * 3
+        cache = ScoreCache(path)
+        assert cache.conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert cache.stats()['SRMR']['entries'] == 200 + 3 * 50
+
+def test_default_path_is_outside_the_checkout():
+    # config.SCORE_CACHE_PATH is a scratch database under pytest (conftest.py); the default lives in CACHE_DIR
+    repo = os.path.dirname(os.path.abspath(config.__file__))
+    assert not os.path.abspath(config.CACHE_DIR).startswith(repo + os.sep)
+    assert config.SCORE_CACHE_PATH is None or not os.path.abspath(config.SCORE_CACHE_PATH).startswith(repo + os.sep)
+    saved = config.SCORE_CACHE_PATH
+    try:
+        config.SCORE_CACHE_PATH = None
+        assert get_cache() is None
+    finally:
+        config.SCORE_CACHE_PATH = saved
+
+def test_pytest_uses_a_scratch_cache(score_cache_path):
+    # conftest.py fixture: nothing under pytest touches the user's score cache
+    assert config.SCORE_CACHE_PATH == score_cache_path
+    assert get_cache().path == score_cache_path
+
+if __name__ == "__main__":
+    test_get_put()
+    test_fingerprint_invalidation()
+    test_invalidate_and_evict()
+    test_concurrent_writers()
+    test_default_path_is_outside_the_checkout()
+    print("score cache: OK")
@@ -0,0 +1,40 @@
+import numpy as np
+
+from metrics.sigmos.sigmos import SigMOS
+
+def make_estimator():
+    """
+    SigMOS feature extraction only: the STFT parameters of SigMOS.__init__, no onnx session
+    (so this runs without the model file).
+    """
+    estimator = SigMOS.__new__(SigMOS)
+    estimator.sampling_rate = 48_000
+    estimator.dft_size = 960
+    estimator.frame_size = 480
+    estimator.window_length = 960
+    estimator.window = np.sqrt(np.hanning(int(estimator.window_length) + 1)[:-1]).astype(np.float32)
+    return estimator
+
+def test_features_match_two_step_path():
+    estimator = make_estimator()
+    rng = np.random.default_rng(0)
+    # Whole frames, a partial last frame, shorter than a window, several blocks
+    for length in (480 * 100, 480 * 100 + 17, 1000, 48_000 * 50):
+        for dtype in (np.float64, np.float32):
+            signal = (0.1 * rng.standard_normal(length)).astype(dtype)
+            expected = estimator.compressed_mag_complex(estimator.stft(signal))
+            actual = estimator.stft_features(signal)
+            assert actual.shape == expected.shape and actual.dtype == expected.dtype
+            assert np.array_equal(actual, expected), (length, dtype)
+
+def test_uncompressed_features_match():
+    estimator = make_estimator()
+    signal = np.random.default_rng(1).standard_normal(48_000).astype(np.float32)
+    expected = estimator.compressed_mag_complex(estimator.stft(signal), compress_factor=1)
+    assert np.array_equal(estimator.stft_features(signal, compress_factor=1), expected)
+
+if __name__ == "__main__":
+    test_features_match_two_step_path()
+    print("compressed features: OK")
+    test_uncompressed_features_match()
+    print("uncompressed features: OK")
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import warnings
+import numpy as np
+import onnxruntime as ort
+
+import config
+from metrics import sigmos_metric
+from metrics.sigmos.sigmos import SigMOS, Version, MODEL_FILES
+
+def export_model(model_dir, dynamic_batch):
+    """
+    Tiny stand-in for the SigMOS graph under its file name: [batch, 3, frames, 481] features
+    -> [batch, 7] scores, with a dynamic or a fixed (1) batch axis.
+    """
+    import torch
+
+    class Model(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.conv = torch.nn.Conv2d(3, 7, 3, padding=1)
+
+        def forward(self, x):
+            return self.conv(x).mean(dim=(2, 3))
+
+    torch.manual_seed(0)
+    axes = {0: 'batch', 2: 'frames'} if dynamic_batch else {2: 'frames'}
+    path = os.path.join(model_dir, MODEL_FILES[Version.V1])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        torch.onnx.export(Model().eval(), torch.randn(1, 3, 50, 481), path, input_names=['input'],
+                          dynamic_axes={'input': axes}, dynamo=False)
+    return path
+
+def signals():
+    rng = np.random.default_rng(0)
+    # Equal lengths share a batch; the others go through the IO-binding loop
+    return [(0.1 * rng.standard_normal(24_000 * n)).astype(np.float32) for n in (6, 6, 3, 6, 4)]
+
+def test_threads_follow_metric_threads():
+    saved = (config.SIGMOS_INTRA_OP_THREADS, config.METRIC_THREADS)
+    cores = os.cpu_count() or 1
+    try:
+        # 'auto': the metrics of one file share the cores instead of each taking all of them
+        config.SIGMOS_INTRA_OP_THREADS = 'auto'
+        for metric_threads in (1, 4, cores * 2):
+            config.METRIC_THREADS = metric_threads
+            assert sigmos_metric.intra_op_threads() == max(1, cores // metric_threads)
+            assert sigmos_metric.session_options().intra_op_num_threads == sigmos_metric.intra_op_threads()
+        # Explicit counts (environment strings or a worker's share) are used as given
+        for threads in ('0', '3', 2):
+            config.SIGMOS_INTRA_OP_THREADS = threads
+            assert sigmos_metric.session_options().intra_op_num_threads == int(threads)
+    finally:
+        config.SIGMOS_INTRA_OP_THREADS, config.METRIC_THREADS = saved
+
+def test_options_follow_config():
+    saved = (config.SIGMOS_GRAPH_OPTIMIZATION, config.SIGMOS_EXECUTION_MODE, config.SIGMOS_INTER_OP_THREADS)
+    try:
+        for level, member in sigmos_metric.GRAPH_OPTIMIZATION_LEVELS.items():
+            for mode, mode_member in sigmos_metric.EXECUTION_MODES.items():
+                config.SIGMOS_GRAPH_OPTIMIZATION, config.SIGMOS_EXECUTION_MODE, config.SIGMOS_INTER_OP_THREADS = level, mode, 2
+                options = sigmos_metric.session_options()
+                assert options.graph_optimization_level == getattr(ort.GraphOptimizationLevel, member)
+                assert options.execution_mode == getattr(ort.ExecutionMode, mode_member)
+                assert options.inter_op_num_threads == 2
+        for name, value in (('SIGMOS_GRAPH_OPTIMIZATION', 'fastest'), ('SIGMOS_EXECUTION_MODE', 'async')):
+            setattr(config, name, value)
+            try:
+                sigmos_metric.session_options()
+                assert False, f"{name}={value} should be rejected"
+            except ValueError:
+                pass
+            config.SIGMOS_GRAPH_OPTIMIZATION, config.SIGMOS_EXECUTION_MODE = 'all', 'sequential'
+    finally:
+        config.SIGMOS_GRAPH_OPTIMIZATION, config.SIGMOS_EXECUTION_MODE, config.SIGMOS_INTER_OP_THREADS = saved
+
+def test_optimized_model_path():
+    saved = (config.SIGMOS_GRAPH_OPTIMIZATION, config.SIGMOS_CACHE_OPTIMIZED, config.CACHE_DIR)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            config.SIGMOS_CACHE_OPTIMIZED, config.CACHE_DIR = True, tmp
+            paths = set()
+            for level in ('basic', 'extended', 'all'):
+                config.SIGMOS_GRAPH_OPTIMIZATION = level
+                path = sigmos_metric.optimized_model_path()
+                # In the user cache dir (not the package), keyed by level, onnxruntime version and machine
+                assert os.path.dirname(path) == os.path.join(tmp, 'sigmos') and os.path.isdir(os.path.dirname(path))
+                assert f".{level}.ort-{ort.__version__}.{sigmos_metric.machine_fingerprint()}.onnx" in path
+                paths.add(path)
+            assert len(paths) == 3
+
+            # A cache dir that can't be created turns caching off
+            open(os.path.join(tmp, 'file'), 'w').close()
+            config.CACHE_DIR = os.path.join(tmp, 'file')
+            assert sigmos_metric.optimized_model_path() is None
+        config.SIGMOS_GRAPH_OPTIMIZATION = 'disable'
+        assert sigmos_metric.optimized_model_path() is None
+        config.SIGMOS_GRAPH_OPTIMIZATION, config.SIGMOS_CACHE_OPTIMIZED = 'all', False
+        assert sigmos_metric.optimized_model_path() is None
+    finally:
+        config.SIGMOS_GRAPH_OPTIMIZATION, config.SIGMOS_CACHE_OPTIMIZED, config.CACHE_DIR = saved
+
+def test_optimized_model_is_reused():
+    with tempfile.TemporaryDirectory() as tmp:
+        export_model(tmp, dynamic_batch=True)
+        optimized = os.path.join(tmp, 'optimized.onnx')
+        first = SigMOS(tmp, optimized_model_path=optimized)
+        assert os.path.exists(optimized) and not [name for name in os.listdir(tmp) if name.endswith('.tmp')]
+        written = os.path.getmtime(optimized)
+        second = SigMOS(tmp, optimized_model_path=optimized)
+        assert os.path.getmtime(optimized) == written
+        signal = signals()[0]
+        assert second.run(signal) == first.run(signal)
+
+        # An unwritable cache path still gives a working session
+        unwritable = SigMOS(tmp, optimized_model_path=os.path.join(tmp, 'missing', 'optimized.onnx'))
+        assert unwritable.run(signal) == first.run(signal)
+
+def test_batch_matches_single():
+    with tempfile.TemporaryDirectory() as tmp:
+        for dynamic_batch in (True, False):
+            export_model(tmp, dynamic_batch)
+            estimator = SigMOS(tmp)
+            assert estimator.batch_dim_dynamic() == dynamic_batch
+            audios = signals()
+            single = [estimator.run(audio) for audio in audios]
+            batch = estimator.run_batch(audios)
+            # Stacked along the batch axis when the graph allows it, else the IO-binding loop
+            assert estimator._batching is (True if dynamic_batch else None)
+            for expected, actual in zip(single, batch):
+                assert expected.keys() == actual.keys()
+                for key in expected:
+                    assert abs(expected[key] - actual[key]) <= 1e-5 * max(1.0, abs(expected[key])), (dynamic_batch, key)
+
+if __name__ == "__main__":
+    test_threads_follow_metric_threads()
+    print("SigMOS threads: OK")
+    test_options_follow_config()
+    test_optimized_model_path()
+    print("SigMOS session options: OK")
+    test_optimized_model_is_reused()
+    test_batch_matches_single()
+    print("SigMOS batched == single: OK")
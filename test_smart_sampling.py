@@ -0,0 +1,29 @@
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+import librosa
+
+from metrics.audio import chunk_offsets, extract_chunks
+
+def test_clips_match_librosa_load():
+    rng = np.random.default_rng(0)
+    sr = 44100
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'long.wav')
+        # Stereo, with offsets that fall between samples
+        sf.write(path, (0.1 * rng.standard_normal((int(sr * 10.37), 2))).astype(np.float32), sr)
+        offsets = chunk_offsets(sf.info(path).duration, num_chunks=5, chunk_duration=1.3)
+        assert any(offset * sr != int(offset * sr) for offset in offsets)
+
+        chunks = extract_chunks(path, num_chunks=5, chunk_duration=1.3)
+        assert len(chunks) == 5
+        for chunk, offset in zip(chunks, offsets):
+            expected, _ = librosa.load(path, sr=None, offset=offset, duration=1.3)
+            actual = chunk.get(channels='mono')
+            assert actual.shape == expected.shape
+            assert np.allclose(actual, expected, atol=1e-6)
+
+if __name__ == "__main__":
+    test_clips_match_librosa_load()
+    print("smart-sampling clips: OK")
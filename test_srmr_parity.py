@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+import numpy as np
+import pytest
+import warnings
+warnings.filterwarnings("ignore")
+
+from metrics import srmr as native
+from metrics.srmr import srmr
+
+# Native vs srmrpy relative score difference (float64 throughout; same algorithm)
+TOLERANCE = 1e-9
+# Chunked vs whole-signal, fast=False (only the Hilbert envelope is taken per chunk)
+CHUNK_TOLERANCE = 1e-3
+# srmrpy outputs for make_signals(), so parity is checked without srmrpy installed.
+# Rewrite with: python test_srmr_parity.py --write-reference (needs srmrpy)
+REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'srmr_reference.json')
+
+def make_signals():
+    """
+    (name, signal, fs): a reverberant-ish harmonic signal, noise, and a clip just over one frame.
+    """
+    rng = np.random.default_rng(0)
+    fs = 16000
+    t = np.arange(fs * 8) / fs
+    f0 = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    voiced = sum(np.sin(2 * np.pi * k * np.cumsum(f0) / fs) / k for k in range(1, 20))
+    # Syllable-rate (4 Hz) amplitude modulation, smeared by an exponential "room" tail
+    speechy = voiced * np.maximum(0, np.sin(2 * np.pi * 4 * t)) ** 2
+    room = np.exp(-np.arange(fs // 2) / (0.08 * fs)) * rng.standard_normal(fs // 2)
+    reverberant = np.convolve(speechy, room)[:len(t)]
+    return [
+        ('speech-like', 0.1 * speechy, fs),
+        ('reverberant', 0.1 * reverberant / np.abs(reverberant).max(), fs),
+        ('noise 8k', 0.1 * rng.standard_normal(8000 * 3), 8000),
+        ('short', 0.1 * rng.standard_normal(int(fs * 0.3)), fs),
+    ]
+
+def load_srmrpy():
+    # Test-only dependency: pip install -r requirements-test.txt
+    return pytest.importorskip("srmrpy.srmr").srmr
+
+def test_matches_srmrpy():
+    srmrpy_srmr = load_srmrpy()
+    for name, x, fs in make_signals():
+        for fast in (True, False):
+            for norm in (False, True):
+                expected, expected_energy = srmrpy_srmr(x, fs, fast=fast, norm=norm)
+                actual, energy = srmr(x, fs, fast=fast, norm=norm)
+                print(f"{name:<12} fast={fast!s:<5} norm={norm!s:<5} srmrpy {expected:.6f}  native {actual:.6f}")
+                assert abs(actual - expected) <= TOLERANCE * abs(expected)
+                assert np.allclose(energy, expected_energy, rtol=1e-9, atol=0)
+
+def reference_cases():
+    for name, x, fs in make_signals():
+        for fast in (True, False):
+            for norm in (False, True):
+                yield f"{name} fast={fast} norm={norm}", x, fs, fast, norm
+
+def write_reference():
+    """
+    Records srmrpy's score and per-band mean energy (cochlear x modulation) for every case.
+    """
+    srmrpy_srmr = load_srmrpy()
+    reference = {}
+    for key, x, fs, fast, norm in reference_cases():
+        score, energy = srmrpy_srmr(x, fs, fast=fast, norm=norm)
+        reference[key] = {'score': float(score), 'energy': energy.mean(axis=2).tolist()}
+    with open(REFERENCE_PATH, 'w') as f:
+        json.dump(reference, f, indent=1)
+
+def test_matches_srmrpy_reference():
+    with open(REFERENCE_PATH) as f:
+        reference = json.load(f)
+    for key, x, fs, fast, norm in reference_cases():
+        actual, energy = srmr(x, fs, fast=fast, norm=norm)
+        expected = reference[key]['score']
+        assert abs(actual - expected) <= TOLERANCE * abs(expected), (key, expected, actual)
+        assert np.allclose(energy.mean(axis=2), reference[key]['energy'], rtol=1e-9, atol=0), key
+
+def test_matches_srmrpy_defaults():
+    # What srmr_metric computed before: srmrpy.srmr(y, fs) with its defaults (fast=True)
+    srmrpy_srmr = load_srmrpy()
+    for name, x, fs in make_signals():
+        expected = srmrpy_srmr(x, fs)[0]
+        actual = srmr(x, fs)[0]
+        assert abs(actual - expected) <= TOLERANCE * abs(expected), (name, expected, actual)
+
+def test_gammatonegram_blocks_are_exact():
+    saved = native.gammatonegram_chunks.__defaults__
+    for name, x, fs in make_signals():
+        whole = srmr(x, fs)
+        try:
+            # Blocks of a few columns, so every signal spans several
+            native.gammatonegram_chunks.__defaults__ = (37,)
+            blocked = srmr(x, fs)
+        finally:
+            native.gammatonegram_chunks.__defaults__ = saved
+        # Same arithmetic up to rounding (the modulation filters resume from their state)
+        assert abs(blocked[0] - whole[0]) <= 1e-12 * abs(whole[0]), name
+        assert np.allclose(blocked[1], whole[1], rtol=1e-9, atol=0), name
+
+def test_chunked_matches_whole_signal():
+    for name, x, fs in make_signals():
+        whole = srmr(x, fs, fast=False)[0]
+        for chunk_seconds in (1.0, 2.5):
+            chunked = srmr(x, fs, fast=False, chunk_seconds=chunk_seconds)[0]
+            print(f"{name:<12} chunk {chunk_seconds}s  whole {whole:.6f}  chunked {chunked:.6f}")
+            assert abs(chunked - whole) <= CHUNK_TOLERANCE * abs(whole)
+
+if __name__ == "__main__":
+    if '--write-reference' in sys.argv:
+        write_reference()
+        print(f"wrote {REFERENCE_PATH}")
+        sys.exit(0)
+    test_matches_srmrpy_reference()
+    print("srmrpy reference: OK")
+    try:
+        test_matches_srmrpy()
+        test_matches_srmrpy_defaults()
+        print("srmrpy parity: OK")
+    except pytest.skip.Exception as skipped:
+        print(f"srmrpy parity: SKIPPED ({skipped})")
+    test_gammatonegram_blocks_are_exact()
+    print("blocked gammatonegram: OK")
+    test_chunked_matches_whole_signal()
+    print("chunked SRMR: OK")
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import tempfile
+import numpy as np
+import soundfile as sf
+
+import config
+from metrics import trace
+from metrics.audio import AudioBuffer
+from metrics.runner import run_metric
+from metrics.srmr_metric import calculate_srmr
+from metrics.samplerate_metric import get_mic_sr
+
+def traced_run(path):
+    """
+    SRMR and Mic SR (no model needed) on one file, traced; returns the events.
+    """
+    audio = AudioBuffer.from_file(path)
+    run_metric('SRMR', calculate_srmr, audio)
+    run_metric('Mic SR', get_mic_sr, audio)
+    return trace.drain()
+
+def test_stages_are_recorded():
+    saved = config.TRACE_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'speech.wav')
+        sf.write(path, 0.1 * np.random.default_rng(0).standard_normal(44100 * 3), 44100)
+        try:
+            config.TRACE_PATH = None
+            assert traced_run(path) == []
+
+            config.TRACE_PATH = os.path.join(tmp, 'trace.jsonl')
+            events = traced_run(path)
+            stages = {(event['metric'], event['stage']) for event in events}
+            for expected in [('SRMR', 'decode'), ('SRMR', 'resample'), ('SRMR', 'features'), ('SRMR', 'metric'),
+                             ('Mic SR', 'features'), ('Mic SR', 'metric')]:
+                assert expected in stages, (expected, stages)
+            for event in events:
+                assert event['file'] == path and event['seconds'] >= 0
+                assert event['peak_rss_mb'] > 0 and event['peak_delta_mb'] >= 0
+            srmr = next(event for event in events if event['stage'] == 'metric' and event['metric'] == 'SRMR')
+            assert abs(srmr['audio_seconds'] - 3.0) < 1e-6
+            assert abs(srmr['rtf'] - srmr['seconds'] / 3.0) < 1e-9
+
+            # Both formats round-trip; JSON lines append across saves
+            for name in ('trace.jsonl', 'trace.json'):
+                config.TRACE_PATH = os.path.join(tmp, name)
+                trace.extend(events)
+                trace.save()
+                loaded = trace.load(config.TRACE_PATH)
+                assert [(e['metric'], e['stage'], round(e['seconds'], 6)) for e in loaded] == \
+                       [(e['metric'], e['stage'], round(e['seconds'], 6)) for e in events]
+            with open(os.path.join(tmp, 'trace.json')) as f:
+                assert all(event['ph'] == 'X' for event in json.load(f)['traceEvents'])
+            trace.extend(events)
+            trace.save(os.path.join(tmp, 'trace.jsonl'))
+            assert len(trace.load(os.path.join(tmp, 'trace.jsonl'))) == 2 * len(events)
+
+            rows = {(row['metric'], row['stage']): row for row in trace.summary(events)}
+            assert rows[('SRMR', 'metric')]['rtf'] is not None
+            trace.print_summary(events)
+        finally:
+            config.TRACE_PATH = saved
+            trace.drain()
+
+def test_memory_is_per_span():
+    saved = config.TRACE_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            config.TRACE_PATH = os.path.join(tmp, 'trace.jsonl')
+            # Allocated and freed inside the span (like the attention scores during inference)
+            with trace.span('inference'):
+                held = np.ones(64 * 1024 * 1024 // 8)
+                time.sleep(0.05)
+                del held
+            with trace.span('aggregate'):
+                time.sleep(0.02)
+            transient, idle = trace.drain()
+        finally:
+            config.TRACE_PATH = saved
+            trace.drain()
+    assert 56 < transient['peak_delta_mb'] < 80, transient
+    assert idle['peak_delta_mb'] < 8, idle
+    assert idle['peak_rss_mb'] < transient['peak_rss_mb'] - 56
+    rows = {row['stage']: row for row in trace.summary([transient, idle])}
+    assert rows['inference']['peak_delta_mb'] == transient['peak_delta_mb']
+    assert rows['inference']['peak_rss_mb'] == transient['peak_rss_mb']
+
+if __name__ == "__main__":
+    config.SCORE_CACHE_PATH = None
+    test_stages_are_recorded()
+    test_memory_is_per_span()
+    print("trace: OK")
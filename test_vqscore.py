@@ -0,0 +1,129 @@
+import os
+import tempfile
+import numpy as np
+import torch
+import torch.nn.functional as F
+import warnings
+warnings.filterwarnings("ignore")
+
+from metrics import vqscore_metric
+from metrics.audio import AudioBuffer
+from metrics.registry import get_registry
+from metrics.vqscore_metric import cos_loss, read_config, stft_magnitude
+from metrics.vqscore_models import export_torchscript
+from metrics.vqscore_models.VQVAE_models import VQVAE_QE
+from metrics.vqscore_models.vqscore_inference import VQScoreInference
+
+# Scoring model vs the full VQVAE_QE (VQScore is a mean cosine in [-1, 1])
+TOLERANCE = 1e-5
+
+def build_models():
+    """
+    A random-init VQVAE_QE (as trained: cosine-sim codebook, k-means done) and the
+    VQScoreInference loaded from its state dict, like build_model does from the checkpoint.
+    """
+    torch.manual_seed(0)
+    vqvae = VQVAE_QE(**read_config()['VQVAE_params']).eval()
+    codebook = vqvae.quantizer.quantizer._codebook
+    codebook.embed.copy_(F.normalize(torch.randn_like(codebook.embed), dim=-1))
+    codebook.initted.fill_(1)
+    model = VQScoreInference(codebook.embed.shape[1], codebook.embed.shape[2])
+    model.load_vqvae_state_dict(vqvae.state_dict())
+    return vqvae, model.eval()
+
+def spectrogram(channels, samples, seed=0):
+    """
+    VQScore input of random audio: log1p STFT magnitude, [channels, T, 257].
+    """
+    wav = 0.1 * torch.from_numpy(np.random.default_rng(seed).standard_normal((channels, samples)).astype(np.float32))
+    return torch.log1p(stft_magnitude(wav, hop_size=256))
+
+def test_matches_vqvae_quantizer():
+    vqvae, model = build_models()
+    for channels in (1, 2):
+        SP_input = spectrogram(channels, 16000 * 3 + 777, seed=channels)
+        with torch.no_grad():
+            # What calculate_vqscore computed with the full model (inference.py)
+            z = vqvae.CNN_1D_encoder(SP_input)
+            zq, indices, vqloss, distance = vqvae.quantizer(z, stochastic=False, update=False)
+            expected = -cos_loss(z.transpose(2, 1), zq).item()
+            actual = model(SP_input).item()
+        print(f"{channels} channel(s): VQVAE_QE {expected:.6f}  inference {actual:.6f}")
+        assert abs(expected - actual) <= TOLERANCE
+
+def test_score_padded_matches_single():
+    _, model = build_models()
+    items = [spectrogram(1, samples, seed=n)[0] for n, samples in enumerate((16000 * 3, 16000 * 3 - 2000, 16000 * 2))]
+    longest = max(item.shape[0] for item in items)
+    SP_input = torch.zeros(len(items), longest, items[0].shape[1])
+    for row, item in enumerate(items):
+        SP_input[row, :item.shape[0]] = item
+    lengths = torch.tensor([item.shape[0] for item in items])
+    with torch.no_grad():
+        cos_sums, frames = model.score_padded(SP_input, lengths)
+        for item, cos_sum, frame_count in zip(items, cos_sums.tolist(), frames.tolist()):
+            assert frame_count == item.shape[0]
+            assert abs(cos_sum / frame_count - model(item[None]).item()) <= TOLERANCE
+
+def test_batch_matches_single():
+    _, model = build_models()
+    padded_calls = []
+    score_padded = model.score_padded
+
+    def counting(SP_input, lengths):
+        padded_calls.append(lengths.tolist())
+        return score_padded(SP_input, lengths)
+
+    model.score_padded = counting
+    rng = np.random.default_rng(0)
+    # Different lengths (near-equal ones share a padded batch), mono and stereo
+    audios = [AudioBuffer((0.1 * rng.standard_normal(n)).astype(np.float32), 16000)
+              for n in (16000 * 3, 16000 * 3 - 1500, 16000 * 3 - 3000, 16000)]
+    audios.append(AudioBuffer((0.1 * rng.standard_normal((16000 * 3 - 700, 2))).astype(np.float32), 16000))
+
+    registry = get_registry()
+    saved = (vqscore_metric._vqscore_config, vqscore_metric._device)
+    registry.register('VQScore', lambda: model, size=lambda model: 0)
+    vqscore_metric._vqscore_config = read_config()
+    vqscore_metric._device = torch.device('cpu')
+    try:
+        batched = vqscore_metric.calculate_vqscore_batch(audios)
+        single = [vqscore_metric.calculate_vqscore(audio) for audio in audios]
+    finally:
+        vqscore_metric._vqscore_config, vqscore_metric._device = saved
+        registry.register('VQScore', vqscore_metric.create_model, size=vqscore_metric.model_size)
+
+    # The three near-equal mono items and both stereo channels in one padded batch
+    assert len(padded_calls) == 1 and len(padded_calls[0]) == 5, padded_calls
+    for expected, actual in zip(single, batched):
+        print(f"single {expected:.6f}  batched {actual:.6f}")
+        assert abs(expected - actual) <= TOLERANCE
+
+def test_torchscript_round_trip():
+    _, model = build_models()
+    items = [spectrogram(1, 16000 * 3, seed=0)[0], spectrogram(1, 16000 * 3 - 2000, seed=1)[0]]
+    SP_input = torch.zeros(2, items[0].shape[0], items[0].shape[1])
+    SP_input[0] = items[0]
+    SP_input[1, :items[1].shape[0]] = items[1]
+    lengths = torch.tensor([item.shape[0] for item in items])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = export_torchscript.export(model, os.path.join(tmp, 'vqscore_inference.pt'), checkpoint_digest='abc123')
+        exported, digest = export_torchscript.load(path)
+    assert digest == 'abc123'
+    with torch.no_grad():
+        for item in items:
+            assert abs(exported(item[None]).item() - model(item[None]).item()) <= TOLERANCE
+        expected_sums, expected_frames = model.score_padded(SP_input, lengths)
+        cos_sums, frames = exported.score_padded(SP_input, lengths)
+    assert torch.equal(frames, expected_frames)
+    assert torch.allclose(cos_sums, expected_sums, atol=TOLERANCE * items[0].shape[0])
+
+if __name__ == "__main__":
+    test_matches_vqvae_quantizer()
+    print("VQScoreInference parity: OK")
+    test_score_padded_matches_single()
+    test_batch_matches_single()
+    print("batched VQScore: OK")
+    test_torchscript_round_trip()
+    print("TorchScript export: OK")
@@ -0,0 +1,74 @@
+import numpy as np
+import torch
+import warnings
+warnings.filterwarnings("ignore")
+
+from test_wvmos_onnx import build_model
+
+# Batched (padded, masked) vs one-at-a-time scores (MOS scale 1-5)
+TOLERANCE = 1e-4
+
+def make_signals():
+    """
+    Near-equal lengths, all within MAX_PAD_FRACTION of the longest: one padded batch.
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(16000 * 3) / 16000
+    tone = (0.3 * np.sin(2 * np.pi * 220 * t) * np.sin(2 * np.pi * 3 * t)).astype(np.float32)
+    return [
+        tone,
+        (0.05 * rng.standard_normal(16000 * 3 - 1234)).astype(np.float32),
+        (0.1 * rng.standard_normal(16000 * 3 - 4321)).astype(np.float32),
+        tone[:16000 * 3 - 640],
+    ]
+
+def count_padded(model):
+    calls = []
+    frames_padded = model.frames_padded
+
+    def counting(x, lengths):
+        calls.append(lengths.tolist())
+        return frames_padded(x, lengths)
+
+    model.frames_padded = counting
+    return calls
+
+def test_batched_matches_single():
+    model = build_model()
+    signals = make_signals()
+    calls = count_padded(model)
+    batched = model.calculate_batch(signals)
+    # Every signal went through the padded path, in one batch
+    assert len(calls) == 1 and sorted(calls[0]) == sorted(len(signal) for signal in signals), calls
+
+    single = [model.calculate_batch([signal])[0] for signal in signals]
+    assert len(calls) == 1
+    for expected, actual in zip(single, batched):
+        print(f"single {expected:.6f}  batched {actual:.6f}  diff {abs(expected - actual):.2e}")
+        assert abs(expected - actual) <= TOLERANCE
+
+    # forward_padded directly: each item's mean over its own frames
+    inputs = [model.normalize(signal) for signal in signals]
+    x = torch.zeros(len(inputs), max(len(item) for item in inputs))
+    for row, item in enumerate(inputs):
+        x[row, :len(item)] = torch.from_numpy(item)
+    with torch.no_grad():
+        padded = model.forward_padded(x, torch.tensor([len(item) for item in inputs])).tolist()
+    assert np.allclose(padded, single, atol=TOLERANCE)
+
+def test_batched_frame_scores_match_single():
+    model = build_model()
+    inputs = [model.normalize(signal) for signal in make_signals()]
+    calls = count_padded(model)
+    batched = model.frame_scores(inputs)
+    assert len(calls) == 1
+    for item, frames in zip(inputs, batched):
+        expected = model.frame_scores([item])[0]
+        assert frames.shape == expected.shape
+        assert np.abs(frames - expected).max() <= TOLERANCE
+
+if __name__ == "__main__":
+    test_batched_matches_single()
+    print("batched scores: OK")
+    test_batched_frame_scores_match_single()
+    print("batched frame scores: OK")
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import numpy as np
+import torch
+from torch import nn
+import warnings
+warnings.filterwarnings("ignore")
+
+from wvmos.wv_mos import Wav2Vec2MOS, build_encoder
+from wvmos.convert import convert
+
+def make_checkpoint(path):
+    """
+    A WV-MOS checkpoint laid out like the Zenodo one (Lightning state_dict under 'model.',
+    legacy weight_g / weight_v names for the positional conv), with random weights.
+    Returns the (encoder, dense) it was written from.
+    """
+    torch.manual_seed(0)
+    encoder = build_encoder().eval()
+    dense = nn.Sequential(nn.Linear(768, 128), nn.ReLU(), nn.Dropout(0.1), nn.Linear(128, 1)).eval()
+    state_dict = {}
+    for prefix, module in (('model.encoder.', encoder), ('model.dense.', dense)):
+        for key, value in module.state_dict().items():
+            key = key.replace('parametrizations.weight.original0', 'weight_g').replace('parametrizations.weight.original1', 'weight_v')
+            state_dict[prefix + key] = value
+    torch.save({'state_dict': state_dict, 'epoch': 0}, path)
+    return encoder, dense
+
+def test_loads_without_hub():
+    os.environ['HF_HUB_OFFLINE'] = '1'
+    x = torch.from_numpy(Wav2Vec2MOS.normalize(0.1 * np.random.default_rng(0).standard_normal(16000 * 3)))[None]
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = os.path.join(tmp, 'wv_mos.ckpt')
+        encoder, dense = make_checkpoint(checkpoint)
+        with torch.no_grad():
+            expected = dense(encoder(x)['last_hidden_state']).mean().item()
+
+        safetensors = convert(checkpoint, os.path.join(tmp, 'wv_mos.safetensors'))
+        for path in (checkpoint, safetensors):
+            model = Wav2Vec2MOS(path, cuda=False)
+            tensors = list(model.parameters()) + list(model.buffers())
+            assert not any(t.is_meta for t in tensors), path
+            assert not any(p.requires_grad for p in model.encoder.parameters())
+            with torch.no_grad():
+                actual = model(x).mean().item()
+            print(f"{os.path.basename(path):<18} expected {expected:.6f}  loaded {actual:.6f}")
+            assert actual == expected
+
+if __name__ == "__main__":
+    test_loads_without_hub()
+    print("offline WVMOS loading: OK")
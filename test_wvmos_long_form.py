@@ -0,0 +1,40 @@
+import os
+import tempfile
+import soundfile as sf
+import torch
+import warnings
+warnings.filterwarnings("ignore")
+
+from benchmark import generate
+from test_wvmos_onnx import build_model
+from wvmos.windows import MIN_WINDOW_SIZE, split_trimmed
+
+# Allowed deviation of a long-form mode from whole-file scoring (MOS scale 1-5),
+# what the 300s overlapping windows were validated at
+TOLERANCE = 0.1
+
+def speech(seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = generate(os.path.join(tmp, 'speech.wav'), 16000, seconds, 1, seed=0)
+        return sf.read(path, dtype='float32')[0]
+
+def test_trimmed_matches_whole_file():
+    """
+    The real WV-MOS when its checkpoint loads (else random weights). The window is shrunk
+    to the 60s minimum so 80s of speech spans several trimmed windows while the whole-file
+    ground truth still fits in memory.
+    """
+    model = build_model()
+    model.window_size = MIN_WINDOW_SIZE
+    signal = speech(80)
+    assert len(split_trimmed(len(signal), model.window_size)) > 1
+
+    with torch.no_grad():
+        whole = model.forward(torch.from_numpy(model.normalize(signal))[None]).mean().item()
+    trimmed = model.calculate_signal(signal, 'trimmed')
+    print(f"whole file {whole:.4f}, trimmed {trimmed:.4f} (deviation {trimmed - whole:+.4f})")
+    assert abs(trimmed - whole) <= TOLERANCE
+
+if __name__ == "__main__":
+    test_trimmed_matches_whole_file()
+    print("WVMOS trimmed long-form: OK")
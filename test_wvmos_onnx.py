@@ -0,0 +1,87 @@
+import os
+import tempfile
+import numpy as np
+import torch
+from torch import nn
+from transformers import Wav2Vec2FeatureExtractor
+import warnings
+warnings.filterwarnings("ignore")
+
+from wvmos import Wav2Vec2MOS
+from wvmos.wv_mos import build_encoder
+from wvmos.export_onnx import export
+from wvmos.onnx_backend import Wav2Vec2MOSOnnx
+
+# ONNX vs torch score tolerance (MOS scale 1-5)
+TOLERANCE = 1e-3
+
+def build_model():
+    """
+    The real WV-MOS if its checkpoint loads, otherwise the same architecture
+    (wav2vec2-base + dense head) with random weights: parity doesn't depend on the weights.
+    """
+    try:
+        from wvmos import get_wvmos
+        return get_wvmos(cuda=False)
+    except Exception as e:
+        print(f"Real WVMOS unavailable ({type(e).__name__}), using a random-init model")
+
+    torch.manual_seed(0)
+    model = Wav2Vec2MOS.__new__(Wav2Vec2MOS)
+    nn.Module.__init__(model)
+    model.encoder = build_encoder()
+    model.freeze = True
+    model.dense = nn.Sequential(nn.Linear(768, 128), nn.ReLU(), nn.Dropout(0.1), nn.Linear(128, 1))
+    model.device = torch.device('cpu')
+    model.eval()
+    return model
+
+def make_signals():
+    rng = np.random.default_rng(0)
+    t = np.arange(16000 * 4) / 16000
+    tone = (0.3 * np.sin(2 * np.pi * 220 * t) * np.sin(2 * np.pi * 3 * t)).astype(np.float32)
+    noise = (0.05 * rng.standard_normal(16000 * 7)).astype(np.float32)
+    short = (0.1 * rng.standard_normal(12345)).astype(np.float32)
+    return [tone, noise, short]
+
+def test_normalize_matches_processor():
+    processor = Wav2Vec2FeatureExtractor()
+    for signal in make_signals():
+        expected = processor(signal, sampling_rate=16000).input_values[0]
+        assert np.array_equal(Wav2Vec2MOSOnnx.normalize(signal), expected)
+        assert np.array_equal(Wav2Vec2MOS.normalize(signal), expected)
+
+def test_onnx_matches_torch():
+    model = build_model()
+    signals = make_signals()
+    torch_scores = model.calculate_signals(signals)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = export(model, os.path.join(tmp, 'wv_mos.onnx'))
+        onnx_scores = Wav2Vec2MOSOnnx(path).calculate_signals(signals)
+
+    for expected, actual in zip(torch_scores, onnx_scores):
+        print(f"torch {expected:.6f}  onnx {actual:.6f}  diff {abs(expected - actual):.2e}")
+        assert abs(expected - actual) <= TOLERANCE
+
+def test_onnx_frame_scores_match_torch():
+    # Per-frame outputs drive the trimmed long-form mode
+    model = build_model()
+    inputs = [model.normalize(signal) for signal in make_signals()]
+    torch_frames = model.frame_scores(inputs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = export(model, os.path.join(tmp, 'wv_mos.onnx'))
+        onnx_frames = Wav2Vec2MOSOnnx(path).frame_scores(inputs)
+
+    for expected, actual in zip(torch_frames, onnx_frames):
+        assert expected.shape == actual.shape
+        assert np.abs(expected - actual).max() <= TOLERANCE
+
+if __name__ == "__main__":
+    test_normalize_matches_processor()
+    print("normalization: OK")
+    test_onnx_matches_torch()
+    print("onnx parity: OK")
+    test_onnx_frame_scores_match_torch()
+    print("onnx frame scores: OK")
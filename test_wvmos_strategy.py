@@ -1,3 +1,4 @@
+import time
 import torch
 import librosa
 import numpy as np
@@ -19,7 +20,7 @@ def calc_ground_truth(path):
     print("\n[1] Calculating Ground Truth (Whole File)...")
     try:
         signal = librosa.load(path, sr=16_000)[0]
-        x = model.processor(signal, return_tensors="pt", padding=True, sampling_rate=16000).input_values
+        x = torch.from_numpy(model.normalize(signal))[None]
         score = score_tensor(model, x)
         print(f" -> Score: {score:.4f}")
         return score
@@ -51,7 +52,7 @@ def calc_current_window(path, window=30, stride=15, skip_silence=True):
             intervals = librosa.effects.split(chunk, top_db=40)
             if len(intervals) == 0: continue
             
-        x = model.processor(chunk, return_tensors="pt", padding=True, sampling_rate=16000).input_values
+        x = torch.from_numpy(model.normalize(chunk))[None]
         val = score_tensor(model, x)
         scores.append(val)
         weights.append(len(chunk))
@@ -77,7 +78,7 @@ def calc_concat_silence_removed(path, window=30):
     weights = []
     for chunk in chunks:
         if len(chunk) < 16000: continue
-        x = model.processor(chunk, return_tensors="pt", padding=True, sampling_rate=16000).input_values
+        x = torch.from_numpy(model.normalize(chunk))[None]
         val = score_tensor(model, x)
         scores.append(val)
         weights.append(len(chunk))
@@ -105,7 +106,7 @@ def calc_trimmed(path, window=30, stride=30, trim_sec=2):
     all_scores = []
     
     for i, chunk in enumerate(chunks):
-        x = model.processor(chunk, return_tensors="pt", padding=True, sampling_rate=16000).input_values
+        x = torch.from_numpy(model.normalize(chunk))[None]
         with torch.no_grad():
             # Manual Forward to get sequence
             out = model.encoder(x)['last_hidden_state']
@@ -133,6 +134,13 @@ def calc_trimmed(path, window=30, stride=30, trim_sec=2):
     print(f" -> Score: {final:.4f}")
     return final
 
+def calc_long_form(path, long_form):
+    print(f"\n[5] Calculating Long-Form Mode '{long_form}' (as used by the WVMOS metric)...")
+    start = time.time()
+    score = model.calculate_one(path, long_form=long_form)
+    print(f" -> Score: {score:.4f} ({time.time() - start:.1f}s)")
+    return score
+
 # Execution
 try:
     gt = calc_ground_truth(audio_path)
@@ -146,15 +154,21 @@ try:
     # 600s (10 mins) - The "Big Chunk" hypothesis
     win600 = calc_current_window(audio_path, window=600, stride=300, skip_silence=False)
     
+    # Metric modes: overlapping windows vs each sample encoded once (trimmed margins)
+    overlap = calc_long_form(audio_path, 'overlap')
+    trimmed = calc_long_form(audio_path, 'trimmed')
+    
     print("\n--- SUMMARY ---")
     if gt: 
         print(f"Ground Truth:         {gt:.4f}")
         print(f"Win 60s:              {win60:.4f} (Diff: {win60-gt:.4f})")
         print(f"Win 300s:             {win300:.4f} (Diff: {win300-gt:.4f})")
         print(f"Win 600s:             {win600:.4f} (Diff: {win600-gt:.4f})")
+        print(f"Long-form overlap:    {overlap:.4f} (Diff: {overlap-gt:.4f})")
+        print(f"Long-form trimmed:    {trimmed:.4f} (Diff: {trimmed-gt:.4f})")
         
         # Check if any meets tolerance 0.15
-        for name, val in [("Win300", win300), ("Win600", win600)]:
+        for name, val in [("Win300", win300), ("Win600", win600), ("Overlap", overlap), ("Trimmed", trimmed)]:
             diff = abs(val - gt)
             if diff <= 0.15:
                 print(f"✅ SUCCESS: {name} is within tolerance. Diff: {diff:.4f}")
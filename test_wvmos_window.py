@@ -0,0 +1,136 @@
+import os
+import tempfile
+import numpy as np
+
+import config
+from metrics import wvmos_metric
+from metrics.registry import get_registry
+from metrics.runner import _current_key
+from wvmos.windows import (MIN_WINDOW_SIZE, WINDOW_SIZE, auto_window_size, normalize, score_signals,
+                           shrink_window, window_memory)
+
+GB = 1024 ** 3
+
+class FakeModel:
+    """
+    WVMOS backend stand-in: a window scores as the mean of its samples, and anything
+    longer than `fits` samples fails to allocate like the real encoder would.
+    """
+    quadratic_attention = True
+
+    def __init__(self, window_size, fits, error=MemoryError, message="CPU out of memory"):
+        self.window_size = window_size
+        self.fits = fits
+        self.error = error
+        self.message = message
+        self.longest = []
+
+    normalize = staticmethod(normalize)
+
+    def _check(self, items):
+        self.longest.append(max(len(x) for x in items))
+        if self.longest[-1] > self.fits:
+            raise self.error(self.message)
+
+    def calculate_batch(self, signals):
+        self._check(signals)
+        return [float(np.mean(signal)) for signal in signals]
+
+    def frame_scores(self, inputs):
+        self._check(inputs)
+        return [np.asarray(x[:(len(x) - 400) // 320 + 1]) for x in inputs]
+
+def test_window_follows_memory():
+    # Eager attention: 5 minutes needs ~20 GB, so small machines get short windows
+    assert window_memory(WINDOW_SIZE, quadratic_attention=True) > 16 * GB
+    assert window_memory(WINDOW_SIZE, quadratic_attention=False) < 8 * GB
+    small = auto_window_size(True, memory=4 * GB)
+    large = auto_window_size(True, memory=64 * GB)
+    # Never below the validated 5 minutes up front: only running out of memory shrinks it
+    for memory in (1, 4, 8, 16):
+        assert auto_window_size(True, memory=memory * GB) == WINDOW_SIZE
+    assert WINDOW_SIZE < large and window_memory(large, True) <= 32 * GB
+    # Linear (SDPA) attention affords far longer windows for the same memory
+    assert auto_window_size(False, memory=16 * GB) > auto_window_size(True, memory=16 * GB)
+    print(f"auto window: 4 GB {small // 16000}s, 64 GB {large // 16000}s (eager attention)")
+
+def test_shrinks_and_retries_on_oom():
+    signal = np.random.default_rng(0).standard_normal(16000 * 400).astype(np.float32)
+    for long_form in ('overlap', 'trimmed'):
+        model = FakeModel(WINDOW_SIZE, fits=16000 * 100)
+        score = score_signals(model, [signal], long_form)
+        assert score is not None
+        # 300s failed, then 150s, then 60s (the floor) fit and stays for later calls
+        assert model.window_size == MIN_WINDOW_SIZE, model.window_size
+        assert model.longest[-1] <= model.fits
+        expected = score_signals(FakeModel(MIN_WINDOW_SIZE, fits=np.inf), [signal], long_form)
+        assert score == expected
+
+def test_gives_up_at_minimum_window():
+    model = FakeModel(WINDOW_SIZE, fits=16000 * 10)
+    try:
+        score_signals(model, [np.zeros(16000 * 400, dtype=np.float32)], 'trimmed')
+        assert False, "should raise once the window can't shrink"
+    except MemoryError:
+        pass
+    assert model.window_size == MIN_WINDOW_SIZE
+    assert shrink_window(MIN_WINDOW_SIZE) is None
+
+def test_other_errors_are_not_retried():
+    model = FakeModel(WINDOW_SIZE, fits=0, error=ValueError, message="bad input")
+    try:
+        score_signals(model, [np.zeros(16000 * 5, dtype=np.float32)], 'trimmed')
+        assert False, "should raise"
+    except ValueError:
+        pass
+    assert model.window_size == WINDOW_SIZE and len(model.longest) == 1
+
+def test_fingerprint_follows_effective_window():
+    saved = (config.WVMOS_BACKEND, config.WVMOS_ONNX_PATH, config.WVMOS_WINDOW_SECONDS, config.SCORE_CACHE_PATH)
+    registry = get_registry()
+    with tempfile.TemporaryDirectory() as tmp:
+        config.WVMOS_BACKEND = 'onnx'
+        config.WVMOS_ONNX_PATH = os.path.join(tmp, 'wv_mos.onnx')
+        config.SCORE_CACHE_PATH = None
+        with open(config.WVMOS_ONNX_PATH, 'wb') as f:
+            f.write(b'graph')
+        try:
+            # Not loaded: the configured window
+            config.WVMOS_WINDOW_SECONDS = 120
+            registry.evict('WVMOS')
+            assert ':win120-' in wvmos_metric.model_fingerprint()
+
+            # 'auto', not loaded: worked out for the backend's attention without loading the model
+            config.WVMOS_WINDOW_SECONDS = 'auto'
+            registry.register('WVMOS', lambda: 1 / 0, size=lambda model: 0)
+            expected = wvmos_metric.window_size(quadratic_attention=True) // 16000
+            assert f":win{expected}-" in wvmos_metric.model_fingerprint()
+            assert registry.loaded('WVMOS') is None
+
+            # Loaded: its window and attention ('auto' sizes linear attention's window larger)
+            config.WVMOS_WINDOW_SECONDS = 'auto'
+            model = FakeModel(WINDOW_SIZE, fits=16000 * 100)
+            model.quadratic_attention = False
+            registry.register('WVMOS', lambda: model, size=lambda model: 0)
+            model.window_size = wvmos_metric.window_size(model.quadratic_attention)
+            registry.get('WVMOS')
+            assert f":win{model.window_size // 16000}-" in wvmos_metric.model_fingerprint()
+
+            # Shrinking after running out of memory changes the key the score is stored under
+            model.window_size = WINDOW_SIZE
+            key = ('hash', 'WVMOS', wvmos_metric.model_fingerprint(), '')
+            score_signals(model, [np.zeros(16000 * 400, dtype=np.float32)], 'overlap')
+            assert model.window_size == MIN_WINDOW_SIZE
+            assert _current_key(key)[2] == wvmos_metric.model_fingerprint() != key[2]
+            assert f":win{MIN_WINDOW_SIZE // 16000}-" in _current_key(key)[2]
+        finally:
+            config.WVMOS_BACKEND, config.WVMOS_ONNX_PATH, config.WVMOS_WINDOW_SECONDS, config.SCORE_CACHE_PATH = saved
+            registry.register('WVMOS', wvmos_metric.load_model, size=wvmos_metric.model_size)
+
+if __name__ == "__main__":
+    test_window_follows_memory()
+    test_shrinks_and_retries_on_oom()
+    test_gives_up_at_minimum_window()
+    test_other_errors_are_not_retried()
+    test_fingerprint_follows_effective_window()
+    print("WVMOS window sizing: OK")
@@ -1,22 +1,45 @@
-from .wv_mos import Wav2Vec2MOS
 import os
-import urllib.request
 
 # Check project root 'models' folder first (for Hugging Face deployment)
 local_model_path = os.path.join(os.getcwd(), "models", "wv_mos.ckpt")
-if os.path.exists(local_model_path):
-    path = local_model_path
-else:
-    path = os.path.join(os.path.expanduser('~'), ".cache/wv_mos/wv_mos.ckpt")
+# Weights-only copy of the checkpoint (python -m wvmos.convert): memory-mapped, nothing unpickled
+local_safetensors_path = os.path.join(os.getcwd(), "models", "wv_mos.safetensors")
+cache_model_path = os.path.join(os.path.expanduser('~'), ".cache/wv_mos/wv_mos.ckpt")
+CHECKPOINT_URL = "https://zenodo.org/record/6201162/files/wav2vec2.ckpt?download=1"
+
+def checkpoint_path(download=False):
+    """
+    The WV-MOS weights to load: models/wv_mos.safetensors, models/wv_mos.ckpt or the
+    checkpoint cached in ~/.cache/wv_mos, which is downloaded first if download=True.
+    Resolved when a model is built, never at import.
+    """
+    for candidate in (local_safetensors_path, local_model_path, cache_model_path):
+        if os.path.exists(candidate):
+            return candidate
+    if not download:
+        raise FileNotFoundError(f"WV-MOS checkpoint not found (run download_wvmos.py, or place it at {local_model_path})")
     
-    if (not os.path.exists(path)):
-        print("Downloading the checkpoint for WV-MOS")
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        urllib.request.urlretrieve(
-            "https://zenodo.org/record/6201162/files/wav2vec2.ckpt?download=1",
-            path
-        )
-        print('Weights downloaded in: {} Size: {}'.format(path, os.path.getsize(path)))
+    import urllib.request
+    print("Downloading the checkpoint for WV-MOS")
+    os.makedirs(os.path.dirname(cache_model_path), exist_ok=True)
+    # Into place only once complete, so an interrupted download isn't taken for the checkpoint
+    partial = cache_model_path + '.part'
+    urllib.request.urlretrieve(CHECKPOINT_URL, partial)
+    os.replace(partial, cache_model_path)
+    print('Weights downloaded in: {} Size: {}'.format(cache_model_path, os.path.getsize(cache_model_path)))
+    return cache_model_path
     
-def get_wvmos(cuda=True, device=None):
-    return Wav2Vec2MOS(path, cuda=cuda, device=device)
\ No newline at end of file
+def get_wvmos(cuda=True, device=None, attn_implementation=None):
+    from .wv_mos import Wav2Vec2MOS
+    return Wav2Vec2MOS(checkpoint_path(download=True), cuda=cuda, device=device, attn_implementation=attn_implementation)
+
+def __getattr__(name):
+    # Wav2Vec2MOS pulls in torch / transformers; only import it when used
+    # (the onnxruntime backend doesn't need either)
+    if name == 'Wav2Vec2MOS':
+        from .wv_mos import Wav2Vec2MOS
+        return Wav2Vec2MOS
+    # Kept for callers of the old import-time attribute; looked up (never downloaded) on use
+    if name == 'path':
+        return checkpoint_path()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
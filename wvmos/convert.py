@@ -0,0 +1,35 @@
+# Converts the WV-MOS Lightning checkpoint to safetensors (weights only, memory-mappable):
+#     python -m wvmos.convert [--output models/wv_mos.safetensors]
+# get_wvmos() prefers models/wv_mos.safetensors over the checkpoint.
+import os
+import argparse
+
+from safetensors.torch import save_file
+
+
+def convert(checkpoint, output):
+    from .wv_mos import load_weights
+
+    weights = {key: value.contiguous() for key, value in load_weights(checkpoint).items()}
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    save_file(weights, output)
+    return output
+
+
+def main():
+    import wvmos
+
+    parser = argparse.ArgumentParser(description='Convert the WV-MOS checkpoint to safetensors')
+    parser.add_argument('--checkpoint', default=None, help='WV-MOS .ckpt to convert (default: the one get_wvmos() loads)')
+    parser.add_argument('--output', default=wvmos.local_safetensors_path, help='Where to write the .safetensors file')
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or wvmos.checkpoint_path(download=True)
+    print(f"Converting {checkpoint}...")
+    convert(checkpoint, args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
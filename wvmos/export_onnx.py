@@ -0,0 +1,70 @@
+# Exports WV-MOS (wav2vec2 encoder + dense head) to ONNX with dynamic batch / time axes:
+#     python -m wvmos.export_onnx [--output models/wv_mos.onnx]
+# Export needs torch, transformers and the `onnx` package; the exported model
+# only needs onnxruntime (see config.WVMOS_BACKEND).
+import os
+import argparse
+
+import torch
+from torch import nn
+
+
+class MOSScore(nn.Module):
+    """
+    input_values [batch, time] (normalized like Wav2Vec2Processor)
+    -> score [batch], frame_scores [batch, frames] (50 Hz, for the trimmed long-form mode)
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values):
+        frames = self.model.dense(self.model.encoder(input_values)['last_hidden_state'])[..., 0]
+        return frames.mean(dim=1), frames
+
+
+def export(model, output, opset=17):
+    try:
+        import onnx  # noqa: F401  (required by torch.onnx.export)
+    except ImportError:
+        raise ImportError("Exporting WVMOS needs the onnx package: pip install onnx")
+
+    model = model.cpu().eval()
+    # Plain matmul / softmax attention exports cleanly for any sequence length
+    try:
+        model.encoder.set_attn_implementation('eager')
+    except Exception:
+        pass
+
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    dummy = torch.randn(1, 16000 * 2)
+    with torch.no_grad():
+        torch.onnx.export(
+            MOSScore(model), (dummy,), output,
+            input_names=['input_values'], output_names=['score', 'frame_scores'],
+            dynamic_axes={'input_values': {0: 'batch', 1: 'time'}, 'score': {0: 'batch'},
+                          'frame_scores': {0: 'batch', 1: 'frames'}},
+            opset_version=opset, dynamo=False
+        )
+    return output
+
+
+def main():
+    import config
+    from wvmos import get_wvmos
+
+    parser = argparse.ArgumentParser(description='Export WV-MOS to ONNX for the onnxruntime backend')
+    parser.add_argument('--output', default=config.WVMOS_ONNX_PATH, help='Where to write the .onnx model')
+    parser.add_argument('--opset', type=int, default=17, help='ONNX opset version')
+    args = parser.parse_args()
+
+    print("Loading WVMOS model...")
+    model = get_wvmos(cuda=False)
+    print(f"Exporting to {args.output}...")
+    export(model, args.output, opset=args.opset)
+    print(f"Exported WVMOS to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import glob
+import tqdm
+import numpy as np
+import onnxruntime as ort
+
+from metrics.audio import as_audio
+
+from .windows import WINDOW_SIZE, normalize, score_signals
+
+
+class Wav2Vec2MOSOnnx:
+    """
+    WV-MOS (wav2vec2 encoder + dense head) exported by export_onnx.py, run with onnxruntime.
+    Same scoring API as Wav2Vec2MOS, without importing torch / transformers.
+    """
+    # Long-form window (see windows.py)
+    window_size = WINDOW_SIZE
+    # The exported graph uses eager attention: memory grows with the square of the window
+    quadratic_attention = True
+
+    def __init__(self, path, providers=None, num_threads=None):
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=providers or ['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    normalize = staticmethod(normalize)
+
+    def calculate_batch(self, signals):
+        """
+        Scores many mono 16k signals, each as one pass (no windowing).
+        Items run one at a time: the graph has no padding mask.
+        """
+        scores = []
+        for signal in signals:
+            x = self.normalize(signal)[None]
+            scores.append(float(self.session.run(['score'], {self.input_name: x})[0][0]))
+        return scores
+
+    def frame_scores(self, inputs):
+        """
+        Per-frame scores (50 Hz) of already normalized input values.
+        """
+        if 'frame_scores' not in self.output_names:
+            raise RuntimeError(f"{self.path} has no frame_scores output; re-export it with `python -m wvmos.export_onnx`")
+        return [self.session.run(['frame_scores'], {self.input_name: np.asarray(x, dtype=np.float32)[None]})[0][0]
+                for x in inputs]
+
+    def calculate_dir(self, path, mean=True):
+        signals = [as_audio(path).get(16_000, channels='mono') for path in tqdm.tqdm(sorted(glob.glob(f"{path}/*.wav")))]
+        pred_mos = self.calculate_batch(signals)
+        if mean:
+            return np.mean(pred_mos)
+        else:
+            return pred_mos
+
+    def calculate_one(self, path, long_form='overlap'):
+        signal = as_audio(path).get(16_000, channels='mono')
+        return self.calculate_signal(signal, long_form)
+
+    def calculate_signal(self, signal, long_form='overlap'):
+        # signal: mono float32 at 16k
+        return self.calculate_signals([signal], long_form)[0]
+
+    def calculate_signals(self, signals, long_form='overlap'):
+        # Same long-form windowing as the torch model (see windows.py)
+        return score_signals(self, signals, long_form)
@@ -0,0 +1,264 @@
+# Long-signal windowing shared by the torch and onnxruntime WVMOS backends.
+# Kept free of torch / transformers imports so the onnx backend stays light.
+import gc
+import os
+import sys
+
+import numpy as np
+
+from metrics import trace
+
+# 2. Sliding Window (5-minute window, 2.5-minute overlap)
+# 600s (10-min) caused runtime failures/OOM on Hugging Face.
+# 300s (5-min) was verified to have 0.09 deviation (within 0.1 tolerance)
+# and is much safer for memory.
+# Fixed window of config.WVMOS_WINDOW_SECONDS = 300; 'auto' grows it on machines with room
+# (auto_window_size), and only an actual out-of-memory error shrinks it below (shrink_window).
+WINDOW_SIZE = 16000 * 300  # 5 minutes
+STRIDE = 16000 * 150       # 2.5 minutes
+
+# Peak memory of encoding one window of n samples (wav2vec2-base, float32, measured on CPU):
+# the conv feature extractor holds ~1 KB per input sample; the transformer ~100 B per sample,
+# plus, where attention scores are materialized (eager attention, the onnx export),
+# 12 heads x frames^2 float32 scores and their softmax. PyTorch's SDPA attention doesn't.
+FEATURE_BYTES_PER_SAMPLE = 1000
+ENCODER_BYTES_PER_SAMPLE = 100
+ATTENTION_BYTES_PER_FRAME_PAIR = 2 * 12 * 4
+
+# Automatic windows: whole multiples of WINDOW_STEP from WINDOW_SIZE up to MAX_WINDOW_SIZE.
+# Out-of-memory retries go down to MIN_WINDOW_SIZE (still a 30 s core between the trimmed mode's margins)
+WINDOW_STEP = 16000 * 30
+MIN_WINDOW_SIZE = 16000 * 60
+MAX_WINDOW_SIZE = 16000 * 1800
+
+# Share of the process memory limit one window may use (the models, the decoded
+# audio and the other metrics running alongside need the rest)
+MEMORY_FRACTION = 0.5
+
+
+def window_memory(samples, quadratic_attention=True):
+    """
+    Estimated peak bytes of encoding `samples` samples in one pass.
+    """
+    frames = samples // FRAME_HOP
+    encoder = ENCODER_BYTES_PER_SAMPLE * samples
+    if quadratic_attention:
+        encoder += ATTENTION_BYTES_PER_FRAME_PAIR * frames ** 2
+    return max(FEATURE_BYTES_PER_SAMPLE * samples, encoder)
+
+
+def memory_limit():
+    """
+    Bytes this process can use: the container (cgroup) limit if there is one, else physical memory.
+    None where neither can be read.
+    """
+    limits = []
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value.isdigit():
+                limits.append(int(value))
+        except OSError:
+            pass
+    try:
+        limits.append(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (ValueError, OSError, AttributeError):
+        pass
+    return min(limits) if limits else None
+
+
+def auto_window_size(quadratic_attention=True, memory=None, fraction=MEMORY_FRACTION):
+    """
+    Largest window (a multiple of WINDOW_STEP, within WINDOW_SIZE and MAX_WINDOW_SIZE) whose
+    estimated peak fits `fraction` of `memory` (default: memory_limit()). Never below the
+    validated WINDOW_SIZE: if that doesn't fit, running out of memory shrinks it (shrink_window).
+    Derived from the machine's limit rather than momentarily free memory, so it is the same
+    for every run on it.
+    """
+    if memory is None:
+        memory = memory_limit()
+    if memory is None:
+        return WINDOW_SIZE
+    window = WINDOW_SIZE
+    while window + WINDOW_STEP <= MAX_WINDOW_SIZE and window_memory(window + WINDOW_STEP, quadratic_attention) <= fraction * memory:
+        window += WINDOW_STEP
+    return window
+
+
+def shrink_window(window_size):
+    """
+    The next smaller window to retry with after running out of memory (about half), or None at the minimum.
+    """
+    if window_size <= MIN_WINDOW_SIZE:
+        return None
+    return max(MIN_WINDOW_SIZE, window_size // 2 // WINDOW_STEP * WINDOW_STEP)
+
+
+def is_out_of_memory(error):
+    """
+    Allocation failures of numpy, PyTorch (CPU / CUDA) and onnxruntime.
+    """
+    if isinstance(error, MemoryError) or type(error).__name__ == 'OutOfMemoryError':
+        return True
+    message = str(error).lower()
+    return any(text in message for text in (
+        'out of memory', "can't allocate memory", 'failed to allocate memory', 'bad_alloc', 'bad allocation'))
+
+
+def normalize(signal):
+    """
+    Zero-mean / unit-variance input values, exactly as Wav2Vec2Processor computes them.
+    """
+    x = np.asarray(signal, dtype=np.float32)
+    return (x - x.mean()) / np.sqrt(x.var() + 1e-7)
+
+
+def split_windows(signals, window_size=WINDOW_SIZE, stride=STRIDE):
+    """
+    Windows of every signal, flattened: returns (chunks, owners) where
+    owners[i] is the index of the signal chunks[i] was cut from.
+    """
+    chunks = []
+    owners = []
+    for n, signal in enumerate(signals):
+        if len(signal) <= window_size:
+            chunks.append(signal)
+            owners.append(n)
+        else:
+            for i in range(0, len(signal), stride):
+                chunk = signal[i : i + window_size]
+                if len(chunk) < 16000: 
+                    continue
+                chunks.append(chunk)
+                owners.append(n)
+    return chunks, owners
+
+
+def combine_windows(num_signals, chunks, owners, values):
+    """
+    Length-weighted average of the window scores of each signal (0.0 if it had none).
+    """
+    weighted_scores = [0.0] * num_signals
+    total_weight = [0.0] * num_signals
+    
+    for n, chunk, val in zip(owners, chunks, values):
+        # Weight by length
+        current_len = len(chunk)
+        weighted_scores[n] += val * current_len
+        total_weight[n] += current_len
+    
+    return [weighted / total if total != 0 else 0.0 for weighted, total in zip(weighted_scores, total_weight)]
+
+
+# Trimmed long-form mode: every sample is encoded once, plus a context margin
+FRAME_HOP = 320      # wav2vec2 conv stack: one output frame per 320 samples (50 Hz)
+FRAME_LENGTH = 400   # samples seen by one output frame
+TRIM_MARGIN = 16000 * 15  # context encoded (and dropped) on each side of a window
+
+
+def split_trimmed(length, window_size=WINDOW_SIZE, margin=TRIM_MARGIN):
+    """
+    Non-overlapping, frame-aligned cores covering a signal of `length` samples,
+    each encoded with up to `margin` samples of context on both sides.
+    Returns [(start, end, first, last)]: encode signal[start:end] and keep its
+    frames first..last-1. Together the kept frames are exactly the whole-file frames.
+    """
+    total_frames = (length - FRAME_LENGTH) // FRAME_HOP + 1
+    margin_frames = margin // FRAME_HOP
+    core_frames = max(1, (window_size - 2 * margin) // FRAME_HOP)
+    
+    segments = []
+    for core_start in range(0, total_frames, core_frames):
+        core_end = min(core_start + core_frames, total_frames)
+        first_frame = max(0, core_start - margin_frames)
+        last_frame = min(total_frames, core_end + margin_frames)
+        start = first_frame * FRAME_HOP
+        end = min(length, (last_frame - 1) * FRAME_HOP + FRAME_LENGTH)
+        segments.append((start, end, core_start - first_frame, core_end - first_frame))
+    return segments
+
+
+def trimmed_scores(signals, normalize, frame_scores, window_size=WINDOW_SIZE, margin=TRIM_MARGIN):
+    """
+    Long-form scores without overlap: each signal is normalized once (like the
+    whole file), cut by split_trimmed, and scored as the mean of the kept frames.
+    normalize(signal) -> input values; frame_scores([inputs]) -> [per-frame scores]
+    """
+    pieces = []
+    owners = []
+    keeps = []
+    with trace.span('features'):
+        for n, signal in enumerate(signals):
+            x = normalize(signal)
+            for start, end, first, last in split_trimmed(len(x), window_size, margin):
+                pieces.append(x[start:end])
+                owners.append(n)
+                keeps.append((first, last))
+    
+    with trace.span('inference', windows=len(pieces)):
+        piece_frames = frame_scores(pieces)
+    
+    sums = [0.0] * len(signals)
+    counts = [0] * len(signals)
+    with trace.span('aggregate'):
+        for n, frames, (first, last) in zip(owners, piece_frames, keeps):
+            kept = frames[first:last]
+            sums[n] += float(np.sum(kept, dtype=np.float64))
+            counts[n] += len(kept)
+    
+    return [total / count if count else 0.0 for total, count in zip(sums, counts)]
+
+
+def score_signals(model, signals, long_form='overlap'):
+    """
+    Scores mono 16k signals with a WVMOS backend (calculate_batch / normalize / frame_scores,
+    window_size). Signals up to one window are scored whole; longer ones use `long_form`:
+    - 'overlap': windows with half-window stride, length-weighted (the original mode)
+    - 'trimmed': trimmed_scores (each sample encoded once + margins, about half the cost)
+    Running out of memory shrinks model.window_size (for the rest of the process) and
+    scores again; only an allocation failure at MIN_WINDOW_SIZE is raised.
+    """
+    if long_form not in ('overlap', 'trimmed'):
+        raise ValueError(f"Unknown long-form mode: {long_form}")
+    
+    while True:
+        window_size = model.window_size
+        try:
+            return _score_signals(model, signals, long_form, window_size)
+        except Exception as e:
+            smaller = shrink_window(window_size)
+            if not is_out_of_memory(e) or smaller is None:
+                raise
+            _release_memory()
+            print(f"WVMOS ran out of memory with {window_size // 16000}s windows ({e}); retrying with {smaller // 16000}s")
+            model.window_size = smaller
+
+
+def _score_signals(model, signals, long_form, window_size):
+    if long_form == 'overlap':
+        chunks, owners = split_windows(signals, window_size, window_size // 2)
+        with trace.span('inference', windows=len(chunks)):
+            values = model.calculate_batch(chunks)
+        with trace.span('aggregate'):
+            return combine_windows(len(signals), chunks, owners, values)
+    
+    scores = [None] * len(signals)
+    short = [n for n, signal in enumerate(signals) if len(signal) <= window_size]
+    long = [n for n, signal in enumerate(signals) if len(signal) > window_size]
+    if short:
+        with trace.span('inference', windows=len(short)):
+            for n, value in zip(short, model.calculate_batch([signals[n] for n in short])):
+                scores[n] = value
+    if long:
+        for n, value in zip(long, trimmed_scores([signals[n] for n in long], model.normalize, model.frame_scores, window_size)):
+            scores[n] = value
+    return scores
+
+
+def _release_memory():
+    # What the failed attempt allocated (torch is only touched if a backend already imported it)
+    gc.collect()
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
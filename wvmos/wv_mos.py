@@ -1,12 +1,22 @@
-from transformers import Wav2Vec2Model, Wav2Vec2Processor
+from transformers import Wav2Vec2Config, Wav2Vec2Model
 import torch    
 from collections import OrderedDict
 import glob
-import librosa
+import os
 import tqdm
 import numpy as np
 from torch import nn
 
+from metrics.audio import as_audio
+
+from .windows import WINDOW_SIZE, normalize, score_signals
+
+# Signals join a batch only if padding them wastes at most this fraction of the batch
+MAX_PAD_FRACTION = 0.1
+
+# facebook/wav2vec2-base's config.json, bundled so no model hub access is needed
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wav2vec2-base.json')
+
 def extract_prefix(prefix, weights):
     result = OrderedDict()
     for key in weights:
@@ -15,14 +25,68 @@ def extract_prefix(prefix, weights):
     return result     
 
 
+def load_weights(path):
+    """
+    WV-MOS state dict (encoder.* / dense.*) from a .safetensors file (see convert.py)
+    or the original Lightning checkpoint. Both are memory-mapped where possible,
+    so the weights are only paged in as the model takes them over.
+    """
+    if path.endswith('.safetensors'):
+        from safetensors.torch import load_file
+        return load_file(path)
+    
+    # PyTorch 2.6+ defaults to weights_only=True, which blocks older checkpoints with custom globals.
+    # We set weights_only=False to allow loading the Zenodo-hosted checkpoint.
+    try:
+        checkpoint_data = torch.load(path, map_location='cpu', weights_only=False, mmap=True)
+    except RuntimeError:
+        # Legacy (non-zip) serialization can't be memory-mapped
+        checkpoint_data = torch.load(path, map_location='cpu', weights_only=False)
+    return extract_prefix('model.', checkpoint_data['state_dict'])
+
+
+def build_encoder(weights=None, attn_implementation=None):
+    """
+    wav2vec2-base from the bundled config. With `weights` (encoder.* keys of a WV-MOS
+    state dict) the modules are created without allocating or initializing their own
+    parameters and take the loaded tensors over directly; otherwise randomly initialized.
+    attn_implementation: 'sdpa', 'eager', ... (default: transformers' choice).
+    """
+    config = Wav2Vec2Config.from_json_file(CONFIG_PATH)
+    if attn_implementation is not None:
+        config._attn_implementation = attn_implementation
+    if weights is None:
+        return Wav2Vec2Model(config)
+    with torch.device('meta'):
+        encoder = Wav2Vec2Model(config)
+    encoder.load_state_dict(extract_prefix('encoder.', weights), assign=True)
+    return encoder
+
+
+def masked_group_norm(x, lengths, norm):
+    """
+    GroupNorm over the first `lengths` frames of each item only, so zero padding
+    doesn't shift the statistics. x - [bs, channels, time]
+    """
+    out = torch.zeros_like(x)
+    for row, length in enumerate(lengths.tolist()):
+        # Same op on the same frames as the unbatched pass
+        out[row:row + 1, :, :length] = norm(x[row:row + 1, :, :length])
+    return out
+
+
+def default_weights():
+    from . import checkpoint_path
+    return load_weights(checkpoint_path(download=True))
+
+
 class Wav2Vec2ConvEncoder:
 
-    def __init__(self, device="cuda"):
-        self.encoder = Wav2Vec2Model.from_pretrained("facebook/wav2vec2-base").feature_extractor
+    def __init__(self, device="cuda", weights=None):
+        # The WV-MOS encoder is the frozen pretrained wav2vec2-base
+        self.encoder = build_encoder(default_weights() if weights is None else weights).feature_extractor
         self.encoder.eval()
         self.encoder = self.encoder.to(device)
-        self.preprocessor = Wav2Vec2Processor.from_pretrained("facebook/wav2vec2-base")
-        self.preprocessor._sample_rate = 16000
         self.device = device
 
     def __call__(self, x):
@@ -34,12 +98,10 @@ class Wav2Vec2ConvEncoder:
     
 class Wav2Vec2FullEncoder:
 
-    def __init__(self, device="cuda"):
-        self.encoder = Wav2Vec2Model.from_pretrained("facebook/wav2vec2-base")
+    def __init__(self, device="cuda", weights=None):
+        self.encoder = build_encoder(default_weights() if weights is None else weights)
         self.encoder.eval()
         self.encoder = self.encoder.to(device)
-        self.preprocessor = Wav2Vec2Processor.from_pretrained("facebook/wav2vec2-base")
-        self.preprocessor._sample_rate = 16000
         self.device = device
 
     def __call__(self, x):
@@ -51,9 +113,15 @@ class Wav2Vec2FullEncoder:
     
     
 class Wav2Vec2MOS(nn.Module):
-    def __init__(self, path, freeze=True, cuda=True, device=None):
+    # Long-form window, also the padded samples per batched forward pass (see windows.py)
+    window_size = WINDOW_SIZE
+    
+    def __init__(self, path, freeze=True, cuda=True, device=None, attn_implementation=None):
         super().__init__()
-        self.encoder = Wav2Vec2Model.from_pretrained("facebook/wav2vec2-base")
+        # One read of the checkpoint: the encoder is built from the bundled config and
+        # takes its tensors over (no hub download, no pretrained weights loaded and overwritten)
+        weights = load_weights(path)
+        self.encoder = build_encoder(weights, attn_implementation)
         self.freeze = freeze
         
         self.dense = nn.Sequential(
@@ -62,16 +130,12 @@ class Wav2Vec2MOS(nn.Module):
             nn.Dropout(0.1),
             nn.Linear(128, 1)
         )
+        self.dense.load_state_dict(extract_prefix('dense.', weights))
         
         if self.freeze:
             self.encoder.eval()
             for p in self.encoder.parameters():
                 p.requires_grad_(False)
-        
-        # PyTorch 2.6+ defaults to weights_only=True, which blocks older checkpoints with custom globals.
-        # We set weights_only=False to allow loading the Zenodo-hosted checkpoint.
-        checkpoint_data = torch.load(path, map_location='cpu', weights_only=False)
-        self.load_state_dict(extract_prefix('model.', checkpoint_data['state_dict']))
         self.eval()
         
         if device is not None:
@@ -82,7 +146,6 @@ class Wav2Vec2MOS(nn.Module):
             self.device = torch.device('cpu')
             
         self.to(self.device)
-        self.processor = Wav2Vec2Processor.from_pretrained("facebook/wav2vec2-base")
         
     def forward(self, x):
         x = self.encoder(x)['last_hidden_state'] # [Batch, time, feats]
@@ -90,64 +153,139 @@ class Wav2Vec2MOS(nn.Module):
         x = x.mean(dim=[1,2], keepdims=True) # [batch, 1, 1]
         return x
                 
-    def train(self, mode):
+    def frames_padded(self, x, lengths):
+        """
+        x - [batch, time] zero-padded input values, lengths - valid samples per item.
+        Returns ([batch, frames] per-frame scores, [batch, frames] valid-frame mask, valid frames per item).
+        """
+        hidden = x[:, None]
+        for conv_layer in self.encoder.feature_extractor.conv_layers:
+            conv = conv_layer.conv
+            hidden = conv(hidden)
+            lengths = torch.div(lengths - conv.kernel_size[0], conv.stride[0], rounding_mode='floor') + 1
+            
+            norm = getattr(conv_layer, 'layer_norm', None)
+            if isinstance(norm, nn.GroupNorm):
+                # wav2vec2-base: normalizes over time, must ignore the padding
+                hidden = masked_group_norm(hidden, lengths, norm)
+            elif norm is not None:
+                hidden = norm(hidden.transpose(-2, -1)).transpose(-2, -1)
+            hidden = conv_layer.activation(hidden)
+        
+        frame_mask = torch.arange(hidden.shape[-1], device=hidden.device)[None] < lengths[:, None]
+        hidden_states, _ = self.encoder.feature_projection(hidden.transpose(1, 2))
+        # The encoder zeroes padded frames before the positional conv and masks them out of attention
+        hidden_states = self.encoder.encoder(hidden_states, attention_mask=frame_mask).last_hidden_state
+        
+        x = self.dense(hidden_states)[..., 0] # [batch, time]
+        return x, frame_mask, lengths
+    
+    def forward_padded(self, x, lengths):
+        """
+        Returns [batch] scores, each the mean over that item's own frames (= forward(item).mean()).
+        """
+        x, frame_mask, lengths = self.frames_padded(x, lengths)
+        return (x * frame_mask).sum(dim=1) / lengths
+    
+    normalize = staticmethod(normalize)
+    
+    @property
+    def quadratic_attention(self):
+        # Eager attention materializes the [heads, frames, frames] scores; SDPA / flash attention don't
+        return self.encoder.config._attn_implementation not in ('sdpa', 'flash_attention_2')
+    
+    def _run_batched(self, inputs, run_one, run_padded, max_batch_samples=None):
+        """
+        Sorts input values by length and buckets them into batches of similar length
+        under a padded-sample budget; a batch of one goes through run_one (no padding).
+        Returns the per-item results in input order.
+        """
+        if max_batch_samples is None:
+            max_batch_samples = self.window_size
+        order = sorted(range(len(inputs)), key=lambda i: len(inputs[i]), reverse=True)
+        
+        results = [None] * len(inputs)
+        start = 0
+        while start < len(order):
+            # Longest first: the first item sets the padded length of the batch
+            longest = len(inputs[order[start]])
+            limit = max(1, max_batch_samples // max(longest, 1))
+            batch = [order[start]]
+            for i in order[start + 1:]:
+                if len(batch) >= limit or len(inputs[i]) < longest * (1 - MAX_PAD_FRACTION):
+                    break
+                batch.append(i)
+            start += len(batch)
+            
+            with torch.no_grad():
+                if len(batch) == 1:
+                    x = torch.from_numpy(np.asarray(inputs[batch[0]]))[None].to(self.device)
+                    values = [run_one(x)]
+                else:
+                    x = torch.zeros(len(batch), longest)
+                    for row, i in enumerate(batch):
+                        x[row, :len(inputs[i])] = torch.from_numpy(np.asarray(inputs[i]))
+                    lengths = torch.tensor([len(inputs[i]) for i in batch])
+                    values = run_padded(x.to(self.device), lengths.to(self.device))
+            
+            for i, value in zip(batch, values):
+                results[i] = value
+        return results
+    
+    def calculate_batch(self, signals, max_batch_samples=None):
+        """
+        Scores many mono 16k signals (each as one forward pass, no windowing), batched.
+        """
+        inputs = [self.normalize(signal) for signal in signals]
+        return self._run_batched(
+            inputs,
+            lambda x: self.forward(x).mean().cpu().item(),
+            lambda x, lengths: self.forward_padded(x, lengths).cpu().tolist(),
+            max_batch_samples
+        )
+    
+    def frame_scores(self, inputs, max_batch_samples=None):
+        """
+        Per-frame scores (50 Hz, before averaging) of already normalized input values, batched.
+        """
+        def run_padded(x, lengths):
+            frames, _, lengths = self.frames_padded(x, lengths)
+            frames = frames.cpu().numpy()
+            return [frames[row, :n] for row, n in enumerate(lengths.tolist())]
+        
+        return self._run_batched(
+            inputs,
+            lambda x: self.dense(self.encoder(x)['last_hidden_state'])[0, :, 0].cpu().numpy(),
+            run_padded,
+            max_batch_samples
+        )
+                
+    def train(self, mode=True):
         super().train(mode)
         if self.freeze:
             self.encoder.eval()
+        return self
             
     def calculate_dir(self, path, mean=True):
         
-        pred_mos = []
-        for path in tqdm.tqdm(sorted(glob.glob(f"{path}/*.wav"))):
-            signal = librosa.load(path, sr=16_000)[0]
-            x = self.processor(signal, return_tensors="pt", padding=True, sampling_rate=16000).input_values
-            x = x.to(self.device)
-            with torch.no_grad():
-                res = self.forward(x).mean()
-            pred_mos.append(res.item())
+        signals = [as_audio(path).get(16_000, channels='mono') for path in tqdm.tqdm(sorted(glob.glob(f"{path}/*.wav")))]
+        pred_mos = self.calculate_batch(signals)
         if mean:
             return np.mean(pred_mos)
         else:
             return pred_mos
         
-    def calculate_one(self, path):
+    def calculate_one(self, path, long_form='overlap'):
         # 1. Load Audio (Original 16k)
-        signal = librosa.load(path, sr=16_000)[0]
-        
-        # 2. Sliding Window (5-minute window, 2.5-minute overlap)
-        # 600s (10-min) caused runtime failures/OOM on Hugging Face.
-        # 300s (5-min) was verified to have 0.09 deviation (within 0.1 tolerance)
-        # and is much safer for memory.
-        window_size = 16000 * 300  # 5 minutes
-        stride = 16000 * 150       # 2.5 minutes
+        signal = as_audio(path).get(16_000, channels='mono')
+        return self.calculate_signal(signal, long_form)
         
-        # Prepare windows
-        chunks = []
-        if len(signal) <= window_size:
-            chunks.append(signal)
-        else:
-            for i in range(0, len(signal), stride):
-                chunk = signal[i : i + window_size]
-                if len(chunk) < 16000: 
-                    continue
-                chunks.append(chunk)
-
-        weighted_scores = 0.0
-        total_weight = 0.0
+    def calculate_signal(self, signal, long_form='overlap'):
+        # signal: mono float32 at 16k
+        return self.calculate_signals([signal], long_form)[0]
         
-        for chunk in chunks:
-            # Score EVERYTHING (including silence) to match "Whole File" accuracy.
-            x = self.processor(chunk, return_tensors="pt", padding=True, sampling_rate=16000).input_values
-            with torch.no_grad():
-                x = x.to(self.device)
-                val = self.forward(x).mean().cpu().item()
-                
-                # Weight by length
-                current_len = len(chunk)
-                weighted_scores += val * current_len
-                total_weight += current_len
-        
-        if total_weight == 0:
-            return 0.0
-            
-        return weighted_scores / total_weight
\ No newline at end of file
+    def calculate_signals(self, signals, long_form='overlap'):
+        # signals: list of mono float32 at 16k
+        # Windows of every signal are scored together in batches (see windows.py)
+        # Score EVERYTHING (including silence) to match "Whole File" accuracy.
+        return score_signals(self, signals, long_form)